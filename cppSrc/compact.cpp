@@ -0,0 +1,253 @@
+#include "gradient.h"
+#include <stdexcept>
+#include <algorithm>
+#include <vector>
+
+// 6th order compact (Padé) first and second derivatives, the interior schemes
+// xcompact3d uses (Lele 1992):
+//
+//   f':  1/3 f'_{i-1} + f'_i + 1/3 f'_{i+1} = 14/9 (f_{i+1}-f_{i-1})/(2h) + 1/9 (f_{i+2}-f_{i-2})/(4h)
+//   f'': 2/11 f''_{i-1} + f''_i + 2/11 f''_{i+1} = 12/11 (f_{i+1}-2f_i+f_{i-1})/h^2 + 3/11 (f_{i+2}-2f_i+f_{i-2})/(4h^2)
+//
+// Periodic axes give a cyclic system (solved with Sherman-Morrison). On
+// non-periodic axes the first two rows at each end use the usual one-sided
+// 3rd order and 4th order Padé closures.
+//
+// The array is viewed as (outer, n, inner) like derivative_axis. Every row
+// operation of the Thomas algorithm is a contiguous loop over a block of the
+// inner axis, so many lines are solved at once and the loops vectorize. When
+// the derivative runs along the contiguous axis, blocks of lines are first
+// transposed into a scratch buffer to get the same layout.
+
+namespace {
+
+constexpr size_t BLOCK = 512;
+constexpr size_t LINES = 64;
+
+struct Row {
+    int count;
+    long offset[5];
+    double coef[5];
+};
+
+// Tridiagonal system lower[i] x_{i-1} + diag[i] x_i + upper[i] x_{i+1} = rhs[i],
+// factored once per call; rows[i] describes rhs[i] as a combination of f values.
+struct CompactSystem {
+    size_t n;
+    bool periodic;
+    std::vector<double> lower , inv_diag , upper;   // Thomas factors
+    std::vector<Row> rows;
+    // Sherman-Morrison correction for periodic systems
+    std::vector<double> z;
+    double v_last = 0.0 , denom = 1.0;
+};
+
+void factor(CompactSystem& s , const std::vector<double>& a , std::vector<double> b , const std::vector<double>& c) {
+    size_t n = s.n;
+    s.lower = a;
+    s.upper = c;
+    s.inv_diag.assign(n , 0.0);
+    s.inv_diag[0] = 1.0 / b[0];
+    for (size_t i = 1; i < n; ++i) {
+        double m = a[i] * s.inv_diag[i - 1];
+        b[i] -= m * c[i - 1];
+        s.lower[i] = m;
+        s.inv_diag[i] = 1.0 / b[i];
+    }
+}
+
+// Solve the factored system for a scalar right-hand side (used for z)
+std::vector<double> solve_scalar(const CompactSystem& s , std::vector<double> d) {
+    size_t n = s.n;
+    for (size_t i = 1; i < n; ++i) d[i] -= s.lower[i] * d[i - 1];
+    d[n - 1] *= s.inv_diag[n - 1];
+    for (size_t i = n - 1; i-- > 0;) d[i] = (d[i] - s.upper[i] * d[i + 1]) * s.inv_diag[i];
+    return d;
+}
+
+CompactSystem build_system(size_t n , double h , int deriv , bool periodic) {
+    CompactSystem s;
+    s.n = n;
+    s.periodic = periodic;
+    s.rows.resize(n);
+
+    double alpha;
+    Row interior;
+    if (deriv == 1) {
+        alpha = 1.0 / 3.0;
+        double a = 14.0 / 9.0 / (2.0 * h) , b = 1.0 / 9.0 / (4.0 * h);
+        interior = { 4 , { -2 , -1 , 1 , 2 } , { -b , -a , a , b } };
+    }
+    else {
+        alpha = 2.0 / 11.0;
+        double a = 12.0 / 11.0 / (h * h) , b = 3.0 / 11.0 / (4.0 * h * h);
+        interior = { 5 , { -2 , -1 , 0 , 1 , 2 } , { b , a , -2.0 * a - 2.0 * b , a , b } };
+    }
+
+    std::vector<double> lower(n , alpha) , diag(n , 1.0) , upper(n , alpha);
+
+    for (size_t i = 0; i < n; ++i) s.rows[i] = interior;
+
+    if (periodic) {
+        // B = A - u v^T with u = (gamma, 0, ..., alpha), v = (1, 0, ..., alpha/gamma)
+        double gamma = -diag[0];
+        diag[0] -= gamma;
+        diag[n - 1] -= alpha * alpha / gamma;
+        lower[0] = 0.0;
+        upper[n - 1] = 0.0;
+        factor(s , lower , diag , upper);
+
+        std::vector<double> u(n , 0.0);
+        u[0] = gamma;
+        u[n - 1] = alpha;
+        s.z = solve_scalar(s , u);
+        s.v_last = alpha / gamma;
+        s.denom = 1.0 + s.z[0] + s.v_last * s.z[n - 1];
+        return s;
+    }
+
+    lower[0] = 0.0;
+    upper[n - 1] = 0.0;
+    if (deriv == 1) {
+        // f'_0 + 2 f'_1 = (-5/2 f_0 + 2 f_1 + 1/2 f_2)/h                  (3rd order)
+        // 1/4 f'_0 + f'_1 + 1/4 f'_2 = 3/2 (f_2 - f_0)/(2h)                (4th order)
+        upper[0] = 2.0;
+        s.rows[0] = { 3 , { 0 , 1 , 2 } , { -2.5 / h , 2.0 / h , 0.5 / h } };
+        lower[1] = upper[1] = 0.25;
+        s.rows[1] = { 2 , { -1 , 1 } , { -0.75 / h , 0.75 / h } };
+        lower[n - 1] = 2.0;
+        s.rows[n - 1] = { 3 , { 0 , -1 , -2 } , { 2.5 / h , -2.0 / h , -0.5 / h } };
+        lower[n - 2] = upper[n - 2] = 0.25;
+        s.rows[n - 2] = { 2 , { -1 , 1 } , { -0.75 / h , 0.75 / h } };
+    }
+    else {
+        // f''_0 + 11 f''_1 = (13 f_0 - 27 f_1 + 15 f_2 - f_3)/h^2         (3rd order)
+        // 1/10 f''_0 + f''_1 + 1/10 f''_2 = 6/5 (f_2 - 2 f_1 + f_0)/h^2    (4th order)
+        double h2 = h * h;
+        upper[0] = 11.0;
+        s.rows[0] = { 4 , { 0 , 1 , 2 , 3 } , { 13.0 / h2 , -27.0 / h2 , 15.0 / h2 , -1.0 / h2 } };
+        lower[1] = upper[1] = 0.1;
+        s.rows[1] = { 3 , { -1 , 0 , 1 } , { 1.2 / h2 , -2.4 / h2 , 1.2 / h2 } };
+        lower[n - 1] = 11.0;
+        s.rows[n - 1] = { 4 , { 0 , -1 , -2 , -3 } , { 13.0 / h2 , -27.0 / h2 , 15.0 / h2 , -1.0 / h2 } };
+        lower[n - 2] = upper[n - 2] = 0.1;
+        s.rows[n - 2] = { 3 , { -1 , 0 , 1 } , { 1.2 / h2 , -2.4 / h2 , 1.2 / h2 } };
+    }
+    factor(s , lower , diag , upper);
+    return s;
+}
+
+// Solve for one block: f and out point at row 0 of the block, rows are
+// `stride` apart and `len` values wide. `scratch` holds len values.
+template <typename T>
+void solve_block(const CompactSystem& s , const T* f , T* out , size_t stride , size_t len , T* scratch) {
+    const size_t n = s.n;
+    const long ln = static_cast<long>(n);
+
+    // right-hand side
+    for (size_t i = 0; i < n; ++i) {
+        const Row& r = s.rows[i];
+        T* __restrict o = out + i * stride;
+        for (size_t t = 0; t < len; ++t) o[t] = 0;
+        for (int k = 0; k < r.count; ++k) {
+            long j = static_cast<long>(i) + r.offset[k];
+            if (s.periodic) j = ((j % ln) + ln) % ln;
+            const T* __restrict src = f + static_cast<size_t>(j) * stride;
+            const T ck = static_cast<T>(r.coef[k]);
+            for (size_t t = 0; t < len; ++t) o[t] += ck * src[t];
+        }
+    }
+
+    // forward elimination
+    for (size_t i = 1; i < n; ++i) {
+        T* __restrict o = out + i * stride;
+        const T* __restrict p = out + (i - 1) * stride;
+        const T m = static_cast<T>(s.lower[i]);
+        for (size_t t = 0; t < len; ++t) o[t] -= m * p[t];
+    }
+
+    // back substitution
+    {
+        T* __restrict o = out + (n - 1) * stride;
+        const T d = static_cast<T>(s.inv_diag[n - 1]);
+        for (size_t t = 0; t < len; ++t) o[t] *= d;
+    }
+    for (size_t i = n - 1; i-- > 0;) {
+        T* __restrict o = out + i * stride;
+        const T* __restrict q = out + (i + 1) * stride;
+        const T c = static_cast<T>(s.upper[i]);
+        const T d = static_cast<T>(s.inv_diag[i]);
+        for (size_t t = 0; t < len; ++t) o[t] = (o[t] - c * q[t]) * d;
+    }
+
+    if (!s.periodic) return;
+
+    // x = y - (v.y / (1 + v.z)) z
+    {
+        const T* __restrict y0 = out;
+        const T* __restrict yl = out + (n - 1) * stride;
+        const T vl = static_cast<T>(s.v_last);
+        const T inv = static_cast<T>(1.0 / s.denom);
+        for (size_t t = 0; t < len; ++t) scratch[t] = (y0[t] + vl * yl[t]) * inv;
+    }
+    for (size_t i = 0; i < n; ++i) {
+        T* __restrict o = out + i * stride;
+        const T zi = static_cast<T>(s.z[i]);
+        for (size_t t = 0; t < len; ++t) o[t] -= zi * scratch[t];
+    }
+}
+
+} // namespace
+
+template <typename T>
+void compact_derivative(const T* f , T* out , size_t outer , size_t n , size_t inner , double h , int deriv , bool periodic) {
+    if (deriv != 1 && deriv != 2)
+        throw std::invalid_argument("deriv must be 1 or 2.");
+    if (outer == 0 || n == 0 || inner == 0) return;
+    if (n < (periodic ? 5u : 4u))
+        throw std::invalid_argument(periodic ? "Periodic compact scheme needs at least 5 points." :
+            "Compact scheme needs at least 4 points.");
+
+    const CompactSystem s = build_system(n , h , deriv , periodic);
+
+    if (inner == 1) {
+        // lines along the contiguous axis: transpose LINES of them into (n, LINES)
+        const long long blocks = static_cast<long long>((outer + LINES - 1) / LINES);
+        const size_t width = std::min(LINES , outer);
+        #pragma omp parallel if (blocks > 1)
+        {
+            std::vector<T> in_t(n * width) , out_t(n * width) , scratch(width);
+            #pragma omp for schedule(static)
+            for (long long b = 0; b < blocks; ++b) {
+                const size_t first = static_cast<size_t>(b) * width;
+                const size_t len = std::min(width , outer - first);
+                for (size_t l = 0; l < len; ++l)
+                    for (size_t i = 0; i < n; ++i)
+                        in_t[i * width + l] = f[(first + l) * n + i];
+                solve_block(s , in_t.data() , out_t.data() , width , len , scratch.data());
+                for (size_t l = 0; l < len; ++l)
+                    for (size_t i = 0; i < n; ++i)
+                        out[(first + l) * n + i] = out_t[i * width + l];
+            }
+        }
+        return;
+    }
+
+    const long long outer_ll = static_cast<long long>(outer);
+    const long long blocks = static_cast<long long>((inner + BLOCK - 1) / BLOCK);
+    #pragma omp parallel
+    {
+        std::vector<T> scratch(BLOCK);
+        #pragma omp for collapse(2) schedule(static)
+        for (long long o = 0; o < outer_ll; ++o) {
+            for (long long b = 0; b < blocks; ++b) {
+                const size_t offset = static_cast<size_t>(o) * n * inner + static_cast<size_t>(b) * BLOCK;
+                const size_t len = std::min(BLOCK , inner - static_cast<size_t>(b) * BLOCK);
+                solve_block(s , f + offset , out + offset , inner , len , scratch.data());
+            }
+        }
+    }
+}
+
+template void compact_derivative<float>(const float* , float* , size_t , size_t , size_t , double , int , bool);
+template void compact_derivative<double>(const double* , double* , size_t , size_t , size_t , double , int , bool);
@@ -1,18 +1,35 @@
 #pragma once
-#include <vector>
 #include <cstddef>
 
-std::vector<double> gradient_1d_order2(const std::vector<double>& f , double dx);
-std::vector<double> gradient_1d_order4(const std::vector<double>& f , double dx);
-std::vector<double> gradient_1d_order6(const std::vector<double>& f , double dx);
+// All kernels work on caller-owned, C-contiguous buffers (row-major, x fastest)
+// so the Python bindings can pass NumPy memory straight through without copies.
+// Instantiated for float and double.
 
-std::vector<double> gradient_2d_order2(const std::vector<std::vector<double>>& f , double dx , double dy);
-std::vector<double> gradient_2d_order4(const std::vector<std::vector<double>>& f , double dx , double dy);
-std::vector<double> gradient_2d_order6(const std::vector<std::vector<double>>& f , double dx , double dy);
+template <typename T> void gradient_1d_order2(const T* f , T* grad , size_t n , double dx);
+template <typename T> void gradient_1d_order4(const T* f , T* grad , size_t n , double dx);
+template <typename T> void gradient_1d_order6(const T* f , T* grad , size_t n , double dx);
 
-// std::vector<double> gradient_3d_order2(const std::vector<double>& f , double dx , double dy , double dz);
-// std::vector<double> gradient_3d_order4(const std::vector<double>& f , double dx , double dy , double dz);
-// std::vector<double> gradient_3d_order6(const std::vector<double>& f , double dx , double dy , double dz);
+// f has shape (ny, nx); grad_x and grad_y have the same shape
+template <typename T> void gradient_2d_order2(const T* f , T* grad_x , T* grad_y , size_t ny , size_t nx , double dx , double dy);
+template <typename T> void gradient_2d_order4(const T* f , T* grad_x , T* grad_y , size_t ny , size_t nx , double dx , double dy);
+template <typename T> void gradient_2d_order6(const T* f , T* grad_x , T* grad_y , size_t ny , size_t nx , double dx , double dy);
+
+// f has shape (n0, n1, n2); derivative along axis 0, 1 or 2 with spacing h into grad (same shape)
+template <typename T> void gradient_3d_order2(const T* f , T* grad , size_t n0 , size_t n1 , size_t n2 , double h , int axis);
+template <typename T> void gradient_3d_order4(const T* f , T* grad , size_t n0 , size_t n1 , size_t n2 , double h , int axis);
+template <typename T> void gradient_3d_order6(const T* f , T* grad , size_t n0 , size_t n1 , size_t n2 , double h , int axis);
+
+// Derivative along the middle axis of f viewed as (outer, n, inner), OpenMP-threaded.
+// Every 2D/3D kernel is built on this.
+template <typename T> void derivative_axis(const T* f , T* out , size_t outer , size_t n , size_t inner , double h , int order);
+
+// 6th order compact (Padé) derivative (deriv = 1 or 2) along the middle axis of f
+// viewed as (outer, n, inner); periodic selects the cyclic system, otherwise
+// one-sided compact closures are used at both ends.
+template <typename T> void compact_derivative(const T* f , T* out , size_t outer , size_t n , size_t inner , double h , int deriv , bool periodic);
+
+// Threads the kernels will use (1 without OpenMP)
+int gradient_num_threads();
 
 // std::vector<double> gradient_4d_order2(const std::vector<double>& f , double dx , double dy , double dz);
 // std::vector<double> gradient_4d_order4(const std::vector<double>& f , double dx , double dy , double dz);
@@ -0,0 +1,184 @@
+#include "gradient.h"
+#include <stdexcept>
+#include <algorithm>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
+// Derivative along the middle axis of an array viewed as (outer, n, inner).
+//
+// inner == 1 means the derivative runs along the contiguous axis: every line
+// goes through the 1D kernels, lines are spread over threads.
+// Otherwise each output row out[o][i][:] is a weighted sum of whole input
+// rows f[o][i+k][:], evaluated as a few contiguous multiply-adds that the
+// compiler vectorizes. The inner axis is cut into blocks so the 3-7 input
+// rows a stencil touches stay in cache while i sweeps down the axis, and
+// threads work on (outer, block) pairs so 2D arrays are threaded too.
+
+namespace {
+
+constexpr size_t BLOCK = 1024;
+
+// Coefficients (numerators) of the stencils used by gradient_1d_order*.
+// Edge rows act on f[0..width-1]; the mirrored rows at the other end are the
+// same coefficients reversed and negated.
+struct Stencil {
+    int order;
+    int width;
+    double denom;
+    double central[7];
+    double edge[3][7];
+};
+
+const Stencil STENCIL2 = { 2 , 3 , 2.0 ,
+    { -1 , 0 , 1 } ,
+    { { -3 , 4 , -1 } } };
+
+const Stencil STENCIL4 = { 4 , 5 , 12.0 ,
+    { 1 , -8 , 0 , 8 , -1 } ,
+    { { -25 , 48 , -36 , 16 , -3 } ,
+      { -3 , -10 , 18 , -6 , 1 } } };
+
+const Stencil STENCIL6 = { 6 , 7 , 60.0 ,
+    { -1 , 9 , -45 , 0 , 45 , -9 , 1 } ,
+    { { -147 , 360 , -450 , 400 , -225 , 72 , -10 } ,
+      { -10 , -77 , 150 , -100 , 50 , -15 , 2 } ,
+      { 2 , -24 , -35 , 80 , -30 , 8 , -1 } } };
+
+// Same fallbacks as the 1D kernels when the axis is too short
+const Stencil* select_stencil(int order , size_t n) {
+    if (order == 6 && n >= 7) return &STENCIL6;
+    if (order >= 4 && n >= 5) return &STENCIL4;
+    if (n >= 3) return &STENCIL2;
+    return nullptr;
+}
+
+// out[t] = sum_k c[k] * rows[k][t] for t < len
+template <typename T>
+inline void combine_rows(T* __restrict out , const T* const* rows , const double* c , int width , size_t len) {
+    const T c0 = static_cast<T>(c[0]);
+    const T* __restrict r0 = rows[0];
+    for (size_t t = 0; t < len; ++t) out[t] = c0 * r0[t];
+    for (int k = 1; k < width; ++k) {
+        if (c[k] == 0.0) continue;
+        const T ck = static_cast<T>(c[k]);
+        const T* __restrict rk = rows[k];
+        for (size_t t = 0; t < len; ++t) out[t] += ck * rk[t];
+    }
+}
+
+template <typename T>
+void derivative_rows(const T* f , T* out , size_t n , size_t inner , size_t len , const Stencil& s , double h) {
+    const int width = s.width;
+    const int half = s.order / 2;
+    const double scale = 1.0 / (s.denom * h);
+
+    double central[7] , left[3][7] , right[3][7];
+    for (int k = 0; k < width; ++k) central[k] = s.central[k] * scale;
+    for (int r = 0; r < half; ++r)
+        for (int k = 0; k < width; ++k) {
+            left[r][k] = s.edge[r][k] * scale;
+            right[r][k] = -s.edge[r][width - 1 - k] * scale;
+        }
+
+    const T* rows[7];
+    for (size_t i = 0; i < n; ++i) {
+        const double* c;
+        size_t first;
+        if (i < static_cast<size_t>(half)) {
+            c = left[i];
+            first = 0;
+        }
+        else if (i >= n - half) {
+            c = right[n - 1 - i];
+            first = n - width;
+        }
+        else {
+            c = central;
+            first = i - half;
+        }
+        for (int k = 0; k < width; ++k) rows[k] = f + (first + k) * inner;
+        combine_rows(out + i * inner , rows , c , width , len);
+    }
+}
+
+template <typename T>
+void derivative_line(const T* f , T* out , size_t n , double h , int order) {
+    if (order == 2) gradient_1d_order2(f , out , n , h);
+    else if (order == 4) gradient_1d_order4(f , out , n , h);
+    else gradient_1d_order6(f , out , n , h);
+}
+
+} // namespace
+
+template <typename T>
+void derivative_axis(const T* f , T* out , size_t outer , size_t n , size_t inner , double h , int order) {
+    if (order != 2 && order != 4 && order != 6)
+        throw std::invalid_argument("order must be 2, 4 or 6.");
+    if (outer == 0 || n == 0 || inner == 0) return;
+
+    if (inner == 1) {
+        const long long lines = static_cast<long long>(outer);
+        #pragma omp parallel for schedule(static)
+        for (long long o = 0; o < lines; ++o)
+            derivative_line(f + static_cast<size_t>(o) * n , out + static_cast<size_t>(o) * n , n , h , order);
+        return;
+    }
+
+    const Stencil* s = select_stencil(order , n);
+    if (s == nullptr) {
+        std::fill(out , out + outer * n * inner , T(0));
+        return;
+    }
+
+    const long long outer_ll = static_cast<long long>(outer);
+    const long long blocks = static_cast<long long>((inner + BLOCK - 1) / BLOCK);
+    #pragma omp parallel for collapse(2) schedule(static)
+    for (long long o = 0; o < outer_ll; ++o) {
+        for (long long b = 0; b < blocks; ++b) {
+            const size_t offset = static_cast<size_t>(o) * n * inner + static_cast<size_t>(b) * BLOCK;
+            const size_t len = std::min(BLOCK , inner - static_cast<size_t>(b) * BLOCK);
+            derivative_rows(f + offset , out + offset , n , inner , len , *s , h);
+        }
+    }
+}
+
+template <typename T>
+static void gradient_3d(const T* f , T* grad , size_t n0 , size_t n1 , size_t n2 , double h , int axis , int order) {
+    if (axis == 0) derivative_axis(f , grad , 1 , n0 , n1 * n2 , h , order);
+    else if (axis == 1) derivative_axis(f , grad , n0 , n1 , n2 , h , order);
+    else if (axis == 2) derivative_axis(f , grad , n0 * n1 , n2 , 1 , h , order);
+    else throw std::invalid_argument("axis must be 0, 1 or 2.");
+}
+
+template <typename T>
+void gradient_3d_order2(const T* f , T* grad , size_t n0 , size_t n1 , size_t n2 , double h , int axis) {
+    gradient_3d(f , grad , n0 , n1 , n2 , h , axis , 2);
+}
+
+template <typename T>
+void gradient_3d_order4(const T* f , T* grad , size_t n0 , size_t n1 , size_t n2 , double h , int axis) {
+    gradient_3d(f , grad , n0 , n1 , n2 , h , axis , 4);
+}
+
+template <typename T>
+void gradient_3d_order6(const T* f , T* grad , size_t n0 , size_t n1 , size_t n2 , double h , int axis) {
+    gradient_3d(f , grad , n0 , n1 , n2 , h , axis , 6);
+}
+
+int gradient_num_threads() {
+#ifdef _OPENMP
+    return omp_get_max_threads();
+#else
+    return 1;
+#endif
+}
+
+template void derivative_axis<float>(const float* , float* , size_t , size_t , size_t , double , int);
+template void derivative_axis<double>(const double* , double* , size_t , size_t , size_t , double , int);
+template void gradient_3d_order2<float>(const float* , float* , size_t , size_t , size_t , double , int);
+template void gradient_3d_order2<double>(const double* , double* , size_t , size_t , size_t , double , int);
+template void gradient_3d_order4<float>(const float* , float* , size_t , size_t , size_t , double , int);
+template void gradient_3d_order4<double>(const double* , double* , size_t , size_t , size_t , double , int);
+template void gradient_3d_order6<float>(const float* , float* , size_t , size_t , size_t , double , int);
+template void gradient_3d_order6<double>(const double* , double* , size_t , size_t , size_t , double , int);
@@ -1,25 +1,160 @@
 #include <pybind11/pybind11.h>
-#include <pybind11/stl.h>
+#include <pybind11/numpy.h>
+#include <stdexcept>
+#include <vector>
 #include "gradient.h"
 
 namespace py = pybind11;
 
+// Arrays are taken as C-contiguous buffers of the exact dtype, so a matching
+// NumPy array is borrowed as-is; results are allocated once as NumPy arrays
+// and filled in place by the kernels.
+template <typename T>
+using carray = py::array_t<T , py::array::c_style>;
+
+template <typename T>
+using kernel1d = void (*)(const T* , T* , size_t , double);
+
+template <typename T>
+using kernel2d = void (*)(const T* , T* , T* , size_t , size_t , double , double);
+
+template <typename T>
+using kernel3d = void (*)(const T* , T* , size_t , size_t , size_t , double , int);
+
+template <typename T>
+py::array_t<T> call_1d(kernel1d<T> kernel , carray<T> f , double dx) {
+    if (f.ndim() != 1)
+        throw std::invalid_argument("f must be a 1D array.");
+    size_t n = static_cast<size_t>(f.shape(0));
+    py::array_t<T> grad(n);
+    const T* in = f.data();
+    T* out = grad.mutable_data();
+    {
+        py::gil_scoped_release release;
+        kernel(in , out , n , dx);
+    }
+    return grad;
+}
+
+template <typename T>
+py::tuple call_2d(kernel2d<T> kernel , carray<T> f , double dx , double dy) {
+    if (f.ndim() != 2)
+        throw std::invalid_argument("f must be a 2D array.");
+    size_t ny = static_cast<size_t>(f.shape(0));
+    size_t nx = static_cast<size_t>(f.shape(1));
+    py::array_t<T> grad_x({ ny , nx });
+    py::array_t<T> grad_y({ ny , nx });
+    const T* in = f.data();
+    T* out_x = grad_x.mutable_data();
+    T* out_y = grad_y.mutable_data();
+    {
+        py::gil_scoped_release release;
+        kernel(in , out_x , out_y , ny , nx , dx , dy);
+    }
+    return py::make_tuple(grad_x , grad_y);
+}
+
+template <typename T>
+py::array_t<T> call_3d(kernel3d<T> kernel , carray<T> f , double h , int axis) {
+    if (f.ndim() != 3)
+        throw std::invalid_argument("f must be a 3D array.");
+    if (axis < 0) axis += 3;
+    if (axis < 0 || axis > 2)
+        throw std::invalid_argument("axis must be 0, 1 or 2.");
+    size_t n0 = static_cast<size_t>(f.shape(0));
+    size_t n1 = static_cast<size_t>(f.shape(1));
+    size_t n2 = static_cast<size_t>(f.shape(2));
+    py::array_t<T> grad({ n0 , n1 , n2 });
+    const T* in = f.data();
+    T* out = grad.mutable_data();
+    {
+        py::gil_scoped_release release;
+        kernel(in , out , n0 , n1 , n2 , h , axis);
+    }
+    return grad;
+}
+
+template <typename T>
+py::array_t<T> call_compact(carray<T> f , double h , int axis , int deriv , bool periodic) {
+    int ndim = static_cast<int>(f.ndim());
+    if (ndim == 0)
+        throw std::invalid_argument("f must have at least one dimension.");
+    if (axis < 0) axis += ndim;
+    if (axis < 0 || axis >= ndim)
+        throw std::invalid_argument("axis out of range.");
+    size_t outer = 1 , inner = 1;
+    for (int d = 0; d < axis; ++d) outer *= static_cast<size_t>(f.shape(d));
+    for (int d = axis + 1; d < ndim; ++d) inner *= static_cast<size_t>(f.shape(d));
+    size_t n = static_cast<size_t>(f.shape(axis));
+    py::array_t<T> out(std::vector<py::ssize_t>(f.shape() , f.shape() + ndim));
+    const T* in = f.data();
+    T* res = out.mutable_data();
+    {
+        py::gil_scoped_release release;
+        compact_derivative(in , res , outer , n , inner , h , deriv , periodic);
+    }
+    return out;
+}
+
+// double is registered first so lists and integer arrays are converted to
+// float64; float32 arrays still match their own overload without a copy.
+template <typename T>
+void def_1d(py::module_& m , const char* name , kernel1d<T> kernel , const char* doc) {
+    m.def(name , [kernel](carray<T> f , double dx) { return call_1d<T>(kernel , f , dx); } ,
+        doc , py::arg("f") , py::arg("dx"));
+}
+
+template <typename T>
+void def_2d(py::module_& m , const char* name , kernel2d<T> kernel , const char* doc) {
+    m.def(name , [kernel](carray<T> f , double dx , double dy) { return call_2d<T>(kernel , f , dx , dy); } ,
+        doc , py::arg("f") , py::arg("dx") , py::arg("dy"));
+}
+
+template <typename T>
+void def_3d(py::module_& m , const char* name , kernel3d<T> kernel , const char* doc) {
+    m.def(name , [kernel](carray<T> f , double h , int axis) { return call_3d<T>(kernel , f , h , axis); } ,
+        doc , py::arg("f") , py::arg("h") , py::arg("axis"));
+}
+
+template <typename T>
+void def_compact(py::module_& m) {
+    m.def("compact_derivative" , [](carray<T> f , double h , int axis , int deriv , bool periodic) {
+            return call_compact<T>(f , h , axis , deriv , periodic);
+        } ,
+        "6th order compact (xcompact3d) first or second derivative along one axis" ,
+        py::arg("f") , py::arg("h") , py::arg("axis") = -1 , py::arg("deriv") = 1 , py::arg("periodic") = false);
+}
+
 PYBIND11_MODULE(mygrad , m) {
-    m.def("gradient_1d_order2" , &gradient_1d_order2 ,
-        "Compute 1D gradient (2nd order)" , py::arg("f") , py::arg("dx"));
+    def_1d<double>(m , "gradient_1d_order2" , &gradient_1d_order2<double> , "Compute 1D gradient (2nd order)");
+    def_1d<float>(m , "gradient_1d_order2" , &gradient_1d_order2<float> , "Compute 1D gradient (2nd order)");
+
+    def_1d<double>(m , "gradient_1d_order4" , &gradient_1d_order4<double> , "Compute 1D gradient (4th order)");
+    def_1d<float>(m , "gradient_1d_order4" , &gradient_1d_order4<float> , "Compute 1D gradient (4th order)");
+
+    def_1d<double>(m , "gradient_1d_order6" , &gradient_1d_order6<double> , "Compute 1D gradient (6th order)");
+    def_1d<float>(m , "gradient_1d_order6" , &gradient_1d_order6<float> , "Compute 1D gradient (6th order)");
+
+    def_2d<double>(m , "gradient_2d_order2" , &gradient_2d_order2<double> , "Compute 2D gradient (2nd order), returns (df/dx, df/dy)");
+    def_2d<float>(m , "gradient_2d_order2" , &gradient_2d_order2<float> , "Compute 2D gradient (2nd order), returns (df/dx, df/dy)");
+
+    def_2d<double>(m , "gradient_2d_order4" , &gradient_2d_order4<double> , "Compute 2D gradient (4th order), returns (df/dx, df/dy)");
+    def_2d<float>(m , "gradient_2d_order4" , &gradient_2d_order4<float> , "Compute 2D gradient (4th order), returns (df/dx, df/dy)");
+
+    def_2d<double>(m , "gradient_2d_order6" , &gradient_2d_order6<double> , "Compute 2D gradient (6th order), returns (df/dx, df/dy)");
+    def_2d<float>(m , "gradient_2d_order6" , &gradient_2d_order6<float> , "Compute 2D gradient (6th order), returns (df/dx, df/dy)");
 
-    m.def("gradient_1d_order4" , &gradient_1d_order4 ,
-        "Compute 1D gradient (4th order)" , py::arg("f") , py::arg("dx"));
+    def_3d<double>(m , "gradient_3d_order2" , &gradient_3d_order2<double> , "Compute 3D gradient along one axis (2nd order)");
+    def_3d<float>(m , "gradient_3d_order2" , &gradient_3d_order2<float> , "Compute 3D gradient along one axis (2nd order)");
 
-    m.def("gradient_1d_order6" , &gradient_1d_order6 ,
-        "Compute 1D gradient (6th order)" , py::arg("f") , py::arg("dx"));
+    def_3d<double>(m , "gradient_3d_order4" , &gradient_3d_order4<double> , "Compute 3D gradient along one axis (4th order)");
+    def_3d<float>(m , "gradient_3d_order4" , &gradient_3d_order4<float> , "Compute 3D gradient along one axis (4th order)");
 
-    m.def("gradient_2d_order2" , &gradient_2d_order2 ,
-        "Compute 2D gradient (2nd order)" , py::arg("f") , py::arg("dx") , py::arg("dy"));
+    def_3d<double>(m , "gradient_3d_order6" , &gradient_3d_order6<double> , "Compute 3D gradient along one axis (6th order)");
+    def_3d<float>(m , "gradient_3d_order6" , &gradient_3d_order6<float> , "Compute 3D gradient along one axis (6th order)");
 
-    m.def("gradient_2d_order4" , &gradient_2d_order4 ,
-        "Compute 2D gradient (4th order)" , py::arg("f") , py::arg("dx") , py::arg("dy"));
+    def_compact<double>(m);
+    def_compact<float>(m);
 
-    m.def("gradient_2d_order6" , &gradient_2d_order6 ,
-        "Compute 2D gradient (6th order)" , py::arg("f") , py::arg("dx") , py::arg("dy"));
+    m.def("num_threads" , &gradient_num_threads , "Number of OpenMP threads the kernels use (1 without OpenMP)");
 }
@@ -0,0 +1,215 @@
+import os
+import sys
+import argparse
+import numpy as np
+from adios2 import Adios, Stream
+from mpi4py import MPI
+from rich.traceback import install
+from writers import add_writer_arguments, configure_writer
+
+# mygrad is built by CMake into ../build
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "build"))
+import mygrad
+
+# array axis -> coordinate name (axis 2 is x, as in divCurl)
+AXIS_NAMES = {0: "z", 1: "y", 2: "x"}
+
+
+def parse_arguments():
+    install()
+    parser = argparse.ArgumentParser(description="Out-of-core gradients of 3D fields, one block of planes at a time")
+    parser.add_argument("inputs", nargs="+",
+                        help="An ADIOS2 .bp file, or one or more .npy files (one field each)")
+    parser.add_argument("--vars", type=str, default="ux,uy,uz",
+                        help="Comma-separated variables to differentiate (.bp input only)")
+    parser.add_argument("--max_steps", type=int, default=1, help="Steps to process (.bp input only)")
+    parser.add_argument("--order", type=int, default=6, choices=[2, 4, 6], help="Finite difference order")
+    parser.add_argument("--spacing", type=float, nargs=3, default=[1.0, 1.0, 1.0],
+                        help="Grid spacing along array axes 0, 1, 2 (z, y, x)")
+    parser.add_argument("--axes", type=int, nargs="+", default=[0, 1, 2], choices=[0, 1, 2],
+                        help="Array axes to differentiate along")
+    parser.add_argument("--chunk", type=int, default=32,
+                        help="Planes along axis 0 per block; peak memory is about 2*(chunk+order)*n1*n2 values")
+    parser.add_argument("--xml", type=str, default=None, help="ADIOS2 XML configuration file")
+    parser.add_argument("--output", "-o", type=str, default=None,
+                        help="Output .bp file (default gradients.bp) or directory for .npy output (default gradients)")
+    add_writer_arguments(parser)
+    return parser.parse_args()
+
+
+def plane_blocks(n0, chunk, halo, width):
+    """(read_start, read_stop, start, stop) for each block of planes along axis 0.
+
+    Planes start:stop are the ones the block produces; the read window adds
+    `halo` planes on each side so those planes get the same central stencil
+    as in a whole-array pass, and is widened to at least `width` planes so the
+    kernel never falls back to a lower order on a short window.
+    """
+    for start in range(0, n0, chunk):
+        stop = min(start + chunk, n0)
+        lo = max(start - halo, 0)
+        hi = min(stop + halo, n0)
+        if hi - lo < width:
+            lo = max(min(lo, hi - width), 0)
+            hi = min(max(hi, lo + width), n0)
+        yield lo, hi, start, stop
+
+
+def chunked_gradient(read, write, shape, spacing, order=6, chunk=32, axes=(0, 1, 2), blocks=None):
+    """Differentiate a 3D field block by block without ever holding all of it.
+
+    read(lo, hi) returns planes lo:hi along axis 0, write(axis, start, grad)
+    stores the derivative along `axis` for planes start:start+len(grad).
+    Only one input block and one derivative block are alive at a time.
+    `blocks` restricts the work to a subset of plane_blocks (e.g. per rank).
+    """
+    if chunk < 1:
+        raise ValueError("chunk must be at least 1")
+    kernel = getattr(mygrad, f"gradient_3d_order{order}")
+    if blocks is None:
+        blocks = list(plane_blocks(shape[0], chunk, order // 2, order + 1))
+
+    for lo, hi, start, stop in blocks:
+        block = np.asarray(read(lo, hi))
+        if block.dtype not in (np.float32, np.float64):
+            block = block.astype(np.float64)
+        block = np.ascontiguousarray(block)
+        for axis in axes:
+            grad = kernel(block, spacing[axis], axis)
+            write(axis, start, grad[start - lo:stop - lo])
+            del grad
+        del block
+
+
+def output_name(var, axis):
+    return f"d{var}_d{AXIS_NAMES[axis]}"
+
+
+def run_npy(args, comm):
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    output = args.output or "gradients"
+    if rank == 0:
+        os.makedirs(output, exist_ok=True)
+    comm.Barrier()
+
+    for path in args.inputs:
+        var = os.path.splitext(os.path.basename(path))[0]
+        field = np.load(path, mmap_mode="r")
+        if field.ndim == 2:
+            field = field[np.newaxis]
+        if field.ndim != 3:
+            if rank == 0:
+                print(f"Skipping {path}: expected a 2D or 3D array, got shape {field.shape}")
+            continue
+        dtype = field.dtype if field.dtype in (np.float32, np.float64) else np.float64
+
+        paths = {axis: os.path.join(output, output_name(var, axis) + ".npy") for axis in args.axes}
+        if rank == 0:
+            for p in paths.values():
+                np.lib.format.open_memmap(p, mode="w+", dtype=dtype, shape=field.shape).flush()
+        comm.Barrier()
+        outputs = {axis: np.load(p, mmap_mode="r+") for axis, p in paths.items()}
+
+        def write(axis, start, grad):
+            outputs[axis][start:start + grad.shape[0]] = grad
+
+        blocks = list(plane_blocks(field.shape[0], args.chunk, args.order // 2, args.order + 1))
+        chunked_gradient(lambda lo, hi: field[lo:hi], write, field.shape, args.spacing,
+                         args.order, args.chunk, args.axes, blocks[rank::size])
+        for out in outputs.values():
+            out.flush()
+        del outputs
+        comm.Barrier()
+        if rank == 0:
+            print(f"{path}: wrote {', '.join(paths.values())}")
+
+
+def run_bp(args, comm):
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    input_file = args.inputs[0]
+    output = args.output or "gradients.bp"
+    variables = args.vars.split(',')
+
+    if args.xml is None:
+        adios_obj = Adios(comm)
+    else:
+        adios_obj = Adios(args.xml, comm)
+
+    Rio = adios_obj.declare_io("readerIO")
+    Wio = adios_obj.declare_io("WriteIO")
+    configure_writer(Wio, args)
+
+    with Stream(Rio, input_file, "r", comm) as s, Stream(Wio, output, "w", comm) as w:
+        for _ in s:
+            current_step = s.current_step()
+            if rank == 0:
+                print(f"Processing step {current_step}")
+
+            w.begin_step()
+            for var in variables:
+                if var not in s.available_variables():
+                    if rank == 0:
+                        print(f"Variable {var} not found, skipping it")
+                    continue
+                var_in = Rio.inquire_variable(var)
+                shape = var_in.shape()
+                is_2d = len(shape) == 2
+                if is_2d:
+                    shape = [1] + shape
+                if len(shape) != 3:
+                    if rank == 0:
+                        print(f"Skipping {var}: expected a 2D or 3D variable, got shape {shape}")
+                    continue
+
+                def read(lo, hi):
+                    if is_2d:
+                        var_in.set_selection(([0, 0], shape[1:]))
+                        return s.read(var_in)[np.newaxis]
+                    var_in.set_selection(([lo, 0, 0], [hi - lo, shape[1], shape[2]]))
+                    return s.read(var_in)
+
+                def write(axis, start, grad):
+                    w.write(output_name(var, axis), grad, shape, [start, 0, 0], list(grad.shape))
+
+                blocks = list(plane_blocks(shape[0], args.chunk, args.order // 2, args.order + 1))
+                # rank r takes blocks r, r + size, ...; BP5 keeps every put until end_step, so each
+                # round of blocks is flushed to disk (collectively, also by ranks without a block)
+                for first in range(0, len(blocks), size):
+                    chunked_gradient(read, write, shape, args.spacing, args.order, args.chunk,
+                                     args.axes, blocks[first + rank:first + rank + 1])
+                    w.engine.perform_data_write()
+            w.end_step()
+
+            if current_step >= args.max_steps - 1:
+                if rank == 0:
+                    print(f"Reached max_steps = {args.max_steps}")
+                break
+
+    if rank == 0:
+        print(f"Output written to {output}")
+
+
+def main():
+    install()
+    comm = MPI.COMM_WORLD
+    args = parse_arguments()
+
+    if comm.Get_rank() == 0:
+        print(f"Running with {comm.Get_size()} MPI processes")
+        print(f"Order {args.order}, {args.chunk} planes per block, axes {args.axes}")
+
+    if len(args.inputs) == 1 and args.inputs[0].rstrip("/").endswith(".bp"):
+        run_bp(args, comm)
+    elif all(p.endswith(".npy") for p in args.inputs):
+        run_npy(args, comm)
+    else:
+        if comm.Get_rank() == 0:
+            print("Error: give one .bp file or one or more .npy files")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    install()
+    main()
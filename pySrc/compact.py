@@ -0,0 +1,32 @@
+import os
+import sys
+import numpy as np
+from slabs import transpose_slabs
+
+# mygrad is built by CMake into ../build
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "build"))
+import mygrad
+
+
+def compact_derivative(block, h, axis, comm=None, deriv=1, periodic=False, split_axis=2):
+    """6th order compact (xcompact3d) derivative of a slab-decomposed field.
+
+    `block` is this rank's part of the global array, split along `split_axis`
+    (the usual z-slabs). Derivatives along any other axis are local. Along the
+    split axis the block is transposed so that axis is complete on every rank,
+    differentiated, and transposed back, so the result matches a serial solve
+    of the full tridiagonal (or cyclic) system.
+    """
+    axis = axis % block.ndim
+    split_axis = split_axis % block.ndim
+
+    if axis != split_axis or comm is None or comm.Get_size() == 1:
+        return mygrad.compact_derivative(np.ascontiguousarray(block), h, axis, deriv, periodic)
+
+    # split along the longest other axis so every rank gets some of it
+    others = [d for d in range(block.ndim) if d != split_axis]
+    split_to = max(others, key=lambda d: block.shape[d])
+
+    pencil = transpose_slabs(np.ascontiguousarray(block), comm, split_from=split_axis, split_to=split_to)
+    result = mygrad.compact_derivative(pencil, h, axis, deriv, periodic)
+    return transpose_slabs(result, comm, split_from=split_to, split_to=split_axis)
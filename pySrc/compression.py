@@ -1,7 +1,20 @@
+import os
 import sys
+import time
+import shutil
 import argparse
+import tempfile
+import itertools
+from xml.etree import ElementTree
+import numpy as np
 from adios2 import Adios, Stream
 from mpi4py import MPI
+from stepReader import StepReader, ADIOS_TYPES
+from writers import add_writer_arguments, configure_writer
+
+CODECS = ('mgard', 'sz', 'zfp', 'blosc')
+# MGARD, SZ and ZFP only take floating point data
+LOSSY_TYPES = (np.dtype(np.float32), np.dtype(np.float64))
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Generate streamline plots from ADIOS2 BP5 files')
@@ -13,7 +26,7 @@ def parse_arguments():
     parser.add_argument('--errorBound', '-eb',
                         type=float,
                         default=0,
-                        help='Error bound for compression (default: 0). No compression if 0. If using XML, it will take settings from there (optional)')
+                        help='Error bound for compression (default: 0). No compression if 0. Without XML and --codec, applies MGARD with this absolute accuracy to every variable. If using XML, it will take settings from there (optional)')
 
     parser.add_argument('max_steps',
                         type=int,
@@ -34,106 +47,513 @@ def parse_arguments():
                         default=None,
                         help="If provided, compress only this specific step (optional)")
 
+    parser.add_argument('--codec',
+                        action='append',
+                        default=[],
+                        metavar='VAR=CODEC[:key=value,...]',
+                        help='Per-variable compressor without XML, e.g. ux=mgard:accuracy=1e-3,mode=ABS, '
+                             'pp=zfp:rate=8 or "*=blosc:clevel=5" for every other variable. '
+                             'Codecs: ' + ', '.join(CODECS) + '. Repeat for several variables (optional)')
+
+    parser.add_argument('--temporal',
+                        type=int,
+                        default=0,
+                        help='Temporal mode: compress the difference from the previous (reconstructed) step, '
+                             'with a full keyframe every N steps. 0 disables it (default: 0)')
+
+    parser.add_argument('--restore',
+                        action='store_true',
+                        help='Rebuild the full fields of a file written with --temporal into --output')
+
+    parser.add_argument('--target', '-t',
+                        choices=['ratio', 'rmse', 'rel'],
+                        default=None,
+                        help='Adaptive mode: pick the MGARD tolerance per variable and step to reach a compression ratio, '
+                             'a maximum RMSE, or a maximum error relative to the value range (optional)')
+
+    parser.add_argument('--target_value', '-tv',
+                        type=float,
+                        default=None,
+                        help='Value of the adaptive target, e.g. 50 for --target ratio or 1e-3 for --target rel')
+
+    parser.add_argument('--sample_blocks',
+                        type=int,
+                        default=4,
+                        help='Blocks per rank sampled by the tolerance search (default: 4)')
+
+    parser.add_argument('--sample_size',
+                        type=int,
+                        default=32,
+                        help='Edge length of the sampled blocks (default: 32)')
+
+    parser.add_argument('--search_iters',
+                        type=int,
+                        default=12,
+                        help='Bisection steps of the tolerance search (default: 12)')
+
+    add_writer_arguments(parser)
     return parser.parse_args()
 
 
-def adios2_reader(bp_file, xml_file, error_bound, max_steps, compress_step, output_file="compressed.bp"):
+def parse_codec_specs(specs, error_bound=0):
+    """{variable or '*': (codec, {parameter: value})} from --codec arguments.
+
+    Without any --codec, a non-zero error bound means MGARD with that
+    absolute accuracy on every variable.
+    """
+    codecs = {}
+    for spec in specs:
+        if '=' not in spec:
+            raise ValueError(f"codec spec '{spec}' is not VAR=CODEC[:key=value,...]")
+        var, rest = spec.split('=', 1)
+        kind, _, params = rest.partition(':')
+        kind = kind.strip().lower()
+        if kind not in CODECS:
+            raise ValueError(f"unknown codec '{kind}' in '{spec}', choose from {', '.join(CODECS)}")
+        parameters = {}
+        for item in filter(None, params.split(',')):
+            key, eq, value = item.partition('=')
+            if not eq:
+                raise ValueError(f"codec parameter '{item}' in '{spec}' is not key=value")
+            parameters[key.strip()] = value.strip()
+        codecs[var.strip()] = (kind, parameters)
+
+    if not codecs and error_bound > 0:
+        codecs['*'] = ('mgard', {'accuracy': str(error_bound), 'mode': 'ABS'})
+    return codecs
+
+
+def define_codec_operators(adios, codecs, rank):
+    """One operator per codec in use; None for codecs ADIOS2 wasn't built with."""
+    kinds = {kind for kind, _ in codecs.values()}
+    if kinds - {'blosc'}:
+        kinds.add('blosc')  # lossless fallback for lossy codecs that are missing
+    operators = {}
+    for kind in sorted(kinds):
+        try:
+            operators[kind] = adios.define_operator(f"Compress{kind.upper()}", kind, {})
+        except Exception:
+            operators[kind] = None
+            if rank == 0:
+                print(f"Warning: ADIOS2 was not compiled with {kind}")
+    return operators
+
+
+def attach_codec(var_out, name, codecs, operators, rank, default=None, dtype=None):
+    """Attach the --codec compressor for a variable, replacing any XML operation.
+
+    Lossy codecs are only attached to float32/float64 arrays (dtype); other
+    types get lossless blosc instead. Returns the (codec, parameters) the
+    variable ends up with, None if it is written uncompressed, or `default`
+    (the XML operation) if there is no spec.
+    """
+    spec = codecs.get(name, codecs.get('*'))
+    if spec is None:
+        return default
+    kind, params = spec
+    if kind != 'blosc' and dtype is not None and np.dtype(dtype) not in LOSSY_TYPES:
+        if rank == 0:
+            print(f"  {name}: {kind} needs float32/float64 data, {np.dtype(dtype).name} is kept lossless")
+        kind, params = 'blosc', {}
+    if operators.get(kind) is None:
+        if kind != 'blosc' and operators.get('blosc') is not None:
+            if rank == 0:
+                print(f"  {name}: {kind} unavailable, falling back to lossless blosc")
+            kind, params = 'blosc', {}
+        else:
+            if rank == 0:
+                print(f"  {name}: {kind} unavailable, writing uncompressed")
+            var_out.remove_operations()
+            return None
+    var_out.remove_operations()
+    var_out.add_operation(operators[kind], params)
+    if rank == 0:
+        print(f"  {name}: {kind} {params}")
+    return kind, params
+
+
+def xml_operations(xml_file, io_name="WriteIOCompressed"):
+    """{variable: (codec, parameters)} configured in the XML for the write IO."""
+    if xml_file is None:
+        return {}
+    with open(xml_file) as fh:
+        text = fh.read()
+    # the shipped config has stray text around the root element
+    text = text[text.index("<adios-config"):text.rindex("</adios-config>") + len("</adios-config>")]
+    operations = {}
+    for io in ElementTree.fromstring(text).iter("io"):
+        if io.get("name") != io_name:
+            continue
+        for var in io.iter("variable"):
+            op = var.find("operation")
+            if op is not None:
+                params = {p.get("key"): p.get("value") for p in op.iter("parameter")}
+                operations[var.get("name")] = (op.get("type").lower(), params)
+    return operations
+
+
+def plan_variable(Wio, name, info, slab):
+    """Output variable for one input variable, from its metadata and this rank's slab.
+
+    Arrays keep the reader's split over ranks (StepReader: axis 2, the last
+    axis of 1D/2D arrays); single values and strings (slab None) are copied by
+    rank 0. The plan is reused every step until the variable's shape changes.
+    Returns None for unsupported types.
+    """
+    kind = info.get("Type", "")
+    if kind != "string" and kind not in ADIOS_TYPES:
+        return None
+    var_out = Wio.inquire_variable(name)
+    plan = {"shape_key": info.get("Shape", ""), "new": var_out is None}
+
+    if slab is None:
+        if var_out is None:
+            content = "" if kind == "string" else np.empty(0, dtype=ADIOS_TYPES[kind])
+            var_out = Wio.define_variable(name, content)
+        plan.update(scalar=True, var_out=var_out)
+        return plan
+
+    if var_out is None:
+        var_out = Wio.define_variable(name, np.empty(0, dtype=ADIOS_TYPES[kind]), slab.shape, slab.write_start,
+                                      slab.write_count)
+    else:
+        var_out.set_shape(slab.shape)
+        var_out.set_selection((slab.write_start, slab.write_count))
+    plan.update(scalar=False, var_out=var_out, dtype=ADIOS_TYPES[kind], empty=slab.count == 0)
+    return plan
+
+
+_probe_ids = itertools.count()
+
+
+def compressed_roundtrip(adios, operator, params, blocks, workdir, timings=None):
+    """Write blocks through an operator into a scratch BP file on this rank and read them back.
+
+    Returns the decoded blocks and the bytes the data files take on disk.
+    If `timings` is a dict, the write and read wall times are stored under
+    "compress" and "decompress".
+    """
+    if not blocks:
+        return [], 0
+    io_name = f"AdaptiveProbe{next(_probe_ids)}"
+    path = os.path.join(workdir, io_name + ".bp")
+
+    io = adios.declare_io(io_name)
+    t0 = time.perf_counter()
+    with Stream(io, path, "w", MPI.COMM_SELF) as w:
+        w.begin_step()
+        for i, block in enumerate(blocks):
+            var = io.define_variable(f"b{i}", block, list(block.shape), [0] * block.ndim, list(block.shape))
+            var.add_operation(operator, params)
+            w.write(var, block)
+        w.end_step()
+    t1 = time.perf_counter()
+    adios.remove_io(io_name)
+
+    nbytes = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path) if f.startswith("data."))
+
+    io = adios.declare_io(io_name)
+    decoded = []
+    t2 = time.perf_counter()
+    with Stream(io, path, "r", MPI.COMM_SELF) as r:
+        for _ in r:
+            decoded = [r.read(f"b{i}") for i in range(len(blocks))]
+    t3 = time.perf_counter()
+    adios.remove_io(io_name)
+    if timings is not None:
+        timings["compress"] = t1 - t0
+        timings["decompress"] = t3 - t2
+    shutil.rmtree(path, ignore_errors=True)
+    return decoded, nbytes
+
+
+def sample_blocks(data, count, size, rng):
+    """Up to `count` random blocks of edge `size` from the local data (all of it if it is small)."""
+    if data.size == 0:
+        return []
+    edges = [min(n, size) for n in data.shape]
+    if count * np.prod(edges) >= data.size:
+        return [np.ascontiguousarray(data)]
+    blocks = []
+    for _ in range(count):
+        corner = [rng.integers(0, n - e + 1) for n, e in zip(data.shape, edges)]
+        index = tuple(slice(c, c + e) for c, e in zip(corner, edges))
+        blocks.append(np.ascontiguousarray(data[index]))
+    return blocks
+
+
+def choose_tolerance(data, target, value, roundtrip, comm, blocks, iters=12, dtype=None):
+    """Bisect the absolute tolerance (in log space) so the sampled blocks meet the target.
+
+    roundtrip(blocks, tolerance) -> (decoded blocks, compressed bytes). The
+    metrics are reduced over all ranks at every probe, so every rank ends up
+    with the same tolerance. Error targets return the largest tolerance that
+    still meets the bound, the ratio target the smallest one that reaches it.
+    Returns (tolerance, metrics of the sampled blocks at that tolerance), or
+    (None, None) for a dtype MGARD can't compress (not float32/float64).
+    """
+    if dtype is not None and np.dtype(dtype) not in LOSSY_TYPES:
+        return None, None
+    local_min = float(data.min()) if data.size else np.inf
+    local_max = float(data.max()) if data.size else -np.inf
+    value_range = comm.allreduce(local_max, op=MPI.MAX) - comm.allreduce(local_min, op=MPI.MIN)
+    if not np.isfinite(value_range) or value_range <= 0:
+        value_range = 1.0
+
+    raw_bytes = sum(b.nbytes for b in blocks)
+
+    def probe(tolerance):
+        decoded, nbytes = roundtrip(blocks, tolerance)
+        sq = sum(float(np.sum((d.astype(np.float64) - b) ** 2)) for b, d in zip(blocks, decoded))
+        err = max((float(np.max(np.abs(d.astype(np.float64) - b))) for b, d in zip(blocks, decoded)), default=0.0)
+        totals = comm.allreduce(np.array([raw_bytes, nbytes, sq, sum(b.size for b in blocks)], dtype=np.float64))
+        err = comm.allreduce(err, op=MPI.MAX)
+        return {
+            "ratio": totals[0] / max(totals[1], 1.0),
+            "rmse": np.sqrt(totals[2] / max(totals[3], 1.0)),
+            "rel": err / value_range,
+        }
+
+    def meets(metrics):
+        if target == "ratio":
+            return metrics["ratio"] >= value
+        return metrics[target] <= value
+
+    # feasible tolerances are an interval: below the answer for error targets, above it for ratio
+    lo, hi = np.log(value_range * 1e-8), np.log(value_range)
+    lo_metrics, hi_metrics = None, None
+    for _ in range(iters):
+        mid = 0.5 * (lo + hi)
+        metrics = probe(np.exp(mid))
+        if meets(metrics) == (target != "ratio"):
+            lo, lo_metrics = mid, metrics
+        else:
+            hi, hi_metrics = mid, metrics
+
+    if target == "ratio":
+        tolerance, metrics = np.exp(hi), hi_metrics
+    else:
+        tolerance, metrics = np.exp(lo), lo_metrics
+    if metrics is None:
+        metrics = probe(tolerance)
+    return tolerance, metrics
+
+
+def adios2_reader(bp_file, xml_file, error_bound, max_steps, compress_step, output_file="compressed.bp",
+                  target=None, target_value=None, sample_count=4, sample_size=32, search_iters=12, codec_specs=(),
+                  temporal=0, writer_args=None):
     comm = MPI.COMM_WORLD
     rank = comm.Get_rank()
-    size = comm.Get_size()
 
     if xml_file is None:
         adios = Adios(comm)
-        op = adios.define_operator("CompressMGARD", "mgard", {"tolerance": str(error_bound)})
-        if rank == 0:
-            print("Using MGARD compression with error bound =", error_bound)
-            print("Code doesn't work without XML yet")
-        sys.exit(1)
+        # the error bound only applies when there is no XML to take settings from
+        codecs = parse_codec_specs(codec_specs, error_bound)
+        if rank == 0 and not codecs and target is None:
+            print("No codec and error bound 0: writing uncompressed")
     else:
         adios = Adios(xml_file, comm)
-        op = None
+        codecs = parse_codec_specs(codec_specs)
         if rank == 0:
             print("Using compression settings from XML")
 
-    Rio = adios.declare_io("ReadIOCompressed")
-    Wio = adios.declare_io("WriteIOCompressed")
+    operators = define_codec_operators(adios, codecs, rank) if codecs and target is None else {}
 
-    if rank == 0:
-        print(f"Opening input file: {bp_file}")
+    if target is not None or temporal > 0:
+        # scratch round trips on this rank: tolerance search and temporal reconstruction
+        probe_adios = Adios(MPI.COMM_SELF)
+        probe_ops = {}
+        workdir = tempfile.mkdtemp(prefix=f"compression_rank{rank}_")
 
-    with Stream(Rio, bp_file, "r", comm) as s, Stream(Wio, output_file, "w", comm) as w:
-        variables_defined = False
-
-        for step in s:
-            status = s.begin_step()
-            if not status:
-                break
-            
-            current = s.current_step()
-            comm.Barrier()
+        def probe_operator(kind):
+            if kind not in probe_ops:
+                probe_ops[kind] = probe_adios.define_operator(f"Probe{kind.upper()}", kind, {})
+            return probe_ops[kind]
 
+    if target is not None:
+        # replaces whatever the XML attaches to each variable
+        try:
+            op = adios.define_operator("AdaptiveMGARD", "mgard", {})
+        except Exception:
             if rank == 0:
-                print(f"Processing step {current}")
+                print("Error: adaptive mode (--target) needs ADIOS2 compiled with MGARD")
+            shutil.rmtree(workdir, ignore_errors=True)
+            sys.exit(1)
 
-            if compress_step is None or compress_step == current:
-                w.begin_step()
-                comm.Barrier()
+        def roundtrip(blocks, tolerance):
+            return compressed_roundtrip(probe_adios, probe_operator("mgard"),
+                                        {"accuracy": str(tolerance), "mode": "ABS"}, blocks, workdir)
 
-                if not variables_defined:
-                    for name, info in s.available_variables().items():
-                        var_in = Rio.inquire_variable(name)
-                        shape = var_in.shape()
-
-                        if not shape or len(shape) < 3:
-                            continue
+        if rank == 0:
+            print(f"Adaptive MGARD tolerance per variable and step, target {target} = {target_value}")
 
-                        total_slices = shape[2]
-                        base = total_slices // size
-                        rem = total_slices % size
-                        local_count_2 = base + 1 if rank < rem else base
-                        local_start_2 = rank * base + min(rank, rem)
+    if temporal > 0:
+        xml_codecs = xml_operations(xml_file)
+        # reconstruction of the previous step, exactly as a reader will decode it
+        previous = {}
 
-                        start = [0, 0, local_start_2] + [0] * (len(shape) - 3)
-                        count = list(shape)
-                        count[2] = local_count_2
+        def decode(payload, codec):
+            if codec is None or codec[0] == "blosc" or payload.size == 0:
+                return payload
+            decoded, _ = compressed_roundtrip(probe_adios, probe_operator(codec[0]), codec[1], [payload], workdir)
+            return decoded[0].reshape(payload.shape)
 
-                        var_in.set_selection((start, count))
-                        data = s.read(var_in)
+        if rank == 0:
+            print(f"Temporal mode: differences from the previous step, keyframe every {temporal} steps")
 
-                        var_out = Wio.define_variable(name, data, shape, start, count)
-                        if op:
-                            var_out.add_operation(op, {})
+    Wio = adios.declare_io("WriteIOCompressed")
+    configure_writer(Wio, writer_args)
 
-                    variables_defined = True
+    if rank == 0:
+        print(f"Opening input file: {bp_file}")
+    # steps other than compress_step are skipped without reading them
+    reader = StepReader(bp_file, None, comm, xml=xml_file, io_name="ReadIOCompressed", max_steps=max_steps,
+                        steps=None if compress_step is None else [compress_step])
 
-                for name, info in s.available_variables().items():
-                    var_in = Rio.inquire_variable(name)
-                    shape = var_in.shape()
+    plans = {}
+    var_codecs = {}
+    written = 0
+    with Stream(Wio, output_file, "w", comm) as w:
+        if temporal > 0:
+            w.write_attribute("temporal_keyframe_interval", temporal)
 
-                    if not shape or len(shape) < 3:
-                        continue
+        for step in reader:
+            current = step.step
 
-                    total_slices = shape[2]
-                    base = total_slices // size
-                    rem = total_slices % size
-                    local_count_2 = base + 1 if rank < rem else base
-                    local_start_2 = rank * base + min(rank, rem)
+            if rank == 0:
+                print(f"Processing step {current}")
 
-                    start = [0, 0, local_start_2] + [0] * (len(shape) - 3)
-                    count = list(shape)
-                    count[2] = local_count_2
+            w.begin_step()
 
-                    var_in.set_selection((start, count))
-                    data = s.read(var_in)
-                    w.write(name, data)
+            for name, info in step.available.items():
+                plan = plans.get(name)
+                if plan is None or plan["shape_key"] != info.get("Shape", ""):
+                    plan = plan_variable(Wio, name, info, step.slabs.get(name)) if name in step else None
+                    if plan is None:
+                        if rank == 0:
+                            print(f"  {name}: unsupported type {info.get('Type')}, skipping it")
+                        continue
+                    plans[name] = plan
+                    if plan["new"] and not plan["scalar"] and target is None:
+                        default = xml_codecs.get(name) if temporal > 0 else None
+                        var_codecs[name] = attach_codec(plan["var_out"], name, codecs, operators, rank, default,
+                                                        plan["dtype"])
+
+                if plan["scalar"]:
+                    if rank == 0:
+                        w.write(plan["var_out"], step[name])
+                    continue
+
+                data = step[name]
+
+                # temporal mode writes data - reconstruction of the previous step
+                delta = temporal > 0 and np.issubdtype(plan["dtype"], np.floating)
+                payload = data
+                if delta:
+                    last = previous.get(name)
+                    keyframe = written % temporal == 0 or last is None or last.shape != data.shape
+                    if not keyframe:
+                        payload = data - last
+                    if rank == 0:
+                        w.write(f"{name}_keyframe", int(keyframe))
+
+                if target is not None:
+                    rng = np.random.default_rng([current, rank])
+                    blocks = sample_blocks(payload, sample_count, sample_size, rng)
+                    # the bound is on the field: its range, the payload's error
+                    tolerance, metrics = choose_tolerance(data, target, target_value, roundtrip, comm,
+                                                          blocks, search_iters, plan["dtype"])
+                    plan["var_out"].remove_operations()
+                    if tolerance is None:
+                        var_codecs[name] = None
+                        if rank == 0:
+                            print(f"  {name}: {np.dtype(plan['dtype']).name} data, written uncompressed")
+                    else:
+                        params = {"accuracy": str(tolerance), "mode": "ABS"}
+                        plan["var_out"].add_operation(op, params)
+                        var_codecs[name] = ("mgard", params)
+                        if rank == 0:
+                            print(f"  {name}: tolerance {tolerance:.3e}, sampled ratio {metrics['ratio']:.1f}, "
+                                  f"rmse {metrics['rmse']:.3e}, rel {metrics['rel']:.3e}")
+                            w.write(f"{name}_tolerance", tolerance)
+
+                if delta:
+                    # closed loop: the next delta is taken from what the reader will see,
+                    # so codec errors don't accumulate across steps
+                    decoded = decode(payload, var_codecs.get(name))
+                    previous[name] = decoded.copy() if keyframe else last + decoded
+
+                if not plan["empty"]:
+                    w.write(plan["var_out"], payload)
+
+            w.end_step()
+            written += 1
+
+            if step.index == max_steps - 1 and rank == 0:
+                print(f"Reached max_steps = {max_steps}")
+
+    if target is not None or temporal > 0:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def temporal_restore(bp_file, output_file, xml_file=None, writer_args=None):
+    """Undo temporal mode: add each step's decoded differences back onto the previous step.
+
+    Variables with a <name>_keyframe flag hold the full field on keyframes and
+    the difference from the previous reconstruction otherwise; everything else
+    is copied through. The output is written without compression.
+    """
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
 
-                w.end_step()
-                comm.Barrier()
+    if xml_file is None:
+        adios = Adios(comm)
+    else:
+        adios = Adios(xml_file, comm)
+    Wio = adios.declare_io("WriteIORestored")
+    configure_writer(Wio, writer_args)
+    reader = StepReader(bp_file, None, comm, xml=xml_file, io_name="ReadIOCompressed")
+
+    plans = {}
+    fields = {}
+    with Stream(Wio, output_file, "w", comm) as w:
+        for step in reader:
+            current = step.step
+            if rank == 0:
+                print(f"Restoring step {current}")
+            available = step.available
+
+            w.begin_step()
+            for name, info in available.items():
+                if name.endswith("_keyframe") and name[:-len("_keyframe")] in available:
+                    continue
+                plan = plans.get(name)
+                if plan is None or plan["shape_key"] != info.get("Shape", ""):
+                    plan = plan_variable(Wio, name, info, step.slabs.get(name)) if name in step else None
+                    if plan is None:
+                        continue
+                    plans[name] = plan
+
+                if plan["scalar"]:
+                    if rank == 0:
+                        w.write(plan["var_out"], step[name])
+                    continue
+                if plan["empty"]:
+                    continue
+
+                data = step[name]
+                if f"{name}_keyframe" in available:
+                    if step[f"{name}_keyframe"] or name not in fields:
+                        # the read buffer is reused next step
+                        fields[name] = data.copy()
+                    else:
+                        fields[name] = fields[name] + data
+                    data = fields[name]
+                w.write(plan["var_out"], data)
+            w.end_step()
 
-            if not status or current >= max_steps - 1:
-                if rank == 0:
-                    print(f"Reached max_steps = {max_steps}")
-                break
+    if rank == 0:
+        print(f"Restored fields written to {output_file}")
 
 
 def main():
@@ -158,6 +578,30 @@ def main():
             print("Error: max_steps must be a positive integer.")
         sys.exit(1)
 
+    if args.restore:
+        temporal_restore(input_file, output_file, adios2_xml, args)
+        return
+
+    if args.temporal < 0:
+        if rank == 0:
+            print("Error: --temporal must be 0 or a positive keyframe interval.")
+        sys.exit(1)
+
+    if args.target is not None and (args.target_value is None or args.target_value <= 0):
+        if rank == 0:
+            print("Error: --target needs a positive --target_value.")
+        sys.exit(1)
+
+    try:
+        parse_codec_specs(args.codec)
+    except ValueError as e:
+        if rank == 0:
+            print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.target is not None and args.codec and rank == 0:
+        print("Adaptive mode compresses every variable with MGARD, ignoring --codec")
+
     if rank == 0:
         print(f"Input file: {input_file}")
         print(f"ADIOS2 XML file: {adios2_xml}")
@@ -174,7 +618,15 @@ def main():
         error_bound=error_bound,
         max_steps=max_steps,
         compress_step=compress_step,
-        output_file=output_file
+        output_file=output_file,
+        target=args.target,
+        target_value=args.target_value,
+        sample_count=args.sample_blocks,
+        sample_size=args.sample_size,
+        search_iters=args.search_iters,
+        codec_specs=args.codec,
+        temporal=args.temporal,
+        writer_args=args
     )
 
 
@@ -0,0 +1,225 @@
+import sys
+import csv
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from adios2 import Adios
+from mpi4py import MPI
+from rich.traceback import install
+from stepReader import StepReader
+from compression import CODECS, compressed_roundtrip, define_codec_operators
+
+
+# ADIOS2 operator parameters for an absolute error bound; None = lossless, bound ignored
+def bound_parameters(codec, tolerance):
+    if codec == 'mgard':
+        return {'accuracy': repr(tolerance), 'mode': 'ABS'}
+    if codec in ('sz', 'zfp'):
+        return {'accuracy': repr(tolerance)}
+    return None
+
+
+def parse_arguments():
+    install()
+    parser = argparse.ArgumentParser(description='Sweep codecs and error bounds over ADIOS2 BP data')
+    parser.add_argument('path', type=str, help='Path to the BP file to benchmark')
+    parser.add_argument('--vars', '-v', type=str, default='ux,uy,uz', help='Comma-separated variables')
+    parser.add_argument('--steps', type=int, nargs='+', default=[0], help='Steps to benchmark (default: 0)')
+    parser.add_argument('--codecs', nargs='+', default=list(CODECS), choices=CODECS, help='Codecs to sweep')
+    parser.add_argument('--bounds', type=float, nargs='+', default=[1e-1, 3e-2, 1e-2, 3e-3, 1e-3, 1e-4],
+                        help='Error bounds to sweep, relative to each variable\'s value range')
+    parser.add_argument('--absolute', action='store_true', help='Treat --bounds as absolute tolerances')
+    parser.add_argument('--select', choices=['rmse', 'linf'], default='linf',
+                        help='Error used to choose the operating point (default: linf)')
+    parser.add_argument('--max_error', type=float, default=1e-2,
+                        help='Largest acceptable --select error, relative to the value range (default: 1e-2)')
+    parser.add_argument('--xml', '-x', type=str, default=None, help='ADIOS2 XML configuration for reading')
+    parser.add_argument('--csv', type=str, default='compression_benchmark.csv', help='Per step results')
+    parser.add_argument('--xml_out', type=str, default='compression_operators.xml',
+                        help='XML snippet with the chosen operation per variable')
+    return parser.parse_args()
+
+
+def pareto_front(rows):
+    """Rows not beaten on both ratio (higher) and RMSE (lower) by another row, sorted by ratio."""
+    front = []
+    for row in rows:
+        dominated = any(o['ratio'] >= row['ratio'] and o['rmse'] <= row['rmse'] and
+                        (o['ratio'] > row['ratio'] or o['rmse'] < row['rmse']) for o in rows)
+        if not dominated:
+            front.append(row)
+    return sorted(front, key=lambda r: r['ratio'])
+
+
+def xml_snippet(choices):
+    lines = []
+    for var, row in choices.items():
+        lines.append(f'    <variable name="{var}">')
+        lines.append(f'      <operation type="{row["codec"]}">')
+        for key, value in row['params'].items():
+            lines.append(f'        <parameter key="{key}" value="{value}"/>')
+        lines.append('      </operation>')
+        lines.append('    </variable>')
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def benchmark(args, comm):
+    rank = comm.Get_rank()
+    variables = args.vars.split(',')
+    steps = set(args.steps)
+
+    # every rank compresses its own slab through its own scratch files
+    probe_adios = Adios(MPI.COMM_SELF)
+    operators = define_codec_operators(probe_adios, {c: (c, {}) for c in args.codecs}, rank)
+    workdir = tempfile.mkdtemp(prefix=f'benchmark_rank{rank}_')
+
+    # z slabs of 3D arrays; the steps not benchmarked are skipped without being read
+    reader = StepReader(args.path, variables, comm, xml=args.xml, io_name='readerIO', max_steps=max(steps) + 1,
+                        steps=steps)
+    rows = []
+    for step in reader:
+        current = step.step
+        if rank == 0:
+            print(f'Benchmarking step {current}')
+
+        for var in variables:
+            if var not in step:
+                if rank == 0:
+                    print(f'Variable {var} not found, skipping it')
+                continue
+            slab = step.slabs[var]
+            shape = slab.shape if slab is not None else []
+            if len(shape) < 3:
+                if rank == 0:
+                    print(f'Skipping {var}: expected at least 3 dimensions, got {shape}')
+                continue
+
+            data = step[var]
+            blocks = [data] if data.size else []
+
+            local_min = float(data.min()) if data.size else np.inf
+            local_max = float(data.max()) if data.size else -np.inf
+            value_range = comm.allreduce(local_max, op=MPI.MAX) - comm.allreduce(local_min, op=MPI.MIN)
+            if value_range <= 0:
+                value_range = 1.0
+
+            for codec in args.codecs:
+                if operators.get(codec) is None:
+                    continue
+                lossless = bound_parameters(codec, 1.0) is None
+                for bound in ([None] if lossless else args.bounds):
+                    tolerance = None if lossless else (bound if args.absolute else bound * value_range)
+                    params = {} if lossless else bound_parameters(codec, tolerance)
+
+                    timings = {}
+                    comm.Barrier()
+                    decoded, nbytes = compressed_roundtrip(probe_adios, operators[codec], params,
+                                                           blocks, workdir, timings)
+                    diff = [d.astype(np.float64) - b for b, d in zip(blocks, decoded)]
+                    sq = sum(float(np.sum(e ** 2)) for e in diff)
+                    linf = max((float(np.max(np.abs(e))) for e in diff), default=0.0)
+
+                    raw = data.nbytes
+                    totals = comm.allreduce(np.array([raw, nbytes, sq, data.size], dtype=np.float64))
+                    linf = comm.allreduce(linf, op=MPI.MAX)
+                    # per-rank throughput, the slowest rank bounds a parallel run
+                    mb = raw / 2**20
+                    c_rate = comm.allreduce(mb / timings['compress'] if blocks else np.inf, op=MPI.MIN)
+                    d_rate = comm.allreduce(mb / timings['decompress'] if blocks else np.inf, op=MPI.MIN)
+
+                    rmse = float(np.sqrt(totals[2] / max(totals[3], 1.0)))
+                    row = {
+                        'var': var, 'step': current, 'codec': codec,
+                        'bound': '' if lossless else bound, 'tolerance': '' if lossless else tolerance,
+                        'ratio': totals[0] / max(totals[1], 1.0),
+                        'compress_MBps': c_rate, 'decompress_MBps': d_rate,
+                        'rmse': rmse, 'linf': linf,
+                        'rel_rmse': rmse / value_range, 'rel_linf': linf / value_range,
+                        'params': params,
+                    }
+                    rows.append(row)
+                    if rank == 0:
+                        label = 'lossless' if lossless else f'bound {bound:g}'
+                        print(f'  {var} {codec:5s} {label:14s} ratio {row["ratio"]:8.2f}  '
+                              f'{c_rate:9.1f}/{d_rate:9.1f} MB/s  rmse {rmse:.3e}  linf {linf:.3e}')
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+def summarize(rows, args):
+    """Average each (var, codec, bound) over the steps, print Pareto tables, pick operating points."""
+    groups = {}
+    for row in rows:
+        groups.setdefault((row['var'], row['codec'], row['bound']), []).append(row)
+
+    summary = {}
+    for (var, codec, bound), group in groups.items():
+        entry = {k: float(np.mean([r[k] for r in group]))
+                 for k in ('ratio', 'compress_MBps', 'decompress_MBps', 'rmse', 'linf', 'rel_rmse', 'rel_linf')}
+        # worst step decides whether the point is acceptable
+        entry['rel_rmse_max'] = max(r['rel_rmse'] for r in group)
+        entry['rel_linf_max'] = max(r['rel_linf'] for r in group)
+        # a relative bound gives one tolerance per step; the XML gets the tightest
+        tightest = group[0] if bound == '' else min(group, key=lambda r: r['tolerance'])
+        entry.update(codec=codec, bound=bound, params=tightest['params'])
+        summary.setdefault(var, []).append(entry)
+
+    choices = {}
+    for var, entries in summary.items():
+        print(f'\nPareto front for {var} (ratio vs RMSE, averaged over {len(args.steps)} step(s)):')
+        print(f'  {"codec":6s} {"bound":>9s} {"ratio":>9s} {"comp MB/s":>10s} {"decomp MB/s":>12s} '
+              f'{"rel RMSE":>10s} {"rel Linf":>10s}')
+        for e in pareto_front(entries):
+            bound = 'lossless' if e['bound'] == '' else f'{e["bound"]:g}'
+            print(f'  {e["codec"]:6s} {bound:>9s} {e["ratio"]:9.2f} {e["compress_MBps"]:10.1f} '
+                  f'{e["decompress_MBps"]:12.1f} {e["rel_rmse"]:10.3e} {e["rel_linf"]:10.3e}')
+
+        key = 'rel_rmse_max' if args.select == 'rmse' else 'rel_linf_max'
+        ok = [e for e in entries if e[key] <= args.max_error]
+        if ok:
+            choices[var] = max(ok, key=lambda e: e['ratio'])
+            print(f'  chosen: {choices[var]["codec"]} {choices[var]["params"]} '
+                  f'(ratio {choices[var]["ratio"]:.2f})')
+        else:
+            print(f'  no point meets {args.select} <= {args.max_error:g} of the range')
+    return choices
+
+
+def main():
+    install()
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    args = parse_arguments()
+
+    if rank == 0:
+        print(f'Running with {comm.Get_size()} MPI processes')
+        print(f'Codecs: {args.codecs}, bounds: {args.bounds} ({"absolute" if args.absolute else "relative to range"})')
+
+    rows = benchmark(args, comm)
+    if rank != 0:
+        return
+    if not rows:
+        print('Nothing was benchmarked')
+        sys.exit(1)
+
+    with open(args.csv, 'w', newline='') as fh:
+        writer = csv.DictWriter(fh, fieldnames=[k for k in rows[0] if k != 'params'])
+        writer.writeheader()
+        writer.writerows({k: v for k, v in row.items() if k != 'params'} for row in rows)
+    print(f'Per step results written to {args.csv}')
+
+    choices = summarize(rows, args)
+    if choices:
+        snippet = xml_snippet(choices)
+        with open(args.xml_out, 'w') as fh:
+            fh.write(snippet)
+        print(f'\nXML for the chosen operating points (paste into the write <io> block), also in {args.xml_out}:\n')
+        print(snippet)
+
+
+if __name__ == '__main__':
+    install()
+    main()
@@ -49,6 +49,38 @@ def parse_arguments():
     return parser.parse_args()
 
 
+def plot_contour_2d(values, var, step, output_dir):
+    plt.figure()
+    plt.contourf(np.squeeze(values), cmap="inferno", levels=50)
+    plt.title(var + f" at step {step}")
+    plt.colorbar()
+    plt.savefig(os.path.join(output_dir, f"{var}_step_{step}.png"))
+    plt.close()
+
+
+def plot_contour_3d(values_2d, var, z_index, mode, output_dir):
+    """Surface and contour lines of the slice values[:, :, z_index] of a 3D field."""
+    x = np.arange(values_2d.shape[0])
+    y = np.arange(values_2d.shape[1])
+    X, Y = np.meshgrid(x, y)
+
+    if values_2d.shape != X.shape:
+        values_2d = values_2d.T
+
+    fig = plt.figure()
+    ax = fig.add_subplot(111, projection='3d')
+
+    surf = ax.plot_surface(X, Y, values_2d, cmap='inferno', linewidth=0, antialiased=False)
+
+    levels = np.linspace(np.min(values_2d), np.max(values_2d), 10)
+    ax.contour(X, Y, values_2d, levels=levels, cmap='inferno', linewidths=2)
+
+    ax.set_title(f"{var} slice at dim {mode} index {z_index}")
+    fig.colorbar(surf, ax=ax, shrink=0.5, aspect=5)
+    plt.savefig(os.path.join(output_dir, f"{var}_3d_slice_{mode}_idx{z_index}.png"))
+    plt.close()
+
+
 def main():
     install()
     comm = MPI.COMM_WORLD
@@ -97,57 +129,14 @@ def main():
                 else:
                     print(f"Variable {var} not found in the input file.")
             
-            if mode == '2d':
-                plt.figure()
-                for var, values in data.items():
-                    output_dir = "../RESULTS"
-                    os.makedirs(output_dir, exist_ok=True)
-                    plt.contourf(np.squeeze(values), cmap="inferno", levels=50)
-                    plt.title(var + f" at step {step}")
-                    plt.colorbar()
-                    plt.savefig(os.path.join(output_dir, f"{var}_step_{step}.png"))
-                    plt.close()
-                    
-            elif mode == '3d':
-                for var, values in data.items():
-                    output_dir = "../RESULTS"
-                    os.makedirs(output_dir, exist_ok=True)
-                    dims = values.shape
-                    axes = [0, 1, 2]
-                    
-                    x_dim, y_dim, z_dim = axes
-
-                    x = np.arange(dims[x_dim])
-                    y = np.arange(dims[y_dim])
-                    X, Y = np.meshgrid(x, y)
-                    
-                    z_index = slice
-                    if z_dim == 0:
-                        values_2d = values[z_index, :, :]
-                    elif z_dim == 1:
-                        values_2d = values[:, z_index, :]
-                    else:  
-                        values_2d = values[:, :, z_index]
-
-
-                    if values_2d.shape != X.shape:
-                        values_2d = values_2d.T
-
-                    fig = plt.figure()
-                    ax = fig.add_subplot(111, projection='3d')
-
-                    surf = ax.plot_surface(X, Y, values_2d, cmap='inferno', linewidth=0, antialiased=False)
-
-                    levels = np.linspace(np.min(values_2d), np.max(values_2d), 10)
-                    ax.contour(X, Y, values_2d, levels=levels, cmap='inferno', linewidths=2)
-
-                    ax.set_title(f"{var} slice at dim {mode} index {z_index}")
-                    fig.colorbar(surf, ax=ax, shrink=0.5, aspect=5)
-                    plt.savefig(os.path.join(output_dir, f"{var}_3d_slice_{mode}_idx{z_index}.png"))
-                    plt.close()
+            output_dir = "../RESULTS"
+            os.makedirs(output_dir, exist_ok=True)
+            for var, values in data.items():
+                if mode == '2d':
+                    plot_contour_2d(values, var, step, output_dir)
+                elif mode == '3d':
+                    plot_contour_3d(values[:, :, slice], var, slice, mode, output_dir)
 
-            
-            
             if not status or s.current_step() >= max_steps - 1:
                 print(f"Reached max_steps = {max_steps}")
                 break
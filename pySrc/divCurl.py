@@ -4,6 +4,28 @@ from adios2 import Adios, Stream
 import argparse
 import sys
 from rich.traceback import install
+from writers import add_writer_arguments, configure_writer
+from stepReader import StepReader
+
+def div_curl(ux, uy, uz=None):
+    """Divergence and curl components of a (z, y, x) block; 2D (uz None) has only curl_z."""
+    if uz is not None:
+        div = (np.gradient(ux, axis=2, edge_order=2) +
+               np.gradient(uy, axis=1, edge_order=2) +
+               np.gradient(uz, axis=0, edge_order=2))
+
+        curl_x = np.gradient(uz, axis=1, edge_order=2) - np.gradient(uy, axis=0, edge_order=2)
+        curl_y = np.gradient(ux, axis=0, edge_order=2) - np.gradient(uz, axis=2, edge_order=2)
+        curl_z = np.gradient(uy, axis=2, edge_order=2) - np.gradient(ux, axis=1, edge_order=2)
+    else:
+        div = (np.gradient(ux, axis=2, edge_order=2) +
+               np.gradient(uy, axis=1, edge_order=2))
+
+        curl_z = np.gradient(uy, axis=2, edge_order=2) - np.gradient(ux, axis=1, edge_order=2)
+        curl_x = np.zeros_like(ux)
+        curl_y = np.zeros_like(uy)
+    return div, curl_x, curl_y, curl_z
+
 
 # need to manully change to take your own gradient what ever order you want 
 def parse_arguments():
@@ -29,7 +51,8 @@ def parse_arguments():
     parser.add_argument('max_steps', 
                         type=int, 
                         help='Maximum number of time steps to process (REQUIRED)')
-   
+
+    add_writer_arguments(parser)
     return parser.parse_args()
 
 
@@ -64,187 +87,48 @@ def main():
     else:
         adios_obj = Adios(adios2_xml, comm)
         
-    Rio = adios_obj.declare_io("readerIO")
     Wio = adios_obj.declare_io("WriteIO")
+    configure_writer(Wio, args)
+
+    # z slabs with one ghost plane each side, so the gradients match the serial ones
+    reader = StepReader(input_file, ['ux', 'uy', 'uz'], comm, xml=args.xml, io_name="readerIO", halo=1,
+                        max_steps=max_steps)
+
+    with Stream(Wio, output_file, "w", comm) as w:
+        for step in reader:
+            current_step = step.step
 
-    with Stream(Rio, input_file, 'r', comm) as s, Stream(Wio, output_file, "w", comm) as w:
-        variables_defined = False
-        
-        for step in s:            
-            status = s.begin_step()
-            if not status:
-                break
-                
-            current_step = s.current_step()
-            comm.Barrier()
-            
             if rank == 0:
                 print(f"Processing step {current_step}")
-            
-            w.begin_step()
-            comm.Barrier()
-
-            if not variables_defined:                                
-                uxR = Rio.inquire_variable('ux')
-                uyR = Rio.inquire_variable('uy')
-                uzR = Rio.inquire_variable('uz')
 
-                global_shape = uxR.shape() 
+            slab = step.slabs.get('ux')
+            if slab is None:
                 if rank == 0:
-                    print(f"Global shape: {global_shape}")
-                
-                if not global_shape:
-                    if rank == 0:
-                        print(f"No shape info for variable ux")
-                    sys.exit(1)
-
-                total_slices = global_shape[2]
-                base = total_slices // size
-                rem = total_slices % size
-                local_count_2 = base + 1 if rank < rem else base
-                local_start_2 = rank * base + min(rank, rem)
-
-                read_start_2 = max(0, local_start_2 - 1)
-                read_end_2 = min(total_slices, local_start_2 + local_count_2 + 1)
-                read_count_2 = read_end_2 - read_start_2
-
-                write_start = [0, 0, local_start_2] + [0] * (len(global_shape) - 3)
-                write_count = list(global_shape)
-                write_count[2] = local_count_2
-
-                read_start = [0, 0, read_start_2] + [0] * (len(global_shape) - 3)
-                read_count = list(global_shape)
-                read_count[2] = read_count_2
+                    print(f"No shape info for variable ux")
+                sys.exit(1)
+            global_shape = slab.shape
 
-                if rank == 0:
-                    print(f"Rank {rank}: read_start={read_start}, read_count={read_count}")
-                    print(f"Rank {rank}: write_start={write_start}, write_count={write_count}")
-
-                uxR.set_selection((read_start, read_count))
-                uyR.set_selection((read_start, read_count))
-                uzR.set_selection((read_start, read_count))
-                
-                ux = s.read(uxR)
-                uy = s.read(uyR)
-                uz = s.read(uzR)
-
-                comm.Barrier()
-                if rank == 0:
-                    print(f"Read data shapes: ux={ux.shape}, uy={uy.shape}, uz={uz.shape}")
-
-                if len(global_shape) == 3 and global_shape[0] != 1:
-                    div_full = (np.gradient(ux, axis=2, edge_order=2) +
-                               np.gradient(uy, axis=1, edge_order=2) +
-                               np.gradient(uz, axis=0, edge_order=2))
-                                   
-                    curl_x_full = np.gradient(uz, axis=1, edge_order=2) - np.gradient(uy, axis=0, edge_order=2)
-                    curl_y_full = np.gradient(ux, axis=0, edge_order=2) - np.gradient(uz, axis=2, edge_order=2)
-                    curl_z_full = np.gradient(uy, axis=2, edge_order=2) - np.gradient(ux, axis=1, edge_order=2)
-                    
-                    ghost_start = 1 if read_start_2 > 0 else 0
-                    ghost_end = ghost_start + local_count_2
-                    
-                    div = np.ascontiguousarray(div_full[:, :, ghost_start:ghost_end])
-                    curl_x = np.ascontiguousarray(curl_x_full[:, :, ghost_start:ghost_end])
-                    curl_y = np.ascontiguousarray(curl_y_full[:, :, ghost_start:ghost_end])
-                    curl_z = np.ascontiguousarray(curl_z_full[:, :, ghost_start:ghost_end])
-                    
-                elif len(global_shape) == 3 and global_shape[0] == 1: 
-                    div_full = (np.gradient(ux, axis=2, edge_order=2) +   
-                               np.gradient(uy, axis=1, edge_order=2))   
-
-                    curl_z_full = np.gradient(uy, axis=2, edge_order=2) - np.gradient(ux, axis=1, edge_order=2)
-                    curl_x_full = np.zeros_like(ux) 
-                    curl_y_full = np.zeros_like(uy)
-                    
-                    ghost_start = 1 if read_start_2 > 0 else 0
-                    ghost_end = ghost_start + local_count_2
-                    
-                    div = np.ascontiguousarray(div_full[:, :, ghost_start:ghost_end])
-                    curl_x = np.ascontiguousarray(curl_x_full[:, :, ghost_start:ghost_end])
-                    curl_y = np.ascontiguousarray(curl_y_full[:, :, ghost_start:ghost_end])
-                    curl_z = np.ascontiguousarray(curl_z_full[:, :, ghost_start:ghost_end])
-
-                var_div = Wio.define_variable('Div', div, global_shape, write_start, write_count)
-                var_curlx = Wio.define_variable('Curl_x', curl_x, global_shape, write_start, write_count)
-                var_curly = Wio.define_variable('Curl_y', curl_y, global_shape, write_start, write_count)
-                var_curlz = Wio.define_variable('Curl_z', curl_z, global_shape, write_start, write_count)
-                
-                variables_defined = True
-                
-            else:
-                uxR = Rio.inquire_variable('ux')
-                uyR = Rio.inquire_variable('uy')
-                uzR = Rio.inquire_variable('uz')
-                
-                global_shape = uxR.shape()
-                total_slices = global_shape[2]
-                base = total_slices // size
-                rem = total_slices % size
-                local_count_2 = base + 1 if rank < rem else base
-                local_start_2 = rank * base + min(rank, rem)
-
-                read_start_2 = max(0, local_start_2 - 1)
-                read_end_2 = min(total_slices, local_start_2 + local_count_2 + 1)
-                read_count_2 = read_end_2 - read_start_2
-
-                read_start = [0, 0, read_start_2] + [0] * (len(global_shape) - 3)
-                read_count = list(global_shape)
-                read_count[2] = read_count_2
-
-                uxR.set_selection((read_start, read_count))
-                uyR.set_selection((read_start, read_count))
-                uzR.set_selection((read_start, read_count))
-                
-                ux = s.read(uxR)
-                uy = s.read(uyR)
-                uz = s.read(uzR)
-
-                if len(global_shape) == 3 and global_shape[0] != 1:
-                    div_full = (np.gradient(ux, axis=2, edge_order=2) +
-                               np.gradient(uy, axis=1, edge_order=2) +
-                               np.gradient(uz, axis=0, edge_order=2))
-                                   
-                    curl_x_full = np.gradient(uz, axis=1, edge_order=2) - np.gradient(uy, axis=0, edge_order=2)
-                    curl_y_full = np.gradient(ux, axis=0, edge_order=2) - np.gradient(uz, axis=2, edge_order=2)
-                    curl_z_full = np.gradient(uy, axis=2, edge_order=2) - np.gradient(ux, axis=1, edge_order=2)
-
-                    ghost_start = 1 if read_start_2 > 0 else 0
-                    ghost_end = ghost_start + local_count_2
-                    
-                    div = np.ascontiguousarray(div_full[:, :, ghost_start:ghost_end])
-                    curl_x = np.ascontiguousarray(curl_x_full[:, :, ghost_start:ghost_end])
-                    curl_y = np.ascontiguousarray(curl_y_full[:, :, ghost_start:ghost_end])
-                    curl_z = np.ascontiguousarray(curl_z_full[:, :, ghost_start:ghost_end])
-                    
-                elif len(global_shape) == 3 and global_shape[0] == 1:
-                    div_full = (np.gradient(ux, axis=2, edge_order=2) +   
-                               np.gradient(uy, axis=1, edge_order=2))   
-
-                    curl_z_full = np.gradient(uy, axis=2, edge_order=2) - np.gradient(ux, axis=1, edge_order=2)
-                    curl_x_full = np.zeros_like(ux) 
-                    curl_y_full = np.zeros_like(uy)
-                    
-                    ghost_start = 1 if read_start_2 > 0 else 0
-                    ghost_end = ghost_start + local_count_2
-                    
-                    div = np.ascontiguousarray(div_full[:, :, ghost_start:ghost_end])
-                    curl_x = np.ascontiguousarray(curl_x_full[:, :, ghost_start:ghost_end])
-                    curl_y = np.ascontiguousarray(curl_y_full[:, :, ghost_start:ghost_end])
-                    curl_z = np.ascontiguousarray(curl_z_full[:, :, ghost_start:ghost_end])
-
-            w.write('Div', div)
-            w.write('Curl_x', curl_x)
-            w.write('Curl_y', curl_y)
-            w.write('Curl_z', curl_z)
-        
+            if step.index == 0 and rank == 0:
+                print(f"Global shape: {global_shape}")
+                print(f"Rank {rank}: read_start={slab.read_start}, read_count={slab.read_count}")
+                print(f"Rank {rank}: write_start={slab.write_start}, write_count={slab.write_count}")
+
+            ux = step['ux']
+            uy = step['uy']
+
+            uz = step['uz'] if global_shape[0] != 1 else None
+            div_full, curl_x_full, curl_y_full, curl_z_full = div_curl(ux, uy, uz)
+
+            w.begin_step()
+            for name, field in (('Div', div_full), ('Curl_x', curl_x_full), ('Curl_y', curl_y_full),
+                                ('Curl_z', curl_z_full)):
+                w.write(name, np.ascontiguousarray(slab.interior(field)), global_shape,
+                        slab.write_start, slab.write_count)
             w.end_step()
-            comm.Barrier()
-                                                            
-            if not status or current_step >= max_steps - 1:
+
+            if step.index == max_steps - 1:
                 if rank == 0:
                     print(f"Reached max_steps = {max_steps}")
-                break
 
     if rank == 0:
         print(f"Output written to {output_file}")
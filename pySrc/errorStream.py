@@ -1,17 +1,186 @@
 import adios2
-from frechetdist import frdist
 import os
 import sys
+import csv
 import argparse
 import numpy as np 
 import math 
 import matplotlib.pyplot as plt
 from matplotlib.collections import LineCollection
+from mpi4py import MPI
+from scipy.spatial import cKDTree
 from rich.traceback import install
+from slabs import slab_bounds
+from tracing import count_streamlines, read_streamlines
+
+
+def frechet_distance(P, Q, threshold=None, coupling=False):
+    """Discrete Frechet distance between polylines P (n, dim) and Q (m, dim).
+
+    The coupling table is filled one anti-diagonal at a time: every cell on
+    diagonal i+j only needs the two diagonals before it, so each diagonal is
+    one vectorized numpy update and only O(min(n, m)) values are kept.
+    With `threshold`, returns inf when the distance exceeds it, stopping as
+    soon as every cell of two consecutive diagonals does (a coupling visits
+    one of any two).
+    With `coupling=True` also returns the optimal coupling as (k, 2) index
+    pairs into P and Q; this keeps one byte per cell for the backtrack.
+    """
+    P = np.asarray(P, dtype=np.float64)
+    Q = np.asarray(Q, dtype=np.float64)
+    if P.ndim == 1:
+        P = P[:, np.newaxis]
+    if Q.ndim == 1:
+        Q = Q[:, np.newaxis]
+    if len(P) == 0 or len(Q) == 0:
+        raise ValueError("both curves need at least one point")
+
+    # diagonals run over the shorter curve
+    swapped = len(P) > len(Q)
+    if swapped:
+        P, Q = Q, P
+    n, m = len(P), len(Q)
+
+    # position i + 1 holds row i; position 0 stays inf as the i = -1 boundary
+    prev2 = np.full(n + 2, np.inf)
+    prev1 = np.full(n + 2, np.inf)
+    cur = np.full(n + 2, np.inf)
+    moves = [] if coupling else None
+    last_min = np.inf
+
+    for k in range(n + m - 1):
+        lo = max(0, k - m + 1)
+        hi = min(k, n - 1)
+        diff = P[lo:hi + 1] - Q[k - hi:k - lo + 1][::-1]
+        d = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+
+        cur.fill(np.inf)
+        if k == 0:
+            cur[1] = d[0]
+            if coupling:
+                moves.append(np.zeros(1, dtype=np.uint8))
+        else:
+            # predecessors: (i-1, j-1), (i-1, j), (i, j-1)
+            options = (prev2[lo:hi + 1], prev1[lo:hi + 1], prev1[lo + 1:hi + 2])
+            if coupling:
+                options = np.stack(options)
+                best = options.argmin(axis=0)
+                moves.append(best.astype(np.uint8))
+                reach = options[best, np.arange(len(d))]
+            else:
+                reach = np.minimum(np.minimum(options[0], options[1]), options[2])
+            np.maximum(d, reach, out=cur[lo + 1:hi + 2])
+
+        if threshold is not None:
+            diag_min = cur[lo + 1:hi + 2].min()
+            if diag_min > threshold and last_min > threshold:
+                return (np.inf, None) if coupling else np.inf
+            last_min = diag_min
+        prev2, prev1, cur = prev1, cur, prev2
+
+    distance = float(prev1[n])
+    if threshold is not None and distance > threshold:
+        return (np.inf, None) if coupling else np.inf
+    if not coupling:
+        return distance
+
+    i, j = n - 1, m - 1
+    pairs = [(i, j)]
+    while i > 0 or j > 0:
+        k = i + j
+        move = moves[k][i - max(0, k - m + 1)]
+        if move == 0:
+            i, j = i - 1, j - 1
+        elif move == 1:
+            i -= 1
+        else:
+            j -= 1
+        pairs.append((i, j))
+    pairs = np.array(pairs[::-1])
+    if swapped:
+        pairs = pairs[:, ::-1]
+    return distance, pairs
+
+
+def arc_length_resample(curve, samples):
+    """`samples` points spaced evenly along the arc length of a polyline."""
+    curve = np.asarray(curve, dtype=np.float64)
+    s = np.concatenate(([0.0], np.cumsum(np.linalg.norm(np.diff(curve, axis=0), axis=1))))
+    if len(curve) < 2 or s[-1] == 0.0:
+        return np.repeat(curve[:1], samples, axis=0)
+    t = np.linspace(0.0, s[-1], samples)
+    return np.column_stack([np.interp(t, s, curve[:, d]) for d in range(curve.shape[1])])
+
+
+def hausdorff_distance(P, Q):
+    """Symmetric Hausdorff distance between two point sets, nearest neighbours from KD-trees."""
+    return float(max(cKDTree(Q).query(P)[0].max(), cKDTree(P).query(Q)[0].max()))
+
+
+def compare_streamlines(P, Q, samples=0, threshold=None, coupling=False):
+    """Error metrics between two streamlines with any number of points.
+
+    Both curves are resampled to the same number of points at equal arc
+    length (default: the longer point count), so pointwise errors compare
+    the same fraction of each curve whatever dt or resolution produced it.
+    With `coupling=True`, `frechet_at` is the fraction of the arc length
+    where the optimal coupling is furthest apart (nan otherwise); the
+    backtrack costs one byte per pair of points.
+    """
+    n = samples or max(len(P), len(Q))
+    Pr = arc_length_resample(P, n)
+    Qr = arc_length_resample(Q, n)
+    pointwise = np.linalg.norm(Pr - Qr, axis=1)
+
+    frechet_at = np.nan
+    if coupling:
+        frechet, pairs = frechet_distance(Pr, Qr, threshold=threshold, coupling=True)
+        if pairs is not None:
+            gaps = np.linalg.norm(Pr[pairs[:, 0]] - Qr[pairs[:, 1]], axis=1)
+            frechet_at = pairs[np.argmax(gaps), 0] / max(n - 1, 1)
+    else:
+        frechet = frechet_distance(Pr, Qr, threshold=threshold)
+
+    def length(c):
+        return float(np.sum(np.linalg.norm(np.diff(c, axis=0), axis=1)))
+
+    return {
+        'n1': len(P), 'n2': len(Q), 'length1': length(P), 'length2': length(Q),
+        'frechet': frechet, 'frechet_at': frechet_at, 'hausdorff': hausdorff_distance(Pr, Qr),
+        'mean_error': float(pointwise.mean()), 'rms_error': float(np.sqrt(np.mean(pointwise ** 2))),
+        'max_error': float(pointwise.max()),
+    }
+
+
+def compare_batch(curves1, curves2, comm, samples=0, threshold=None, coupling=False):
+    """compare_streamlines for this rank's pairs (curves1[i], curves2[i]), a contiguous block per rank.
+
+    Returns the metrics of all pairs, in rank then pair order, on rank 0 and
+    None on the other ranks.
+    """
+    local = [compare_streamlines(P, Q, samples, threshold, coupling) for P, Q in zip(curves1, curves2)]
+    gathered = comm.gather(local, root=0)
+    if comm.Get_rank() != 0:
+        return None
+    return [row for part in gathered for row in part]
+
+
+def split_streamlines(segments, offsets, dim=2):
+    """Streamlines from the flat `segments` array; `offsets` (n+1 point indices) splits it, None = one streamline."""
+    points = np.asarray(segments, dtype=np.float64).reshape(-1, dim)
+    if offsets is None:
+        return [points]
+    offsets = np.asarray(offsets, dtype=np.int64)
+    return [points[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
 
 # change names of lower and higher res
-def RK_visualization(segment_compressed, segment_uncompressed, step=None):
+def RK_visualization(segment_compressed, segment_uncompressed, step=None, samples=0):
     install()
+    # the two curves rarely have the same number of points: compare at equal arc length
+    n = samples or max(len(segment_compressed), len(segment_uncompressed))
+    segment_compressed = arc_length_resample(segment_compressed, n)[:, :2]
+    segment_uncompressed = arc_length_resample(segment_uncompressed, n)[:, :2]
     errors = np.linalg.norm(segment_compressed - segment_uncompressed, axis=1)
 
     points = segment_compressed.reshape(-1, 1, 2)
@@ -50,7 +219,7 @@ def RK_visualization(segment_compressed, segment_uncompressed, step=None):
     plt.plot(range(len(errors)), errors, marker='o', linestyle='-', color='b')
     plt.yscale("log")
     plt.title("Distance Error Plot")
-    plt.xlabel("Point Index")
+    plt.xlabel("Resampled Point Index (equal arc length)")
     plt.ylabel("Error Magnitude")
     plt.grid(True, which="both")
     plt.tight_layout()
@@ -93,11 +262,26 @@ def parse_arguments():
                         '-x', type=str, 
                         default=None, 
                         help='ADIOS2 XML config file default: None (optional)')
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Stop the Frechet distance early and report inf once it exceeds this (optional)")
+    parser.add_argument("--dim", type=int, default=2, choices=[2, 3],
+                        help="Coordinates per point, for files without the dimension attribute or seeds default: 2 (optional)")
+    parser.add_argument("--samples", type=int, default=0,
+                        help="Points per streamline after arc-length resampling default: 0 = the longer curve's count (optional)")
+    parser.add_argument("--csv", type=str, default="streamline_errors.csv",
+                        help="Per step, per streamline metrics default: streamline_errors.csv (optional)")
+    parser.add_argument("--plot_pair", type=int, default=0,
+                        help="Streamline pair plotted every step, negative for none default: 0 (optional)")
+    parser.add_argument("--frechet_at", action="store_true",
+                        help="Trace back the Frechet coupling of every pair for the frechet_at column, one byte per pair of points; by default only the worst pair of each step (optional)")
     return parser.parse_args()
 
 
 def main():
     install()
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    size = comm.Get_size()
     args = parse_arguments()
     xml = args.xml
     file1 = args.file1
@@ -105,48 +289,88 @@ def main():
     max_step = args.max_steps
     
     if xml is not None:
-        adios = adios2.Adios(xml)
+        adios = adios2.Adios(xml, comm)
     else:
-        adios = adios2.Adios()
+        adios = adios2.Adios(comm)
     
     Rio1 = adios.declare_io("reader1")
     Rio2 = adios.declare_io("reader2")
     
-    with adios2.Stream(Rio1, file1, 'r') as f1, adios2.Stream(Rio2, file2, 'r') as f2:
+    rows = []
+    with adios2.Stream(Rio1, file1, 'r', comm) as f1, adios2.Stream(Rio2, file2, 'r', comm) as f2:
         step = 0
         while step < max_step:
             statusf1 = f1.begin_step()
             statusf2 = f2.begin_step()
             
-            if not statusf1 or not statusf2:
-                print(f"End of stream reached at step {step}")
+            if statusf1 != adios2.bindings.StepStatus.OK or statusf2 != adios2.bindings.StepStatus.OK:
+                if rank == 0:
+                    print(f"End of stream reached at step {step}")
                 break
             
             current_step_f1 = f1.current_step()
             current_step_f2 = f2.current_step()
             
-            print(f"Processing step {step} (f1: {current_step_f1}, f2: {current_step_f2})")
-            
-            segments_f1 = f1.read('segments')
-            segments_f1_pairs = np.array(segments_f1).reshape(-1, 2)
-            
-            segments_f2 = f2.read('segments')
-            segments_f2_pairs = np.array(segments_f2).reshape(-1, 2)
-            
-
-            distance = frdist(segments_f1_pairs, segments_f2_pairs)
-            print("Discrete Fréchet Distance:", distance)
-
-            RK_visualization(segments_f1_pairs, segments_f2_pairs, step=step)
+            if rank == 0:
+                print(f"Processing step {step} (f1: {current_step_f1}, f2: {current_step_f2})")
             
+            # each rank reads only its block of streamline pairs
+            n1 = count_streamlines(f1)
+            n2 = count_streamlines(f2)
+            pairs = min(n1, n2)
+            if rank == 0 and n1 != n2:
+                print(f"file1 has {n1} streamlines and file2 {n2}, comparing the first {pairs}")
+            first, count = slab_bounds(pairs, rank, size)
+            points, offsets = read_streamlines(f1, first, count, args.dim)
+            curves_f1 = split_streamlines(points, offsets, points.shape[1])
+            points, offsets = read_streamlines(f2, first, count, args.dim)
+            curves_f2 = split_streamlines(points, offsets, points.shape[1])
             f1.end_step()
             f2.end_step()
+
+            if first <= args.plot_pair < first + count:
+                RK_visualization(curves_f1[args.plot_pair - first], curves_f2[args.plot_pair - first], step=step,
+                                 samples=args.samples)
+
+            metrics = compare_batch(curves_f1, curves_f2, comm, args.samples, args.threshold, args.frechet_at)
+            worst = -1
+            if rank == 0 and metrics:
+                worst = int(np.argmax([row['frechet'] for row in metrics]))
+            worst = comm.bcast(worst, root=0)
+            if worst >= 0 and not args.frechet_at:
+                # only the worst pair's coupling is traced back, by the rank holding it
+                at = None
+                if first <= worst < first + count:
+                    at = compare_streamlines(curves_f1[worst - first], curves_f2[worst - first], args.samples,
+                                             args.threshold, coupling=True)['frechet_at']
+                at = comm.gather(at, root=0)
+                if rank == 0:
+                    metrics[worst]['frechet_at'] = next(a for a in at if a is not None)
+
+            if rank == 0 and not metrics:
+                print("  no streamline pairs in this step")
+            elif rank == 0:
+                for pair, row in enumerate(metrics):
+                    rows.append({'step': step, 'pair': pair, **row})
+                frechet = np.array([row['frechet'] for row in metrics])
+                hausdorff = np.array([row['hausdorff'] for row in metrics])
+                print(f"  {pairs} streamline pairs: Frechet mean {frechet.mean():.4e} max {frechet.max():.4e}, "
+                      f"Hausdorff mean {hausdorff.mean():.4e} max {hausdorff.max():.4e}")
+                print(f"  Worst pair {worst}: Discrete Fréchet Distance {frechet[worst]:.4e}, "
+                      f"furthest apart at {100 * metrics[worst]['frechet_at']:.0f}% of its arc length")
             
             step += 1
 
+    if rank == 0:
+        if rows:
+            with open(args.csv, 'w', newline='') as fh:
+                writer = csv.DictWriter(fh, fieldnames=list(rows[0].keys()))
+                writer.writeheader()
+                writer.writerows(rows)
+            print(f"Per streamline metrics written to {args.csv}")
         print(f"Finished processing {step} steps")
         print("Saved Results to ../RESULTS")
 
 if __name__ == "__main__":
     main()
-    install()
\ No newline at end of file
+    install()
@@ -0,0 +1,210 @@
+import numpy as np
+import matplotlib.pyplot as plt
+import os
+import sys
+import argparse
+import queue
+import threading
+from adios2 import FileReader
+from mpi4py import MPI
+from rich.traceback import install
+from tracing import grid_sampler, unit_direction
+from slabs import slab_bounds
+from velocityIO import read_steps, slice_2d, velocity_range
+
+
+def noise_texture(shape, seed=0):
+    """White noise in [0, 1); the same seed gives the same texture on every rank and every step."""
+    return np.random.default_rng(seed).random(shape)
+
+
+def lic_rows(ux, uy, noise, rows, length=20.0, step=0.5, chunk=1 << 18, min_speed=1e-8):
+    """Line integral convolution of `noise` for image rows rows[0] .. rows[1] - 1.
+
+    One pixel per grid point. Every pixel of a chunk is traced together,
+    forward and backward, along the unit direction of (ux, uy) with midpoint
+    steps of `step` pixels up to `length` pixels each way; the result is the
+    mean noise along that streamline (box kernel). A pixel's streamline stops
+    at the domain edge or where the flow stagnates.
+    """
+    ny, nx = ux.shape
+    sample = grid_sampler((ux, uy), [(0.0, nx - 1.0), (0.0, ny - 1.0)])
+    upper = np.array([nx - 1.0, ny - 1.0])
+    n_steps = max(int(round(length / step)), 1)
+    y, x = np.mgrid[rows[0]:rows[1], 0:nx]
+    pixels = np.column_stack((x.ravel(), y.ravel())).astype(np.float64)
+    out = np.empty(len(pixels))
+
+    for first in range(0, len(pixels), chunk):
+        start = pixels[first:first + chunk]
+        total = noise[start[:, 1].astype(np.intp), start[:, 0].astype(np.intp)].copy()
+        weight = np.ones(len(start))
+        for sign in (1.0, -1.0):
+            alive = np.arange(len(start))
+            p = start.copy()
+            for _ in range(n_steps):
+                k1, m1 = unit_direction(sample, p, min_speed)
+                k2, m2 = unit_direction(sample, p + 0.5 * sign * step * k1, min_speed)
+                p = p + sign * step * k2
+                keep = m1 & m2 & np.all((p >= 0.0) & (p <= upper), axis=1)
+                alive, p = alive[keep], p[keep]
+                if alive.size == 0:
+                    break
+                j = np.rint(p).astype(np.intp)
+                total[alive] += noise[j[:, 1], j[:, 0]]
+                weight[alive] += 1.0
+        out[first:first + len(start)] = total / weight
+    return out.reshape(rows[1] - rows[0], nx)
+
+
+def lic_texture(ux, uy, noise=None, comm=None, **kwargs):
+    """LIC texture of the whole field; with comm the rows are split into tiles, one per rank.
+
+    Returns the (ny, nx) texture, on rank 0 only when comm is given (None on
+    the others). kwargs go to lic_rows.
+    """
+    ny, nx = ux.shape
+    if noise is None:
+        noise = noise_texture((ny, nx))
+    if comm is None:
+        return lic_rows(ux, uy, noise, (0, ny), **kwargs)
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    start, count = slab_bounds(ny, rank, size)
+    tile = lic_rows(ux, uy, noise, (start, start + count), **kwargs)
+    texture = np.empty((ny, nx)) if rank == 0 else None
+    counts = [slab_bounds(ny, r, size)[1] * nx for r in range(size)]
+    displs = [slab_bounds(ny, r, size)[0] * nx for r in range(size)]
+    comm.Gatherv(tile, [texture, counts, displs, MPI.DOUBLE] if rank == 0 else None, root=0)
+    return texture
+
+
+def lic_image(texture, magnitude=None, vmin=None, vmax=None, cmap='jet'):
+    """RGB image: the contrast-stretched texture, tinted by the velocity magnitude when given."""
+    low, high = np.percentile(texture, [2, 98])
+    shade = np.clip((texture - low) / max(high - low, 1e-12), 0.0, 1.0)
+    if magnitude is None:
+        return np.repeat(shade[:, :, np.newaxis], 3, axis=2)
+    norm = plt.Normalize(vmin=magnitude.min() if vmin is None else vmin,
+                         vmax=magnitude.max() if vmax is None else vmax)
+    colors = plt.get_cmap(cmap)(norm(magnitude))[:, :, :3]
+    return colors * (0.25 + 0.75 * shade)[:, :, np.newaxis]
+
+
+def plot_lic(image, title, output_path, vmin=None, vmax=None, cmap='jet', ax=None):
+    """Show a lic_image on the unit square, with a magnitude colour bar when vmin/vmax are given."""
+    fig = None
+    if ax is None:
+        fig, ax = plt.subplots(figsize=(10, 8))
+    ax.imshow(image, origin='lower', extent=(0, 1, 0, 1), interpolation='nearest')
+    if vmin is not None and vmax is not None:
+        mappable = plt.cm.ScalarMappable(norm=plt.Normalize(vmin=vmin, vmax=vmax), cmap=cmap)
+        ax.figure.colorbar(mappable, ax=ax, label="Velocity magnitude")
+    ax.set_xlabel('X')
+    ax.set_ylabel('Y')
+    ax.set_title(title)
+    if fig is not None:
+        fig.savefig(output_path, dpi=300, bbox_inches='tight')
+        plt.close(fig)
+
+
+def parse_arguments():
+    install()
+    parser = argparse.ArgumentParser(description='Line integral convolution (LIC) images of 2D velocity fields from ADIOS2 BP files')
+    parser.add_argument('path',
+                        type=str,
+                        help='Path to the BP file to process (REQUIRED)')
+    parser.add_argument('max_steps',
+                        type=int,
+                        help='Maximum number of time steps to process (REQUIRED)')
+    parser.add_argument('--xml',
+                        '-x', type=str,
+                        default=None,
+                        help='ADIOS2 XML config file default: None (optional)')
+    parser.add_argument('--length',
+                        type=float,
+                        default=20.0,
+                        help='Streamline length each way, in pixels default: 20 (optional)')
+    parser.add_argument('--step',
+                        type=float,
+                        default=0.5,
+                        help='Integration step in pixels default: 0.5 (optional)')
+    parser.add_argument('--color',
+                        action='store_true',
+                        help='Colour the texture by velocity magnitude (optional)')
+    parser.add_argument('--vrange',
+                        type=float,
+                        nargs=2,
+                        default=None,
+                        metavar=('VMIN', 'VMAX'),
+                        help='Fixed velocity magnitude colour range, skips the metadata scan (optional)')
+    parser.add_argument('--noise_seed',
+                        type=int,
+                        default=0,
+                        help='Seed of the noise texture, kept for every step default: 0 (optional)')
+    parser.add_argument('--prefetch',
+                        type=int,
+                        default=1,
+                        help='Steps read ahead in the background default: 1 (optional)')
+    return parser.parse_args()
+
+
+def main():
+    install()
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    args = parse_arguments()
+    if args.max_steps <= 0:
+        if rank == 0:
+            print("Error: max_steps must be a positive integer.")
+        sys.exit(1)
+
+    vrange = (None, None)
+    n_steps = None
+    if rank == 0:
+        print(f"Running with {size} MPI processes, one tile of image rows each")
+        if args.color:
+            vrange = tuple(args.vrange) if args.vrange else velocity_range(args.path, args.xml, args.max_steps)
+        with FileReader(args.path) as counter:
+            n_steps = min(args.max_steps, counter.num_steps())
+    vmin, vmax = comm.bcast(vrange, root=0)
+    n_steps = comm.bcast(n_steps, root=0)
+
+    output_dir = "../RESULTS"
+    base_filename = os.path.basename(args.path).split('.bp')[0]
+    if rank == 0:
+        os.makedirs(output_dir, exist_ok=True)
+
+    steps = queue.Queue(maxsize=max(args.prefetch, 1))
+    reader = threading.Thread(target=read_steps, daemon=True, args=(args.path, args.xml, n_steps, steps))
+    reader.start()
+
+    noise = None
+    for _ in range(n_steps):
+        item = steps.get()
+        if isinstance(item, Exception):
+            raise item
+        step, ux, uy, _ = item
+        ux_2d, uy_2d = slice_2d(ux, uy)
+        if noise is None or noise.shape != ux_2d.shape:
+            noise = noise_texture(ux_2d.shape, args.noise_seed)
+        texture = lic_texture(ux_2d, uy_2d, noise, comm, length=args.length, step=args.step)
+        if rank == 0:
+            magnitude = np.sqrt(ux_2d**2 + uy_2d**2) if args.color else None
+            image = lic_image(texture, magnitude, vmin, vmax)
+            output_path = os.path.join(output_dir, f"{base_filename}_2d_lic_step{step:04d}.png")
+            plot_lic(image, f"{base_filename} - LIC - Step {step}", output_path,
+                     vmin if args.color else None, vmax if args.color else None)
+            print(f"Saved: {output_path}")
+        del ux, uy, item
+    reader.join()
+
+    if rank == 0:
+        print("All LIC images completed!")
+        print("Please check the ../RESULTS")
+
+
+if __name__ == "__main__":
+    install()
+    main()
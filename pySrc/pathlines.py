@@ -0,0 +1,194 @@
+import numpy as np
+import sys
+import argparse
+import queue
+import threading
+from adios2 import Adios, Stream, FileReader
+from mpi4py import MPI
+from rich.traceback import install
+from tracing import grid_sampler, advect_particles, seed_grid
+from slabs import slab_bounds
+from velocityIO import read_steps, slice_2d
+from writers import add_writer_arguments, configure_writer
+
+
+class Particles:
+    """This rank's particles: positions, global ids and the step each was released at."""
+
+    def __init__(self, dim):
+        self.points = np.empty((0, dim))
+        self.ids = np.empty(0, dtype=np.int64)
+        self.birth = np.empty(0, dtype=np.int64)
+
+    def inject(self, seeds, ids, step):
+        self.points = np.concatenate((self.points, seeds))
+        self.ids = np.concatenate((self.ids, ids))
+        self.birth = np.concatenate((self.birth, np.full(len(ids), step, dtype=np.int64)))
+
+    def keep(self, mask):
+        self.points = self.points[mask]
+        self.ids = self.ids[mask]
+        self.birth = self.birth[mask]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def write_particles(writer, step, particles, comm):
+    """Write every rank's particles as one step: flat points, ids and birth steps, placed with Exscan."""
+    dim = particles.points.shape[1]
+    n = len(particles)
+    start = comm.exscan(n) or 0
+    total = comm.allreduce(n)
+    writer.write('points', particles.points.ravel(), [dim * total], [dim * start], [dim * n])
+    writer.write('ids', particles.ids, [total], [start], [n])
+    writer.write('birth', particles.birth, [total], [start], [n])
+    if comm.Get_rank() == 0:
+        writer.write('step', int(step))
+
+
+def parse_arguments():
+    install()
+    parser = argparse.ArgumentParser(description='Advect particles through an unsteady velocity field (pathlines and streaklines)')
+    parser.add_argument('path',
+                        type=str,
+                        help='Path to the BP file to process (REQUIRED)')
+    parser.add_argument('max_steps',
+                        type=int,
+                        help='Maximum number of time steps to process (REQUIRED)')
+    parser.add_argument('--xml',
+                        '-x', type=str,
+                        default=None,
+                        help='ADIOS2 XML config file default: None (optional)')
+    parser.add_argument('--mode',
+                        '-m',
+                        type=str,
+                        choices=['2d', '3d'],
+                        default='2d',
+                        help='2D (middle slice of 3D data) or 3D mode default: 2d (optional)')
+    parser.add_argument('--seed_grid',
+                        type=int,
+                        nargs='+',
+                        default=None,
+                        metavar='N',
+                        help='Release NX NY (2D) or NX NY NZ (3D) particles at cell centres of the domain default: 16 per axis (optional)')
+    parser.add_argument('--lengths',
+                        type=float,
+                        nargs=3,
+                        default=[1.0, 1.0, 1.0],
+                        metavar=('LX', 'LY', 'LZ'),
+                        help='Domain size, the grid spans [0, L] per axis (2D uses LX LY) default: 1 1 1 (optional)')
+    parser.add_argument('--step_time',
+                        type=float,
+                        default=0.01,
+                        help='Physical time between two stored steps default: 0.01 (optional)')
+    parser.add_argument('--substeps',
+                        type=int,
+                        default=10,
+                        help='RK4 steps per stored step default: 10 (optional)')
+    parser.add_argument('--inject_every',
+                        type=int,
+                        default=0,
+                        help='Release new particles at the seeds every N steps (streaklines), 0 releases once (pathlines) default: 0 (optional)')
+    parser.add_argument('--max_age',
+                        type=int,
+                        default=0,
+                        help='Drop particles older than this many steps, 0 keeps them default: 0 (optional)')
+    parser.add_argument('--prefetch',
+                        type=int,
+                        default=1,
+                        help='Steps read ahead in the background default: 1 (optional)')
+    parser.add_argument('--output',
+                        '-o',
+                        type=str,
+                        default='pathlines.bp',
+                        help='Output BP file default: pathlines.bp (optional)')
+    add_writer_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    install()
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+
+    args = parse_arguments()
+    is_3d = args.mode == '3d'
+    dim = 3 if is_3d else 2
+    if args.max_steps <= 0 or args.substeps <= 0:
+        if rank == 0:
+            print("Error: max_steps and substeps must be positive integers.")
+        sys.exit(1)
+    if args.seed_grid is not None and len(args.seed_grid) != dim:
+        if rank == 0:
+            print(f"Error: --seed_grid needs {dim} counts in {args.mode} mode.")
+        sys.exit(1)
+
+    n_steps = None
+    if rank == 0:
+        with FileReader(args.path) as counter:
+            n_steps = min(args.max_steps, counter.num_steps())
+        print(f"Running with {size} MPI processes")
+        print(f"Processing BP5 file: {args.path}, {n_steps} steps, mode {args.mode}")
+    n_steps = comm.bcast(n_steps, root=0)
+
+    lengths = np.array(args.lengths[:dim], dtype=np.float64)
+    bounds = [(0.0, L) for L in lengths]
+    seeds = seed_grid(*(args.seed_grid or [16] * dim)) * lengths
+    # every release puts one particle on each seed; this rank always takes the same block of seeds
+    seed_start, seed_count = slab_bounds(len(seeds), rank, size)
+    my_seeds = seeds[seed_start:seed_start + seed_count]
+    particles = Particles(dim)
+    releases = 0
+
+    adios_obj = Adios(args.xml, comm) if args.xml else Adios(comm)
+    write_io = adios_obj.declare_io("WritePathlineIO")
+    configure_writer(write_io, args)
+
+    # only the two steps of the current interval are held, plus what the reader has queued
+    steps = queue.Queue(maxsize=max(args.prefetch, 1))
+    reader = threading.Thread(target=read_steps, daemon=True, args=(args.path, args.xml, n_steps, steps))
+    reader.start()
+
+    previous = None
+    with Stream(write_io, args.output, 'w', comm) as writer:
+        for index in range(n_steps):
+            item = steps.get()
+            if isinstance(item, Exception):
+                raise item
+            step, ux, uy, uz = item
+            if is_3d:
+                if uz is None:
+                    raise ValueError("3D mode needs uz")
+                current = grid_sampler((ux, uy, uz), bounds)
+            else:
+                current = grid_sampler(slice_2d(ux, uy), bounds)
+            del ux, uy, uz, item
+
+            if previous is not None:
+                particles.points, inside = advect_particles(particles.points, (previous, current), args.step_time,
+                                                            args.substeps, bounds)
+                if args.max_age > 0:
+                    inside &= index - particles.birth <= args.max_age
+                particles.keep(inside)
+            if index == 0 or (args.inject_every > 0 and index % args.inject_every == 0):
+                particles.inject(my_seeds, releases * len(seeds) + seed_start + np.arange(seed_count), index)
+                releases += 1
+            previous = current
+
+            writer.begin_step()
+            write_particles(writer, step, particles, comm)
+            writer.end_step()
+            total = comm.allreduce(len(particles))
+            if rank == 0:
+                print(f"Step {step}: {total} particles")
+    reader.join()
+
+    if rank == 0:
+        print(f"Particle positions saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    install()
+    main()
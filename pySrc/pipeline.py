@@ -0,0 +1,347 @@
+import numpy as np
+import argparse
+import json
+import os
+import sys
+from adios2 import Adios, Stream
+from mpi4py import MPI
+from rich.traceback import install
+from stepReader import StepReader
+from writers import add_writer_arguments, configure_writer
+from divCurl import div_curl
+from histagram import global_histogram, plot_histogram
+from contour import plot_contour_2d, plot_contour_3d
+from plot2D import plot_stitched
+from compression import parse_codec_specs, define_codec_operators, attach_codec, plan_variable
+
+# Pipeline spec (JSON): the analyses to run on every step, in order.
+#
+#   {"output_dir": "../RESULTS",
+#    "analyses": [
+#       {"type": "divcurl", "output": "div_curl.bp"},
+#       {"type": "histogram", "variable": "ux", "bins": 50},
+#       {"type": "contour", "vars": ["ux", "uy"], "mode": "2d", "slice": 16},
+#       {"type": "plot2d", "vars": ["ux"]},
+#       {"type": "compress", "output": "compressed.bp", "codec": ["ux=mgard:accuracy=1e-3"]}]}
+#
+# Every key but "type" is optional; the defaults are those of the matching script.
+
+
+class Analysis:
+    """One tool of the pipeline: setup() once, process(step) for every step, finalize() at the end.
+
+    variables lists what process() reads (None: every variable) and halo the
+    ghost planes it needs; the pipeline reads the union of the variables with
+    the largest halo once per step and hands the same Step to every analysis.
+    """
+
+    variables = ()
+    halo = 0
+
+    def __init__(self, spec, comm, adios, args, output_dir):
+        self.spec = spec
+        self.comm = comm
+        self.rank = comm.Get_rank()
+        self.adios = adios
+        self.args = args
+        self.output_dir = output_dir
+        self.name = spec["type"]
+
+    def setup(self):
+        pass
+
+    def process(self, step):
+        pass
+
+    def finalize(self):
+        pass
+
+    def array(self, step, var):
+        """Slab of var for this rank without ghost planes, or None (with a message) if it can't be used."""
+        if var not in step:
+            if self.rank == 0:
+                print(f"  {self.name}: variable {var} not found")
+            return None
+        slab = step.slabs[var]
+        if slab is None:
+            if self.rank == 0:
+                print(f"  {self.name}: {var} is not an array, skipping it")
+            return None
+        return slab.interior(step[var])
+
+
+class DivCurlAnalysis(Analysis):
+    variables = ("ux", "uy", "uz")
+    halo = 1
+
+    def setup(self):
+        self.output = self.spec.get("output", "div_curl.bp")
+        io = self.adios.declare_io(self.spec.get("io", "WriteIO"))
+        configure_writer(io, self.args)
+        self.writer = Stream(io, self.output, "w", self.comm)
+
+    def process(self, step):
+        slab = step.slabs.get("ux")
+        if slab is None:
+            raise ValueError("divcurl needs the array ux")
+        shape = slab.shape
+        uz = step["uz"] if shape[0] != 1 else None
+        fields = div_curl(step["ux"], step["uy"], uz)
+
+        self.writer.begin_step()
+        for name, field in zip(("Div", "Curl_x", "Curl_y", "Curl_z"), fields):
+            self.writer.write(name, np.ascontiguousarray(slab.interior(field)), shape, slab.write_start,
+                              slab.write_count)
+        self.writer.end_step()
+
+    def finalize(self):
+        self.writer.close()
+        if self.rank == 0:
+            print(f"divcurl: output written to {self.output}")
+
+
+class HistogramAnalysis(Analysis):
+    def setup(self):
+        self.var = self.spec["variable"]
+        self.bins = self.spec.get("bins", 50)
+        self.variables = (self.var,)
+
+    def process(self, step):
+        data = self.array(step, self.var)
+        if data is None:
+            return
+        global_hist, bin_edges = global_histogram(data.ravel(), self.bins, self.comm)
+        if self.rank == 0:
+            plot_histogram(global_hist, bin_edges, self.var, step.step,
+                           os.path.join(self.output_dir, f"{self.var}_step_{step.step}_histogram.png"))
+
+
+class ContourAnalysis(Analysis):
+    def setup(self):
+        self.vars = self.spec["vars"]
+        self.mode = self.spec.get("mode", "2d")
+        self.slice = self.spec.get("slice", 16)
+        self.variables = tuple(self.vars)
+
+    def process(self, step):
+        for var in self.vars:
+            data = self.array(step, var)
+            if data is None:
+                continue
+            slab = step.slabs[var]
+            if self.mode == "2d":
+                # the whole field is plotted on rank 0
+                blocks = self.comm.gather(np.ascontiguousarray(data), root=0)
+                if self.rank == 0:
+                    plot_contour_2d(np.concatenate(blocks, axis=slab.axis), var, step.step, self.output_dir)
+            else:
+                # the slice along the last axis lies on one rank, which plots it
+                if slab.axis != data.ndim - 1 or not 0 <= self.slice < slab.shape[slab.axis]:
+                    if self.rank == 0:
+                        print(f"  contour: no slice {self.slice} along the last axis of {var}")
+                    continue
+                if slab.start <= self.slice < slab.start + slab.count:
+                    plot_contour_3d(data[:, :, self.slice - slab.start], var, self.slice, self.mode,
+                                    self.output_dir)
+
+
+class Plot2DAnalysis(Analysis):
+    def setup(self):
+        self.vars = self.spec["vars"]
+        self.variables = tuple(self.vars)
+
+    def process(self, step):
+        for var in self.vars:
+            data = self.array(step, var)
+            if data is None:
+                continue
+            shape = step.slabs[var].shape
+            if len(shape) != 3 or shape[0] != 1:
+                if self.rank == 0:
+                    print(f"  plot2d: skipping variable {var} due to unexpected shape {shape}")
+                continue
+            plot_stitched(data, var, step.index, self.comm, self.output_dir)
+
+
+class CompressAnalysis(Analysis):
+    """Copy of the input through compression operators, as compression.py without --target or --temporal."""
+
+    def setup(self):
+        self.output = self.spec.get("output", "compressed.bp")
+        vars = self.spec.get("vars")
+        self.variables = None if vars is None else tuple(vars)
+        self.only_step = self.spec.get("step")
+        # the error bound only applies when there is no XML to take settings from
+        error_bound = 0 if self.args.xml else self.spec.get("errorBound", 0)
+        self.codecs = parse_codec_specs(self.spec.get("codec", []), error_bound)
+        self.operators = define_codec_operators(self.adios, self.codecs, self.rank) if self.codecs else {}
+        self.io = self.adios.declare_io(self.spec.get("io", "WriteIOCompressed"))
+        configure_writer(self.io, self.args)
+        self.writer = Stream(self.io, self.output, "w", self.comm)
+        self.plans = {}
+
+    def process(self, step):
+        if self.only_step is not None and step.step != self.only_step:
+            return
+        names = step.available if self.variables is None else [n for n in self.variables if n in step.available]
+        self.writer.begin_step()
+        for name in names:
+            info = step.available[name]
+            plan = self.plans.get(name)
+            if plan is None or plan["shape_key"] != info.get("Shape", ""):
+                plan = plan_variable(self.io, name, info, step.slabs.get(name)) if name in step else None
+                if plan is None:
+                    if self.rank == 0:
+                        print(f"  {name}: unsupported type {info.get('Type')}, skipping it")
+                    continue
+                self.plans[name] = plan
+                if plan["new"] and not plan["scalar"]:
+                    attach_codec(plan["var_out"], name, self.codecs, self.operators, self.rank,
+                                 dtype=plan["dtype"])
+
+            if plan["scalar"]:
+                if self.rank == 0:
+                    self.writer.write(plan["var_out"], step[name])
+            elif not plan["empty"]:
+                self.writer.write(plan["var_out"], np.ascontiguousarray(step.slabs[name].interior(step[name])))
+        self.writer.end_step()
+
+    def finalize(self):
+        self.writer.close()
+        if self.rank == 0:
+            print(f"compress: output written to {self.output}")
+
+
+ANALYSES = {
+    "divcurl": DivCurlAnalysis,
+    "histogram": HistogramAnalysis,
+    "contour": ContourAnalysis,
+    "plot2d": Plot2DAnalysis,
+    "compress": CompressAnalysis,
+}
+
+
+def load_spec(path):
+    """The spec's analyses ({"type": ...} dicts) and output directory; ValueError if it is malformed."""
+    with open(path) as fh:
+        spec = json.load(fh)
+    if isinstance(spec, list):
+        spec = {"analyses": spec}
+    analyses = spec.get("analyses")
+    if not analyses:
+        raise ValueError(f"{path} has no analyses")
+    for entry in analyses:
+        kind = entry.get("type")
+        if kind not in ANALYSES:
+            raise ValueError(f"unknown analysis type '{kind}', choose from {', '.join(ANALYSES)}")
+        if kind == "histogram" and "variable" not in entry:
+            raise ValueError("histogram needs a variable")
+        if kind in ("contour", "plot2d") and not entry.get("vars"):
+            raise ValueError(f"{kind} needs vars")
+        if kind == "compress":
+            parse_codec_specs(entry.get("codec", []))
+    return analyses, spec.get("output_dir", "../RESULTS")
+
+
+def read_variables(analyses):
+    """Union of the variables the analyses read, None if one of them reads everything."""
+    names = []
+    for analysis in analyses:
+        if analysis.variables is None:
+            return None
+        names += [n for n in analysis.variables if n not in names]
+    return names
+
+
+def parse_arguments():
+    install()
+    parser = argparse.ArgumentParser(description='Run several analyses on an ADIOS2 BP file, reading every step only once')
+    parser.add_argument('input_file',
+                        type=str,
+                        help='Path to the input ADIOS2 BP file (REQUIRED)')
+    parser.add_argument('spec',
+                        type=str,
+                        help='JSON pipeline spec listing the analyses (REQUIRED)')
+    parser.add_argument('max_steps',
+                        type=int,
+                        help='Maximum number of time steps to process (REQUIRED)')
+    parser.add_argument('--xml',
+                        '-x', type=str,
+                        default=None,
+                        help='ADIOS2 XML config file, for the reader and every writer default: None (optional)')
+    parser.add_argument('--no_prefetch',
+                        action='store_true',
+                        help='Read each step only after the previous one is processed (optional)')
+    add_writer_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    install()
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+
+    args = parse_arguments()
+    if args.max_steps <= 0:
+        if rank == 0:
+            print("Error: max_steps must be a positive integer.")
+        sys.exit(1)
+    try:
+        specs, output_dir = load_spec(args.spec)
+    except (OSError, ValueError) as e:
+        if rank == 0:
+            print(f"Error: {e}")
+        sys.exit(1)
+
+    if rank == 0:
+        print(f"Running with {size} MPI processes")
+        print(f"Input file: {args.input_file}")
+        print(f"Analyses: {', '.join(s['type'] for s in specs)}")
+    # any rank may save an image
+    os.makedirs(output_dir, exist_ok=True)
+
+    adios_obj = Adios(args.xml, comm) if args.xml else Adios(comm)
+    analyses = []
+    for spec in specs:
+        analysis = ANALYSES[spec["type"]](spec, comm, adios_obj, args, output_dir)
+        analysis.setup()
+        analyses.append(analysis)
+
+    variables = read_variables(analyses)
+    halo = max(a.halo for a in analyses)
+    if rank == 0:
+        print(f"Reading {'every variable' if variables is None else ', '.join(variables)} once per step, "
+              f"{halo} ghost planes")
+
+    reader = StepReader(args.input_file, variables, comm, xml=args.xml, io_name="ReadIO", halo=halo,
+                        max_steps=args.max_steps, prefetch=False if args.no_prefetch else None)
+    times = np.zeros(len(analyses) + 1)
+    start = MPI.Wtime()
+    for step in reader:
+        times[0] += MPI.Wtime() - start
+        if rank == 0:
+            print(f"Processing step {step.step}")
+        for i, analysis in enumerate(analyses):
+            t = MPI.Wtime()
+            analysis.process(step)
+            times[i + 1] += MPI.Wtime() - t
+        start = MPI.Wtime()
+
+    for analysis in analyses:
+        analysis.finalize()
+
+    # slowest rank per stage; read is the time spent waiting for the next step
+    slowest = np.empty_like(times)
+    comm.Reduce(times, slowest, op=MPI.MAX, root=0)
+    if rank == 0:
+        print("Time per stage (s):")
+        print(f"  read: {slowest[0]:.2f}")
+        for analysis, t in zip(analyses, slowest[1:]):
+            print(f"  {analysis.name}: {t:.2f}")
+        print(f"Images saved to {output_dir}")
+
+
+if __name__ == "__main__":
+    install()
+    main()
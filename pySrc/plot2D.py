@@ -1,4 +1,3 @@
-import adios2
 import matplotlib.pyplot as plt
 import argparse
 import os
@@ -7,6 +6,7 @@ import numpy as np
 from PIL import Image
 from rich.traceback import install
 import sys
+from stepReader import StepReader
 def parser_arguments():
     install()
     parser = argparse.ArgumentParser(description="Parallel 2D plot with consistent color scale")
@@ -42,11 +42,29 @@ def stitch_images_horizontally(image_paths, output_path):
 
     stitched.save(output_path)
 
+def plot_stitched(local_data, var, step_count, comm, output_dir):
+    """Plot every rank's block with the global colour range and stitch the images on rank 0."""
+    rank = comm.Get_rank()
+    local_min = float(np.min(local_data))
+    local_max = float(np.max(local_data))
+    global_min = comm.allreduce(local_min, op=MPI.MIN)
+    global_max = comm.allreduce(local_max, op=MPI.MAX)
+
+    img_path = save_rank_image(local_data, rank, var, step_count, global_min, global_max)
+    all_img_paths = comm.gather(img_path, root=0)
+
+    if rank == 0:
+        final_path = os.path.join(output_dir, f"{var}_step_{step_count:04d}.png")
+        stitch_images_horizontally(all_img_paths, final_path)
+        print(f"Saved stitched image: {final_path}")
+
+        for p in all_img_paths:
+            os.remove(p)
+
 def main():
     install()
     comm = MPI.COMM_WORLD
     rank = comm.Get_rank()
-    size = comm.Get_size()
 
     args = parser_arguments()
     input_file = args.input_file
@@ -56,63 +74,32 @@ def main():
     if max_steps <= 0:
         print(f"max_steps must be postive max_steps: {max_steps}")
         sys.exit()
-    if adios2_xml:
-        adios = adios2.Adios(adios2_xml, comm)
-    else:
-        adios = adios2.Adios(comm)
-
-    io = adios.declare_io("ReadIO")
     output_dir = "../RESULTS"
     if rank == 0:
         os.makedirs(output_dir, exist_ok=True)
 
-    with adios2.Stream(io, input_file, 'r', comm) as stream:
-        for step_count, _ in enumerate(stream):
-            status = stream.begin_step()
-            if not status or step_count >= max_steps:
-                break
-
-            for var in var_list:
-                if var not in stream.available_variables():
-                    if rank == 0:
-                        print(f"Variable {var} not found.")
-                    continue
+    reader = StepReader(input_file, var_list, comm, xml=adios2_xml, io_name="ReadIO", max_steps=max_steps)
+    for current in reader:
+        step_count = current.index
 
-                var_in = io.inquire_variable(var)
-                shape = var_in.shape()
-
-                if not shape or len(shape) != 3 or shape[0] != 1:
-                    if rank == 0:
-                        print(f"Skipping variable {var} due to unexpected shape {shape}")
-                    continue
-
-                Y, Z = shape[1], shape[2]
-                base = Z // size
-                rem = Z % size
-                local_z = base + 1 if rank < rem else base
-                local_start = rank * base + min(rank, rem)
-
-                count = [1, Y, local_z]
-                start = [0, 0, local_start]
-                var_in.set_selection((start, count))
-
-                local_data = stream.read(var)
-
-                local_min = float(np.min(local_data))
-                local_max = float(np.max(local_data))
-                global_min = comm.allreduce(local_min, op=MPI.MIN)
-                global_max = comm.allreduce(local_max, op=MPI.MAX)
+        for var in var_list:
+            if var not in current:
+                if rank == 0:
+                    print(f"Variable {var} not found.")
+                continue
 
-                img_path = save_rank_image(local_data, rank, var, step_count, global_min, global_max)
-                all_img_paths = comm.gather(img_path, root=0)
+            slab = current.slabs[var]
+            shape = slab.shape if slab is not None else []
 
+            if not shape or len(shape) != 3 or shape[0] != 1:
                 if rank == 0:
-                    final_path = os.path.join(output_dir, f"{var}_step_{step_count:04d}.png")
-                    stitch_images_horizontally(all_img_paths, final_path)
-                    print(f"Saved stitched image: {final_path}")
+                    print(f"Skipping variable {var} due to unexpected shape {shape}")
+                continue
+
+            # this rank's block of columns
+            local_data = current[var]
 
-                    for p in all_img_paths:
-                        os.remove(p)
+            plot_stitched(local_data, var, step_count, comm, output_dir)
 
     if rank == 0:
         print(f"\nAll output saved in {output_dir}/")
@@ -0,0 +1,61 @@
+import numpy as np
+
+
+def slab_bounds(n, rank, size):
+    """(start, count) of the block of n points owned by rank, remainder spread over the first ranks."""
+    base = n // size
+    rem = n % size
+    count = base + 1 if rank < rem else base
+    start = rank * base + min(rank, rem)
+    return start, count
+
+
+def transpose_slabs(a, comm, split_from=2, split_to=0):
+    """Redistribute a slab-decomposed array with one all-to-all.
+
+    `a` is this rank's block of a global array, split along `split_from` and
+    complete along `split_to`. The result is this rank's block of the same
+    global array split along `split_to` (same slab_bounds rule) and complete
+    along `split_from`. Calling it again with the axes swapped undoes it.
+    """
+    size = comm.Get_size()
+    rank = comm.Get_rank()
+
+    n_to = a.shape[split_to]
+    from_counts = comm.allgather(a.shape[split_from])
+    to_bounds = [slab_bounds(n_to, r, size) for r in range(size)]
+
+    # one contiguous block per destination rank, in rank order
+    send_blocks = [np.take(a, np.arange(start, start + count), axis=split_to)
+                   for start, count in to_bounds]
+    sendbuf = np.concatenate([b.ravel() for b in send_blocks]) if send_blocks else np.empty(0, a.dtype)
+    send_counts = np.array([b.size for b in send_blocks], dtype=np.int64)
+
+    my_count_to = to_bounds[rank][1]
+    plane = my_count_to
+    for d in range(a.ndim):
+        if d not in (split_from, split_to):
+            plane *= a.shape[d]
+    recv_counts = np.array([plane * c for c in from_counts], dtype=np.int64)
+    block_shape = list(a.shape)
+    block_shape[split_to] = my_count_to
+
+    recvbuf = np.empty(int(recv_counts.sum()), dtype=a.dtype)
+    send_displs = np.concatenate(([0], np.cumsum(send_counts)[:-1]))
+    recv_displs = np.concatenate(([0], np.cumsum(recv_counts)[:-1]))
+    comm.Alltoallv([sendbuf, (send_counts, send_displs)], [recvbuf, (recv_counts, recv_displs)])
+
+    out_shape = list(a.shape)
+    out_shape[split_to] = my_count_to
+    out_shape[split_from] = sum(from_counts)
+    out = np.empty(out_shape, dtype=a.dtype)
+
+    offset = 0
+    for r, count in enumerate(from_counts):
+        block_shape[split_from] = count
+        index = [slice(None)] * a.ndim
+        index[split_from] = slice(offset, offset + count)
+        out[tuple(index)] = recvbuf[recv_displs[r]:recv_displs[r] + recv_counts[r]].reshape(block_shape)
+        offset += count
+
+    return out
@@ -0,0 +1,201 @@
+import sys
+import argparse
+import numpy as np
+from adios2 import Adios, Stream
+from mpi4py import MPI
+from rich.traceback import install
+from slabs import slab_bounds, transpose_slabs
+from stepReader import StepReader
+from writers import add_writer_arguments, configure_writer
+
+
+def wavenumbers(n, length):
+    return 2 * np.pi * np.fft.fftfreq(n, d=length / n)
+
+
+def local_spectral_energy(components, comm):
+    """Rank-local modal kinetic energy 0.5*|u_hat|^2 of slab-decomposed velocity components.
+
+    Each component is this rank's (n0, n1, local_n2) block. The FFT is real along
+    axis 1 and complex along axes 0 and 2; axes 0 and 1 are done locally, then
+    one all-to-all puts axis 2 on-rank (split along axis 0) for the last pass.
+    Returns the energy block, split along axis 0, and the Hermitian weights for axis 1.
+    """
+    energy = None
+    n_total = None
+    for u in components:
+        u_hat = np.fft.rfft(u, axis=1)
+        u_hat = np.fft.fft(u_hat, axis=0)
+        u_hat = transpose_slabs(u_hat, comm, split_from=2, split_to=0)
+        u_hat = np.fft.fft(u_hat, axis=2)
+
+        if n_total is None:
+            n_total = float(u.shape[0]) * float(u.shape[1]) * float(u_hat.shape[2])
+            energy = np.zeros(u_hat.shape, dtype=np.float64)
+        energy += 0.5 * (u_hat.real ** 2 + u_hat.imag ** 2)
+
+    energy /= n_total ** 2
+
+    # modes 0 < k1 < n1/2 stand for their missing complex conjugates too
+    n1 = components[0].shape[1]
+    weight1 = np.full(n1 // 2 + 1, 2.0)
+    weight1[0] = 1.0
+    if n1 % 2 == 0:
+        weight1[-1] = 1.0
+
+    return energy * weight1[None, :, None]
+
+
+def energy_spectra(components, lengths, comm):
+    """Shell-averaged E(|k|) and 1D spectra E(k_i) along each axis, reduced over all ranks."""
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+
+    n0, n1 = components[0].shape[0], components[0].shape[1]
+    n2 = comm.allreduce(components[0].shape[2], op=MPI.SUM)
+
+    energy = local_spectral_energy(components, comm)
+
+    start0, count0 = slab_bounds(n0, rank, size)
+    k0 = wavenumbers(n0, lengths[0])[start0:start0 + count0]
+    k1 = np.abs(wavenumbers(n1, lengths[1])[:n1 // 2 + 1])
+    k2 = wavenumbers(n2, lengths[2])
+
+    dk = min(2 * np.pi / L for L, n in zip(lengths, (n0, n1, n2)) if n > 1)
+    n_shells = int(np.ceil(np.sqrt(np.sum([(np.pi * n / L) ** 2 for L, n in zip(lengths, (n0, n1, n2))])) / dk)) + 1
+
+    k_mag = np.sqrt(k0[:, None, None] ** 2 + k1[None, :, None] ** 2 + k2[None, None, :] ** 2)
+    shell = np.rint(k_mag / dk).astype(np.int64)
+    local_shell = np.bincount(shell.ravel(), weights=energy.ravel(), minlength=n_shells)[:n_shells]
+
+    local_1d = []
+    for axis, (n, L) in enumerate(zip((n0, n1, n2), lengths)):
+        n_bins = n // 2 + 1
+        k_axis = (k0, k1, k2)[axis]
+        index = np.minimum(np.rint(np.abs(k_axis) / (2 * np.pi / L)).astype(np.int64), n_bins - 1)
+        summed = energy.sum(axis=tuple(a for a in range(3) if a != axis))
+        local_1d.append(np.bincount(index, weights=summed, minlength=n_bins))
+
+    E_shell = np.empty_like(local_shell)
+    comm.Allreduce(local_shell, E_shell, op=MPI.SUM)
+
+    E_1d = []
+    for local in local_1d:
+        total = np.empty_like(local)
+        comm.Allreduce(local, total, op=MPI.SUM)
+        E_1d.append(total)
+
+    k_shell = dk * np.arange(n_shells)
+    k_1d = [(2 * np.pi / L) * np.arange(n // 2 + 1) for n, L in zip((n0, n1, n2), lengths)]
+    return k_shell, E_shell, k_1d, E_1d
+
+
+def parse_arguments():
+    install()
+    parser = argparse.ArgumentParser(description='Parallel FFT kinetic energy spectra from ADIOS2 BP5 velocity files')
+
+    parser.add_argument('input_file',
+                        type=str,
+                        help='Path to the input ADIOS2 BP5 file (REQUIRED)')
+
+    parser.add_argument('max_steps',
+                        type=int,
+                        help='Maximum number of time steps to process (REQUIRED)')
+
+    parser.add_argument('--xml',
+                        '-x',
+                        type=str,
+                        default=None,
+                        help='Path to ADIOS2 XML configuration file (optional)')
+
+    parser.add_argument('--output',
+                        '-o',
+                        type=str,
+                        default='spectra.bp',
+                        help='Output file name default: spectra.bp (optional)')
+
+    parser.add_argument('--vars',
+                        '-v',
+                        type=str,
+                        default='ux,uy,uz',
+                        help='Velocity components, separated by commas default: ux,uy,uz (optional)')
+
+    parser.add_argument('--lengths',
+                        type=float,
+                        nargs=3,
+                        default=[2 * np.pi] * 3,
+                        metavar=('L0', 'L1', 'L2'),
+                        help='Periodic domain length along array axes 0, 1, 2 default: 2pi 2pi 2pi (optional)')
+
+    add_writer_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    install()
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+
+    args = parse_arguments()
+    variables = args.vars.split(',')
+    max_steps = args.max_steps
+
+    if rank == 0:
+        print(f"Running with {size} MPI processes")
+        print(f"Input file: {args.input_file}")
+        print(f"Velocity components: {variables}")
+        print(f"Output file: {args.output}")
+
+    if max_steps <= 0:
+        if rank == 0:
+            print("Error: max_steps must be a positive integer.")
+        sys.exit(1)
+
+    adios_obj = Adios(args.xml, comm) if args.xml else Adios(comm)
+    Wio = adios_obj.declare_io("WriteIO")
+    configure_writer(Wio, args)
+
+    # 3D arrays come in z slabs (axis 2), the layout local_spectral_energy starts from
+    reader = StepReader(args.input_file, variables, comm, xml=args.xml, io_name="readerIO",
+                        max_steps=max_steps)
+    with Stream(Wio, args.output, "w", comm) as w:
+        for step in reader:
+            current_step = step.step
+            if rank == 0:
+                print(f"Processing step {current_step}")
+
+            components = []
+            for var in variables:
+                # the energy needs every component: a partial sum would look valid but be wrong
+                if var not in step:
+                    if rank == 0:
+                        print(f"Error: velocity component {var} not found in step {current_step}")
+                    sys.exit(1)
+                slab = step.slabs[var]
+                shape = slab.shape if slab is not None else []
+                if len(shape) != 3:
+                    if rank == 0:
+                        print(f"Expected 3D variable {var}, got shape {shape}")
+                    sys.exit(1)
+                components.append(np.asarray(step[var], dtype=np.float64))
+
+            k_shell, E_shell, k_1d, E_1d = energy_spectra(components, args.lengths, comm)
+
+            w.begin_step()
+            if rank == 0:
+                w.write("k", k_shell)
+                w.write("E_k", E_shell)
+                for axis in range(3):
+                    w.write(f"k_{axis}", k_1d[axis])
+                    w.write(f"E_{axis}", E_1d[axis])
+                print(f"Total kinetic energy: {E_shell.sum():.6e}")
+            w.end_step()
+
+    if rank == 0:
+        print(f"Output written to {args.output}")
+
+
+if __name__ == "__main__":
+    install()
+    main()
@@ -0,0 +1,199 @@
+import queue
+import threading
+import numpy as np
+from adios2 import Adios, Stream
+from mpi4py import MPI
+from slabs import slab_bounds
+
+# ADIOS2 type names -> NumPy, to allocate buffers from metadata alone
+ADIOS_TYPES = {
+    "int8_t": np.int8, "int16_t": np.int16, "int32_t": np.int32, "int64_t": np.int64,
+    "uint8_t": np.uint8, "uint16_t": np.uint16, "uint32_t": np.uint32, "uint64_t": np.uint64,
+    "char": np.int8, "float": np.float32, "double": np.float64,
+    "float complex": np.complex64, "double complex": np.complex128,
+}
+
+
+def default_axis(shape):
+    """Decomposition axis: 2 (z slabs), or the last axis of 1D/2D arrays."""
+    return 2 if len(shape) >= 3 else len(shape) - 1
+
+
+class Slab:
+    """This rank's part of an array of global `shape`.
+
+    It owns planes [start, start + count) along axis and reads lo ghost planes
+    below and hi above them (at most halo, fewer at the domain edges).
+    read_start/read_count select the block with ghosts, write_start/write_count
+    the owned part, as passed to Stream.write.
+    """
+
+    def __init__(self, shape, axis, rank, size, halo=0):
+        self.shape = list(shape)
+        self.axis = axis
+        self.start, self.count = slab_bounds(self.shape[axis], rank, size)
+        self.lo = min(halo, self.start) if self.count else 0
+        self.hi = min(halo, self.shape[axis] - self.start - self.count) if self.count else 0
+        self.read_start = [0] * len(self.shape)
+        self.read_start[axis] = self.start - self.lo
+        self.read_count = list(self.shape)
+        self.read_count[axis] = self.count + self.lo + self.hi
+        self.write_start = [0] * len(self.shape)
+        self.write_start[axis] = self.start
+        self.write_count = list(self.shape)
+        self.write_count[axis] = self.count
+
+    def interior(self, block):
+        """The owned planes of a block read with this slab (ghosts dropped)."""
+        index = [slice(None)] * block.ndim
+        index[self.axis] = slice(self.lo, self.lo + self.count)
+        return block[tuple(index)]
+
+
+class Step:
+    """One input step: its number, index in the run, variable metadata and this rank's blocks.
+
+    step[name] is the block of an array (ghosts included) or the value of a
+    single value; slabs[name] is the array's Slab (None for single values).
+    Blocks live in reused buffers: copy what must outlive the next step.
+    """
+
+    def __init__(self, step, index, available):
+        self.step = step
+        self.index = index
+        self.available = available
+        self.data = {}
+        self.slabs = {}
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def __contains__(self, name):
+        return name in self.data
+
+
+class StepReader:
+    """Iterate over the steps of a BP file, each rank reading its slab of each variable.
+
+    The file is opened once; each block is a slab along one axis
+    (slabs.slab_bounds) plus its ghost planes, read into one of two sets of
+    reused buffers with one PerformGets per step.
+
+    variables=None reads every variable of a supported type (missing ones are
+    left out of the Step). axis=None uses default_axis; halo adds ghost planes.
+    max_steps limits the steps read, steps (a collection of step numbers)
+    skips the others without reading them. prefetch=None reads ahead on a
+    thread when MPI allows threads to make MPI calls. The reader has its own
+    Adios object; io_name picks the <io> of the XML it takes settings from.
+    """
+
+    def __init__(self, path, variables=None, comm=None, xml=None, io_name="StepReaderIO", axis=None, halo=0,
+                 max_steps=None, steps=None, prefetch=None):
+        self.path = path
+        self.variables = None if variables is None else list(variables)
+        self.comm = comm if comm is not None else MPI.COMM_WORLD
+        self.axis = axis
+        self.halo = halo
+        self.max_steps = max_steps
+        self.steps = None if steps is None else set(steps)
+        if prefetch is None:
+            prefetch = MPI.Query_thread() == MPI.THREAD_MULTIPLE
+        self.prefetch = prefetch
+        self.adios = Adios(xml, self.comm) if xml else Adios(self.comm)
+        self.io = self.adios.declare_io(io_name)
+        self._slabs = {}
+        self._buffers = ({}, {})
+
+    def slab(self, name, shape):
+        """Slab of variable name for this rank, kept until the shape changes."""
+        slab = self._slabs.get(name)
+        if slab is None or slab.shape != list(shape):
+            axis = default_axis(shape) if self.axis is None else self.axis
+            slab = Slab(shape, axis, self.comm.Get_rank(), self.comm.Get_size(), self.halo)
+            self._slabs[name] = slab
+        return slab
+
+    def _read(self, s, index, buffers):
+        available = s.available_variables()
+        step = Step(s.current_step(), index, available)
+        names = available if self.variables is None else [n for n in self.variables if n in available]
+        for name in names:
+            info = available[name]
+            kind = info.get("Type", "")
+            if kind == "string" or info.get("SingleValue") == "true" or not info.get("Shape"):
+                step.data[name] = s.read(name)
+                step.slabs[name] = None
+                continue
+            if kind not in ADIOS_TYPES:
+                continue
+            var = s.inquire_variable(name)
+            slab = self.slab(name, var.shape())
+            buffer = buffers.get(name)
+            if buffer is None or buffer.shape != tuple(slab.read_count) or buffer.dtype != ADIOS_TYPES[kind]:
+                buffer = buffers[name] = np.empty(slab.read_count, dtype=ADIOS_TYPES[kind])
+            if buffer.size:
+                var.set_selection((slab.read_start, slab.read_count))
+                s.read_in_buffer(var, buffer, defer_read=True)
+            step.data[name] = buffer
+            step.slabs[name] = slab
+        # one PerformGets for all the blocks of the step
+        s.read_complete()
+        return step
+
+    def _run(self, take):
+        """Read the steps, calling take() for a free buffer set (None stops); yields (Step, set)."""
+        with Stream(self.io, self.path, "r", self.comm) as s:
+            for index, _ in enumerate(s):
+                if self.max_steps is not None and index >= self.max_steps:
+                    break
+                if self.steps is not None and s.current_step() not in self.steps:
+                    continue
+                which = take()
+                if which is None:
+                    break
+                yield self._read(s, index, self._buffers[which]), which
+
+    def __iter__(self):
+        if not self.prefetch:
+            for step, _ in self._run(lambda: 0):
+                yield step
+            return
+
+        # double buffering: the thread fills one set while the caller works on the other
+        free = queue.Queue()
+        free.put(0)
+        free.put(1)
+        ready = queue.Queue()
+        stop = threading.Event()
+
+        def take():
+            which = free.get()
+            return None if stop.is_set() else which
+
+        def run():
+            try:
+                for item in self._run(take):
+                    ready.put(item)
+            except Exception as e:
+                ready.put(e)
+                return
+            ready.put(None)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        held = None
+        try:
+            while True:
+                if held is not None:
+                    free.put(held)
+                item = ready.get()
+                if isinstance(item, Exception):
+                    raise item
+                if item is None:
+                    break
+                step, held = item
+                yield step
+        finally:
+            stop.set()
+            free.put(None)
+            thread.join()
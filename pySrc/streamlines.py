@@ -3,110 +3,36 @@ import matplotlib.pyplot as plt
 import os
 import sys
 import argparse
-from adios2 import Adios, Stream
-import mpi4py as MPI
+import queue
+import threading
+from adios2 import Adios, Stream, FileReader
+from mpi4py import MPI
 from rich.traceback import install
-from scipy.interpolate import RegularGridInterpolator
 from matplotlib.collections import LineCollection
+from tracing import grid_sampler, seed_grid, trace_streamlines, trace_streamlines_rk45, trace_streamlines_slabs, write_streamlines
+from slabs import slab_bounds
+from lic import lic_texture, lic_image, plot_lic
+from velocityIO import read_steps, slice_2d, velocity_range
+from writers import add_writer_arguments, configure_writer
 
 # dt is the physical step size change for each 
 # 257 -> 0.002, 515 -> 0.0005, 1025-> 0.0001, 2049-> 0.00005, 4097 -> 0.000025
+# (--integrator rk45 picks the step itself, bounded by the grid spacing)
 # how to tell the all to be the same length full streamline then same steps then different dt
 def rk4_streamline_from_grid(x0, y0, vx, vy, max_len=-1, dt=0.002, max_steps=10, xlim=None, ylim=None):
-    xgrid = np.linspace(0, 1, vx.shape[1])  
-    ygrid = np.linspace(0, 1, vx.shape[0]) 
-
-    interp_vx = RegularGridInterpolator((ygrid, xgrid), vx)
-    interp_vy = RegularGridInterpolator((ygrid, xgrid), vy)
-    def vector_field(x, y):
-        point = np.array([y, x]) 
-        u = interp_vx(point)[0] if isinstance(interp_vx(point), np.ndarray) else float(interp_vx(point))
-        v = interp_vy(point)[0] if isinstance(interp_vy(point), np.ndarray) else float(interp_vy(point))
-        norm = np.hypot(u, v)
-        if norm < 1e-8:
-            return np.array([0.0, 0.0])
-        return np.array([u, v]) / norm
-
-    path = [(x0, y0)]
-    x, y = x0, y0
-
-    arc_len = 0 
-    cnt = 0 
-    for _ in range(max_steps):
-        cnt +=1
-        k1 = vector_field(x, y)
-        k2 = vector_field(x + dt * k1[0] / 2, y + dt * k1[1] / 2)
-        k3 = vector_field(x + dt * k2[0] / 2, y + dt * k2[1] / 2)
-        k4 = vector_field(x + dt * k3[0], y + dt * k3[1])
-        dx, dy = dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
-        x_prev = x
-        y_prev = y 
-        
-        x += dx
-        y += dy
-        arc_len +=np.sqrt(pow((x-x_prev),2) +  pow((y-y_prev),2) )
-        
-        if xlim and (x < xlim[0] or x > xlim[1]):
-            print('xlim')
-            break
-        if ylim and (y < ylim[0] or y > ylim[1]):
-            print('ylim')
-            break
-        path.append((x, y))
-        
-        if max_len > 0 and arc_len >= max_len:
-            print('arc length')            
-            break
-    print(arc_len)
-    print("--"*60)
-    print(cnt)
-    print('--'*60)
-    return np.array(path)
-
+    """One streamline from (x0, y0); see tracing.trace_streamlines for many seeds at once."""
+    sample = grid_sampler((vx, vy))
+    bounds = (xlim or (0.0, 1.0), ylim or (0.0, 1.0))
+    path, _ = trace_streamlines([[x0, y0]], sample, dt=dt, max_steps=max_steps, max_len=max_len, bounds=bounds)
+    return path
 
 
 # You need to do the same with 3d also take in the seeds as a param
 # save segments and write out and save seed points 
-def calculate_global_velocity_range(all_data, is_3d=False):
+def plot_streamlines_2d(ux, uy, step, base_filename, vmin, vmax, save_fig, streamline_path, lic=False):
+    """Streamline plots of one step; lic=True draws LIC textures instead of plt.streamplot."""
     install()
-    """Calculate global velocity range for consistent coloring"""
-    global_min = float('inf')
-    global_max = float('-inf')
-    
-    print("Calculating global velocity magnitude range...")
-    
-    for step, ux, uy, uz in all_data:
-        if is_3d and uz is not None:
-            magnitude = np.sqrt(ux**2 + uy**2 + uz**2)
-        else:
-            magnitude = np.sqrt(ux**2 + uy**2)
-        
-        current_min = np.min(magnitude)
-        current_max = np.max(magnitude)
-        # for now
-        # Using color scale range: [0.000000, 0.591330]
-        global_min = min(global_min, current_min)
-        global_max = max(global_max, current_max)
-        
-        #global_min = 0
-        #global_max = 0.591330
-        
-        print(f"  Step {step}: min={current_min:.6f}, max={current_max:.6f}")
-    
-    print(f"Global velocity magnitude range: [{global_min:.6f}, {global_max:.6f}]")
-    return global_min, global_max
-
-# make seeds in parallel 
-def plot_streamlines_2d(ux, uy, step, base_filename, vmin, vmax, save_fig, streamline_writer):
-    install()
-    if len(ux.shape) == 3:
-        mid_slice = ux.shape[2] // 2
-        ux_2d = ux[:, :, mid_slice]
-        uy_2d = uy[:, :, mid_slice]
-        print(f"Using middle slice {mid_slice} for 2D visualization")
-    else:
-        ux_2d = ux
-        uy_2d = uy
+    ux_2d, uy_2d = slice_2d(ux, uy)
 
     ny, nx = ux_2d.shape
     x, y = np.meshgrid(np.linspace(0, 1, nx), np.linspace(0, 1, ny))
@@ -120,14 +46,19 @@ def plot_streamlines_2d(ux, uy, step, base_filename, vmin, vmax, save_fig, strea
     # ------------------------------
     
     fig_all, ax_all = plt.subplots(figsize=(10, 8))
-    strm_all = ax_all.streamplot(x, y, ux_2d, uy_2d, color=magnitude, cmap='jet', density=1.5, maxlength= 0.5)
-    
-    ax_all.set_xlabel('X')
-    ax_all.set_ylabel('Y')
-    ax_all.set_title(f"{base_filename} - 2D Streamlines - Step {step}")
-    cb_all = fig_all.colorbar(strm_all.lines, ax=ax_all, label="Velocity magnitude")
-    cb_all.mappable.set_clim(vmin, vmax)
-    output_filename_all = f"{base_filename}_2d_all_streamlines_step{step:04d}.png"
+    if lic:
+        texture = lic_texture(ux_2d, uy_2d)
+        plot_lic(lic_image(texture, magnitude, vmin, vmax), f"{base_filename} - 2D LIC - Step {step}", None,
+                 vmin, vmax, ax=ax_all)
+    else:
+        strm_all = ax_all.streamplot(x, y, ux_2d, uy_2d, color=magnitude, cmap='jet', density=1.5, maxlength= 0.5)
+
+        ax_all.set_xlabel('X')
+        ax_all.set_ylabel('Y')
+        ax_all.set_title(f"{base_filename} - 2D Streamlines - Step {step}")
+        cb_all = fig_all.colorbar(strm_all.lines, ax=ax_all, label="Velocity magnitude")
+        cb_all.mappable.set_clim(vmin, vmax)
+    output_filename_all = f"{base_filename}_2d_{'lic' if lic else 'all_streamlines'}_step{step:04d}.png"
     output_path_all = os.path.join(output_dir, output_filename_all)
     if save_fig:
         fig_all.savefig(output_path_all, dpi=300, bbox_inches='tight')
@@ -139,16 +70,17 @@ def plot_streamlines_2d(ux, uy, step, base_filename, vmin, vmax, save_fig, strea
     # ---------------------------------------------
     fig_one, ax_one = plt.subplots(figsize=(10, 8))
     
-    streamline_path = rk4_streamline_from_grid(0.5, 0.1, ux_2d, uy_2d, max_len=1000)
-    
     # Plot the background velocity field for context
-    strm_bg = ax_one.streamplot(x, y, ux_2d, uy_2d, color='lightgray', density=0.5)
-    # Set alpha on the line collection
-    strm_bg.lines.set_alpha(0.3)
+    if lic:
+        ax_one.imshow(lic_image(texture), origin='lower', extent=(0, 1, 0, 1), alpha=0.3)
+    else:
+        strm_bg = ax_one.streamplot(x, y, ux_2d, uy_2d, color='lightgray', density=0.5)
+        # Set alpha on the line collection
+        strm_bg.lines.set_alpha(0.3)
     
     # Plot the custom streamline
     ax_one.plot(streamline_path[:, 0], streamline_path[:, 1], 'red', linewidth=2, 
-                label='Custom RK4 Streamline (0.5, 0.1)')
+                label=f'Custom RK4 Streamline ({streamline_path[0, 0]:.3g}, {streamline_path[0, 1]:.3g})')
     ax_one.plot(streamline_path[0, 0], streamline_path[0, 1], 'go', markersize=8, 
                 label='Start Point')
     ax_one.plot(streamline_path[-1, 0], streamline_path[-1, 1], 'ro', markersize=8, 
@@ -166,15 +98,7 @@ def plot_streamlines_2d(ux, uy, step, base_filename, vmin, vmax, save_fig, strea
     # ---------------------------------------------
     fig_three, ax_three = plt.subplots(figsize=(10, 8))
     
-    ux_interp = RegularGridInterpolator((np.linspace(0, 1, ny), np.linspace(0, 1, nx)), ux_2d)
-    uy_interp = RegularGridInterpolator((np.linspace(0, 1, ny), np.linspace(0, 1, nx)), uy_2d)
-    magnitudes = []
-    for pt in streamline_path:
-        u_val = ux_interp((pt[1], pt[0]))
-        v_val = uy_interp((pt[1], pt[0]))
-        mag = np.hypot(u_val, v_val)
-        magnitudes.append(mag)
-    magnitudes = np.array(magnitudes)
+    magnitudes = np.linalg.norm(grid_sampler((ux_2d, uy_2d))(streamline_path), axis=1)
     
     points = streamline_path.reshape(-1, 1, 2)
     segments = np.concatenate([points[:-1], points[1:]], axis=1)
@@ -202,18 +126,6 @@ def plot_streamlines_2d(ux, uy, step, base_filename, vmin, vmax, save_fig, strea
         print(f"Saved RK4 streamline only plot: {output_path_third}")
     plt.close(fig_three)
 
-    
-    segments = streamline_path.flatten()
-    seed_points = np.array([0.5, 0.1])
-    
-    streamline_writer.begin_step()
-    print("="*60)
-    print(segments)
-    print("="*60)
-    streamline_writer.write('segments', segments)
-    streamline_writer.end_step()
-    
-    print(f"Written streamline data for step {step} to segments.bp")
 
     output_filename_one = f"{base_filename}_2d_single_streamline_step{step:04d}.png"
     output_path_one = os.path.join(output_dir, output_filename_one)
@@ -224,14 +136,14 @@ def plot_streamlines_2d(ux, uy, step, base_filename, vmin, vmax, save_fig, strea
     
     return output_filename_one
 
-def plot_streamlines_3d(ux, uy, uz, step, base_filename, vmin, vmax, var_1, var_2, slice_idx):
-    """Plot 3D streamlines by extracting 2D slice"""
+def plot_streamlines_3d(ux, uy, uz, step, base_filename, vmin, vmax, var_1, var_2, slice_idx, plane_start=0):
+    """Plot 3D streamlines by extracting 2D slice (ux etc. may be an x slab starting at plane_start)"""
     install()
     if len(ux.shape) != 3:
         print(f"Warning: Expected 3D data, got {ux.shape}")
         return None
     
-    if slice_idx >= ux.shape[2]:
+    if slice_idx - plane_start >= ux.shape[2]:
         print(f"Warning: Slice {slice_idx} exceeds data size {ux.shape[2]}")
         slice_idx = ux.shape[2] // 2
         print(f"Using middle slice: {slice_idx}")
@@ -242,8 +154,8 @@ def plot_streamlines_3d(ux, uy, uz, step, base_filename, vmin, vmax, var_1, var_
         'vx': ux, 'vy': uy, 'vz': uz
     }
     
-    u = vel_dict[var_1][:, :, slice_idx]
-    v = vel_dict[var_2][:, :, slice_idx]
+    u = vel_dict[var_1][:, :, slice_idx - plane_start]
+    v = vel_dict[var_2][:, :, slice_idx - plane_start]
     
     ny, nx = u.shape
     x, y = np.meshgrid(np.linspace(0, 1, nx), np.linspace(0, 1, ny))
@@ -268,6 +180,13 @@ def plot_streamlines_3d(ux, uy, uz, step, base_filename, vmin, vmax, var_1, var_
     return output_filename
 
 
+def rk45_step_cap(max_len, h_max, args):
+    """Safety cap on accepted RK45 steps: --trace_steps, but at least 100 steps of h_max per max_len."""
+    if max_len <= 0:
+        return args.trace_steps
+    return max(args.trace_steps, 100 * int(np.ceil(max_len / h_max)))
+
+
 def parse_arguments():
     install()
     parser = argparse.ArgumentParser(description='Generate streamline plots from ADIOS2 BP files')
@@ -305,12 +224,79 @@ def parse_arguments():
                         type=bool,
                         default=False,
                         help='save images')
+    parser.add_argument('--vrange',
+                        type=float,
+                        nargs=2,
+                        default=None,
+                        metavar=('VMIN', 'VMAX'),
+                        help='Fixed velocity magnitude colour range, skips the metadata scan (optional)')
+    parser.add_argument('--prefetch',
+                        type=int,
+                        default=2,
+                        help='Steps read ahead while the current one is plotted default: 2 (optional)')
+    parser.add_argument('--parallel',
+                        type=str,
+                        choices=['steps', 'seeds'],
+                        default='steps',
+                        help='2D MPI mode: each rank takes whole steps, or all ranks share the seeds of every step default: steps (optional)')
+    parser.add_argument('--seed_grid',
+                        type=int,
+                        nargs='+',
+                        default=None,
+                        metavar='N',
+                        help='Trace from NX NY (2D) or NX NY NZ (3D) seeds at cell centres of the domain default: one seed at (0.5, 0.1[, 0.5]) (optional)')
+    parser.add_argument('--lengths',
+                        type=float,
+                        nargs=3,
+                        default=[1.0, 1.0, 1.0],
+                        metavar=('LX', 'LY', 'LZ'),
+                        help='3D domain size, the grid spans [0, L] per axis default: 1 1 1 (optional)')
+    parser.add_argument('--ghost',
+                        type=int,
+                        default=2,
+                        help='3D mode: x planes read beyond each rank\'s slab, at least 2; --dt (or --h_max cells) must fit in ghost - 1 cells default: 2 (optional)')
+    parser.add_argument('--integrator',
+                        type=str,
+                        choices=['rk4', 'rk45'],
+                        default='rk4',
+                        help='Fixed step RK4 (--dt) or adaptive Dormand-Prince RK45 (--atol/--rtol/--h_max) default: rk4 (optional)')
+    parser.add_argument('--dt',
+                        type=float,
+                        default=0.002,
+                        help='RK4 step length default: 0.002 (optional)')
+    parser.add_argument('--atol',
+                        type=float,
+                        default=1e-6,
+                        help='RK45 absolute error per step default: 1e-6 (optional)')
+    parser.add_argument('--rtol',
+                        type=float,
+                        default=1e-6,
+                        help='RK45 relative error per step default: 1e-6 (optional)')
+    parser.add_argument('--h_max',
+                        type=float,
+                        default=1.0,
+                        help='Longest RK45 step in grid cells default: 1 (optional)')
+    parser.add_argument('--trace_steps',
+                        type=int,
+                        default=10,
+                        help='RK4 steps per streamline; with rk45 only a safety cap, at least 100 steps of --h_max per --max_len default: 10 (optional)')
+    parser.add_argument('--max_len',
+                        type=float,
+                        default=None,
+                        help='Maximum arc length per streamline, where rk45 stops default: trace_steps * dt with rk45, no limit with rk4 (optional)')
+    parser.add_argument('--lic',
+                        action='store_true',
+                        help='2D plots: line integral convolution texture instead of plt.streamplot, much faster on large grids (optional)')
     # add a point here
     
+    add_writer_arguments(parser)
     return parser.parse_args()
 
 def main():
     install()
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    size = comm.Get_size()
     
     args = parse_arguments()
     
@@ -321,135 +307,196 @@ def main():
     bp_file = args.path
     xml_file = args.xml
     save_fig = args.save_fig
-    print(f"saving figures = {save_fig}")
     is_3d = (args.mode == '3d')
-    if is_3d == '3d':
-        print("This code does not work in 3D mode yet, comming soon ...")
-        sys.exit(1)
     var_1 = args.var1.lower()
     var_2 = args.var2.lower()
     slice_idx = args.slice
     max_steps = args.max_steps
+    # 3D fields are split into x slabs, streamlines move between ranks
+    by_steps = args.parallel == 'steps' and not is_3d
     
     if max_steps <= 0:
-        print("Error: max_steps must be a non-negative integer.")
+        if rank == 0:
+            print("Error: max_steps must be a non-negative integer.")
+        sys.exit(1)
+    dim = 3 if is_3d else 2
+    if args.seed_grid is not None and len(args.seed_grid) != dim:
+        if rank == 0:
+            print(f"Error: --seed_grid needs {dim} counts in {args.mode} mode.")
+        sys.exit(1)
+    # rk45 ends streamlines on arc length, which does not change with the grid resolution
+    max_len = args.max_len
+    if max_len is None:
+        max_len = args.trace_steps * args.dt if args.integrator == 'rk45' else -1
+    if is_3d and args.ghost < 2:
+        if rank == 0:
+            print("Error: --ghost must be at least 2.")
         sys.exit(1)
 
-    print(f"Processing BP5 file: {bp_file}")
-    print(f"Mode: {'3D' if is_3d else '2D'}")
-    if is_3d:
-        print(f"Variables: {var_1} vs {var_2}, slice: {slice_idx}")
+    if rank == 0:
+        print(f"Running with {size} MPI processes, parallel over {'x slabs' if is_3d else args.parallel}")
+        print(f"saving figures = {save_fig}")
+        print(f"Processing BP5 file: {bp_file}")
+        print(f"Mode: {'3D' if is_3d else '2D'}")
+        if is_3d:
+            print(f"Variables: {var_1} vs {var_2}, slice: {slice_idx}")
     
     if xml_file:
-        adios_obj = Adios(xml_file)
+        adios_obj = Adios(xml_file, comm)
     else:
-        adios_obj = Adios()
-    
-    io = adios_obj.declare_io("readerIO")
+        adios_obj = Adios(comm)
     base_filename = os.path.basename(bp_file).split('.bp')[0]
-    
-    all_data = []
-    
-    print("First pass: Reading all data...")
-    with Stream(io, bp_file, 'r') as reader:
-        step_count = 0
-        for _ in reader:
 
-            status = reader.begin_step()
-            step = reader.current_step()
-            print(f"Reading step {step}")
-            
-            try:
-                ux = reader.read('ux')
-                uy = reader.read('uy')
-                
-                try:
-                    uz = reader.read('uz')
-                except:
-                    uz = None
-                
-                if len(ux.shape) == 4 and ux.shape[0] == 1:
-                    ux = ux[0, :, :, :]
-                    uy = uy[0, :, :, :]
-                    if uz is not None:
-                        uz = uz[0, :, :, :]
-                elif len(ux.shape) == 3 and ux.shape[0] == 1:
-                    ux = ux[0, :, :]
-                    uy = uy[0, :, :]
-                    if uz is not None:
-                        uz = uz[0, :, :]
-                
-                print(f"Data shapes: ux={ux.shape}, uy={uy.shape}" + (f", uz={uz.shape}" if uz is not None else ""))
-                
-                all_data.append((step, ux, uy, uz))
-                step_count += 1
-                
-                if not status or step_count >= max_steps:
-                    print(f"End of steps reached or error reading step {step}")
-                    break
-                else:
-                    continue
-            except Exception as e:
-                print(f"Error reading step {step}: {e}")
-                try:
-                    available_vars = reader.available_variables()
-                    print(f"Available variables: {list(available_vars.keys())}")
-                except:
-                    print("Could not retrieve available variables")
-                break
-    
-    if not all_data:
-        print("No data was read successfully!")
-        sys.exit(1)
-    
-    vmin, vmax = calculate_global_velocity_range(all_data, is_3d)
-    
+    # rank 0 scans the metadata, everyone needs the range and the step count
+    vrange = None
+    n_steps = None
+    shape = None
+    if rank == 0:
+        if args.vrange is not None:
+            vrange = tuple(args.vrange)
+            print(f"Using colour range [{vrange[0]}, {vrange[1]}]")
+        else:
+            vrange = velocity_range(bp_file, xml_file, max_steps, is_3d)
+        with FileReader(bp_file) as counter:
+            n_steps = min(max_steps, counter.num_steps())
+            shape = counter.inquire_variable('ux').shape()
+    vmin, vmax = comm.bcast(vrange, root=0)
+    n_steps = comm.bcast(n_steps, root=0)
+    shape = comm.bcast(shape, root=0)
+
+    seeds = seed_grid(*args.seed_grid) if args.seed_grid else np.array([[0.5, 0.1, 0.5][:dim]])
+    planes = None
+    if is_3d:
+        # this rank owns x planes [start, start + count) and reads ghost planes on both sides
+        lengths = np.array(args.lengths, dtype=np.float64)
+        nx, ny, nz = shape[-1], shape[-2], shape[-3]
+        if nx < size:
+            if rank == 0:
+                print(f"Error: {nx} x planes cannot be split over {size} ranks.")
+            sys.exit(1)
+        seeds = seeds * lengths
+        bounds = [(0.0, L) for L in lengths]
+        dx = lengths[0] / (nx - 1)
+        # the top of the owned slab already interpolates with the first ghost plane, and a step
+        # reaches up to one step length beyond the slab: past the ghosts the sampler would clamp
+        reach = args.ghost - 1
+        if args.integrator == 'rk4' and args.dt > reach * dx:
+            if rank == 0:
+                print(f"Error: --dt {args.dt} is longer than --ghost {args.ghost} allows ({reach} x cells, "
+                      f"{reach * dx:g}), raise --ghost or lower --dt.")
+            sys.exit(1)
+        if args.integrator == 'rk45' and args.h_max > reach:
+            if rank == 0:
+                print(f"Error: --h_max {args.h_max} is longer than --ghost {args.ghost} allows ({reach} x cells), "
+                      f"raise --ghost or lower --h_max.")
+            sys.exit(1)
+        start, count = slab_bounds(nx, rank, size)
+        planes = (max(start - args.ghost, 0), min(start + count + args.ghost, nx))
+        local_bounds = [(planes[0] * dx, (planes[1] - 1) * dx)] + bounds[1:]
+        owned = (start * dx, (start + count) * dx if start + count < nx else np.nextafter(lengths[0], np.inf))
+        plot_idx = slice_idx if slice_idx < nx else nx // 2
+        seed_start, seed_count = slab_bounds(len(seeds), rank, size)
+        my_seeds = seeds[seed_start:seed_start + seed_count]
+    elif by_steps:
+        my_seeds, seed_start = seeds, 0
+    else:
+        seed_start, seed_count = slab_bounds(len(seeds), rank, size)
+        my_seeds = seeds[seed_start:seed_start + seed_count]
+    # the last rank's block ends at the last seed, so it closes the offsets array
+    last_seed = by_steps or rank == size - 1
+
+    # read ahead in the background: at most --prefetch steps wait in memory
+    steps = queue.Queue(maxsize=max(args.prefetch, 1))
+    reader = threading.Thread(target=read_steps, daemon=True,
+                              args=(bp_file, xml_file, n_steps, steps, rank if by_steps else 0, size if by_steps else 1,
+                                    planes))
+    reader.start()
+
     write_io = adios_obj.declare_io("WriteStreamlineIO")
+    configure_writer(write_io, args)
     streamline_output_file = 'segments.bp'
     
-    print("Second pass: Generating plots and writing streamline data...")
-    
-    first_step, first_ux, first_uy, first_uz = all_data[0]
-    if len(first_ux.shape) == 3:
-        mid_slice = first_ux.shape[2] // 2
-        first_ux_2d = first_ux[:, :, mid_slice]
-        first_uy_2d = first_uy[:, :, mid_slice]
-    else:
-        first_ux_2d = first_ux
-        first_uy_2d = first_uy
-    
-    sample_streamline = rk4_streamline_from_grid(0.5, 0.1, first_ux_2d, first_uy_2d, max_len=1000)
-    sample_segments = sample_streamline.flatten()
-    sample_seeds = np.array([0.5, 0.1])
-    
-    seg_shape = [sample_segments.size]
-    var_segments = write_io.define_variable('segments', sample_segments, seg_shape, [0], seg_shape)
-    
-    seed_shape = [sample_seeds.size]
-    var_seeds = write_io.define_variable('seeds', sample_seeds, seed_shape, [0], seed_shape)
-    
-    with Stream(write_io, streamline_output_file, 'w') as streamline_writer:
-        
-        for step, ux, uy, uz in all_data:
-            print(f"Processing step {step}")
-            
-            try:
-                if is_3d and uz is not None:
-                    output_filename = plot_streamlines_3d(ux, uy, uz, step, base_filename, 
-                                                        vmin, vmax, var_1, var_2, slice_idx)
+    if rank == 0:
+        print("Generating plots and writing streamline data step by step...")
+    
+    # steps mode: each round gives every rank one step, then writes them in order
+    round_size = size if by_steps else 1
+    with Stream(write_io, streamline_output_file, 'w', comm) as streamline_writer:
+        for first in range(0, n_steps, round_size):
+            mine = first + rank if by_steps else first
+            result = None
+            if mine < n_steps:
+                item = steps.get()
+                if isinstance(item, Exception):
+                    raise item
+                step, ux, uy, uz = item
+                print(f"Rank {rank}: processing step {step}")
+
+                # a tracing error ends the run: this rank could not join the collectives below
+                output_filename = None
+                if is_3d:
+                    if uz is None:
+                        raise ValueError("3D mode needs uz")
+                    sample = grid_sampler((ux, uy, uz), local_bounds)
+                    if args.integrator == 'rk45':
+                        h_max = args.h_max * float(np.min(sample.spacing))
+                        trace = dict(integrator=trace_streamlines_rk45, max_steps=rk45_step_cap(max_len, h_max, args),
+                                     max_len=max_len, atol=args.atol, rtol=args.rtol, h_max=h_max)
+                    else:
+                        trace = dict(integrator=trace_streamlines, dt=args.dt, max_steps=args.trace_steps,
+                                     max_len=max_len)
+                    _, points, offsets = trace_streamlines_slabs(seeds, sample, comm, owned, bounds, **trace)
+                    result = (step, points, offsets)
+                    try:
+                        if start <= plot_idx < start + count:
+                            output_filename = plot_streamlines_3d(ux, uy, uz, step, base_filename,
+                                                                vmin, vmax, var_1, var_2, plot_idx, planes[0])
+                    except Exception as e:
+                        print(f"Error plotting step {step}: {e}")
                 else:
-                    output_filename = plot_streamlines_2d(ux, uy, step, base_filename, vmin, vmax, save_fig, streamline_writer)
-                
+                    ux_2d, uy_2d = slice_2d(ux, uy)
+                    sample = grid_sampler((ux_2d, uy_2d))
+                    if args.integrator == 'rk45':
+                        h_max = args.h_max * float(np.min(sample.spacing))
+                        points, offsets = trace_streamlines_rk45(
+                            my_seeds, sample, max_steps=rk45_step_cap(max_len, h_max, args), max_len=max_len,
+                            atol=args.atol, rtol=args.rtol, h_max=h_max)
+                    else:
+                        points, offsets = trace_streamlines(my_seeds, sample, dt=args.dt,
+                                                            max_steps=args.trace_steps, max_len=max_len)
+                    result = (step, points, offsets)
+                    try:
+                        if len(my_seeds) and (by_steps or rank == 0):
+                            output_filename = plot_streamlines_2d(ux, uy, step, base_filename, vmin, vmax, save_fig,
+                                                                  points[offsets[0]:offsets[1]], args.lic)
+                    except Exception as e:
+                        print(f"Error plotting step {step}: {e}")
+
                 if output_filename:
                     print(f"Saved: {output_filename}")
-                    
-            except Exception as e:
-                print(f"Error processing step {step}: {e}")
-                continue
-    
-    print("All streamline plots completed!")
-    print(f"Streamline data saved to: {streamline_output_file}")
-    print("Please check the ../RESULTS")
+                del ux, uy, uz, item
+
+            for index in range(first, min(first + round_size, n_steps)):
+                streamline_writer.begin_step()
+                if by_steps:
+                    if index == mine and result is not None:
+                        step, points, offsets = result
+                        write_streamlines(streamline_writer, step, points, offsets, my_seeds,
+                                          len(points), len(my_seeds), 0, 0, True)
+                elif result is not None:
+                    # every rank holds the same step, the seeds are split: place each block with Exscan
+                    step, points, offsets = result
+                    point_start = comm.exscan(len(points)) or 0
+                    n_points = comm.allreduce(len(points))
+                    write_streamlines(streamline_writer, step, points, offsets, my_seeds,
+                                          n_points, len(seeds), point_start, seed_start, last_seed)
+                streamline_writer.end_step()
+    reader.join()
+    
+    if rank == 0:
+        print("All streamline plots completed!")
+        print(f"Streamline data saved to: {streamline_output_file}")
+        print("Please check the ../RESULTS")
 
 if __name__ == "__main__":
     install()
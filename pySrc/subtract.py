@@ -2,6 +2,7 @@ import numpy as np
 import argparse
 from adios2 import Adios, Stream, bindings
 from rich.traceback import install
+from writers import add_writer_arguments, configure_writer
 
 def parse_arguments():
     install()
@@ -15,6 +16,7 @@ def parse_arguments():
     parser.add_argument("--max_steps", default=None, help="The number of max time steps")
     parser.add_argument("--tolerance",default=None, help="Tolerance level of the error this will show 0 if it is <= the tolerance" )
     parser.add_argument("--skip", type=int, default=0, help="number of points to skip for the higher resolution")
+    add_writer_arguments(parser)
     return parser.parse_args()
 
 
@@ -28,6 +30,7 @@ def main():
     io1 = adios.declare_io("ReadIO1")
     io2 = adios.declare_io("ReadIO2")
     io_out = adios.declare_io("OutputIO")
+    configure_writer(io_out, args)
     skip_factor = args.skip
     GT = args.bpfile2
     E = args.bpfile1
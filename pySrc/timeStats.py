@@ -0,0 +1,360 @@
+import os
+import sys
+import argparse
+import numpy as np
+from adios2 import Adios, Stream
+from mpi4py import MPI
+from rich.traceback import install
+from stepReader import StepReader
+from writers import add_writer_arguments, configure_writer
+
+
+class RunningStats:
+    """Single-pass, per-point time statistics for the local slab of each variable.
+
+    Means and central moments are updated with Welford's recurrences, pairwise
+    co-moments give the Reynolds stresses <u'v'>, and two accumulators can be
+    combined with Chan's parallel formulas (used to stitch restarted runs).
+    Everything is stored in float64 regardless of the input precision.
+    """
+
+    def __init__(self, variables, pairs=(), moments=2):
+        if moments not in (2, 3, 4):
+            raise ValueError(f"moments must be 2, 3 or 4, got {moments}")
+        self.variables = list(variables)
+        self.pairs = [tuple(p) for p in pairs]
+        self.moments = moments
+        self.n = 0
+        self.last_step = -1
+        self.mean = {}
+        self.M2 = {}
+        self.M3 = {}
+        self.M4 = {}
+        self.C = {}
+
+    def _allocate(self, shape):
+        for var in self.variables:
+            self.mean[var] = np.zeros(shape, dtype=np.float64)
+            self.M2[var] = np.zeros(shape, dtype=np.float64)
+            if self.moments >= 3:
+                self.M3[var] = np.zeros(shape, dtype=np.float64)
+            if self.moments >= 4:
+                self.M4[var] = np.zeros(shape, dtype=np.float64)
+        for pair in self.pairs:
+            self.C[pair] = np.zeros(shape, dtype=np.float64)
+
+    def update(self, sample, step=None):
+        if self.n == 0:
+            self._allocate(np.shape(sample[self.variables[0]]))
+
+        n1 = self.n
+        self.n += 1
+        n = self.n
+
+        # deviations from the *old* means, needed by the co-moment update
+        deltas = {}
+        for var in self.variables:
+            x = np.asarray(sample[var], dtype=np.float64)
+            delta = x - self.mean[var]
+            delta_n = delta / n
+            term1 = delta * delta_n * n1
+
+            self.mean[var] += delta_n
+            if self.moments >= 4:
+                delta_n2 = delta_n * delta_n
+                self.M4[var] += (term1 * delta_n2 * (n * n - 3 * n + 3)
+                                 + 6 * delta_n2 * self.M2[var]
+                                 - 4 * delta_n * self.M3[var])
+            if self.moments >= 3:
+                self.M3[var] += term1 * delta_n * (n - 2) - 3 * delta_n * self.M2[var]
+            self.M2[var] += term1
+            deltas[var] = delta
+
+        for a, b in self.pairs:
+            x_b = np.asarray(sample[b], dtype=np.float64)
+            self.C[(a, b)] += deltas[a] * (x_b - self.mean[b])
+
+        if step is not None:
+            self.last_step = step
+
+    def merge(self, other):
+        """Combine another accumulator over a disjoint set of steps (Chan et al.)."""
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.n = other.n
+            self.last_step = other.last_step
+            self.mean = {k: v.copy() for k, v in other.mean.items()}
+            self.M2 = {k: v.copy() for k, v in other.M2.items()}
+            self.M3 = {k: v.copy() for k, v in other.M3.items()}
+            self.M4 = {k: v.copy() for k, v in other.M4.items()}
+            self.C = {k: v.copy() for k, v in other.C.items()}
+            return
+
+        na, nb = float(self.n), float(other.n)
+        n = na + nb
+
+        deltas = {}
+        for var in self.variables:
+            delta = other.mean[var] - self.mean[var]
+            delta2 = delta * delta
+            M2a, M2b = self.M2[var], other.M2[var]
+
+            if self.moments >= 4:
+                M3a, M3b = self.M3[var], other.M3[var]
+                self.M4[var] = (self.M4[var] + other.M4[var]
+                                + delta2 * delta2 * na * nb * (na * na - na * nb + nb * nb) / n ** 3
+                                + 6 * delta2 * (na * na * M2b + nb * nb * M2a) / n ** 2
+                                + 4 * delta * (na * M3b - nb * M3a) / n)
+            if self.moments >= 3:
+                self.M3[var] = (self.M3[var] + other.M3[var]
+                                + delta * delta2 * na * nb * (na - nb) / n ** 2
+                                + 3 * delta * (na * M2b - nb * M2a) / n)
+            self.M2[var] = M2a + M2b + delta2 * na * nb / n
+            self.mean[var] = self.mean[var] + delta * nb / n
+            deltas[var] = delta
+
+        for a, b in self.pairs:
+            self.C[(a, b)] = self.C[(a, b)] + other.C[(a, b)] + deltas[a] * deltas[b] * na * nb / n
+
+        self.n += other.n
+        self.last_step = max(self.last_step, other.last_step)
+
+    def fields(self):
+        """Final statistics as a dict of output-name -> array."""
+        out = {}
+        if self.n == 0:
+            return out
+        for var in self.variables:
+            variance = self.M2[var] / self.n
+            out[f"{var}_mean"] = self.mean[var]
+            out[f"{var}_rms"] = np.sqrt(variance)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                if self.moments >= 3:
+                    out[f"{var}_skewness"] = np.where(variance > 0, (self.M3[var] / self.n) / variance ** 1.5, 0.0)
+                if self.moments >= 4:
+                    out[f"{var}_flatness"] = np.where(variance > 0, (self.M4[var] / self.n) / variance ** 2, 0.0)
+        for a, b in self.pairs:
+            out[f"{a}{b}_stress"] = self.C[(a, b)] / self.n
+        return out
+
+    def save(self, path):
+        arrays = {"n": np.array(self.n), "last_step": np.array(self.last_step),
+                  "moments": np.array(self.moments)}
+        if self.n > 0:
+            for var in self.variables:
+                arrays[f"mean/{var}"] = self.mean[var]
+                arrays[f"M2/{var}"] = self.M2[var]
+                if self.moments >= 3:
+                    arrays[f"M3/{var}"] = self.M3[var]
+                if self.moments >= 4:
+                    arrays[f"M4/{var}"] = self.M4[var]
+            for a, b in self.pairs:
+                arrays[f"C/{a}:{b}"] = self.C[(a, b)]
+        # write then rename so a crash mid-save never leaves a truncated checkpoint
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, variables, pairs=(), moments=2):
+        stats = cls(variables, pairs, moments)
+        with np.load(path) as data:
+            if int(data["moments"]) != moments:
+                raise ValueError(f"Checkpoint {path} holds moments={int(data['moments'])}, requested {moments}")
+            stats.n = int(data["n"])
+            stats.last_step = int(data["last_step"])
+            if stats.n > 0:
+                for var in stats.variables:
+                    stats.mean[var] = data[f"mean/{var}"]
+                    stats.M2[var] = data[f"M2/{var}"]
+                    if moments >= 3:
+                        stats.M3[var] = data[f"M3/{var}"]
+                    if moments >= 4:
+                        stats.M4[var] = data[f"M4/{var}"]
+                for a, b in stats.pairs:
+                    stats.C[(a, b)] = data[f"C/{a}:{b}"]
+        return stats
+
+
+def checkpoint_path(prefix, rank, size):
+    return f"{prefix}.np{size:04d}.rank{rank:04d}.npz"
+
+
+def parse_pairs(text, variables):
+    if text is None:
+        return [(variables[i], variables[j]) for i in range(len(variables)) for j in range(i + 1, len(variables))]
+    if text == "":
+        return []
+    pairs = []
+    for item in text.split(','):
+        a, b = item.split(':')
+        if a not in variables or b not in variables:
+            raise ValueError(f"Stress pair {item} uses a variable not listed in --vars")
+        pairs.append((a, b))
+    return pairs
+
+
+def parse_arguments():
+    install()
+    parser = argparse.ArgumentParser(description='Streaming time-averaged statistics (mean, RMS, Reynolds stresses) from ADIOS2 BP files')
+
+    parser.add_argument('input_file',
+                        type=str,
+                        help='Path to the input ADIOS2 BP file (REQUIRED)')
+
+    parser.add_argument('max_steps',
+                        type=int,
+                        help='Maximum number of time steps to process (REQUIRED)')
+
+    parser.add_argument('--vars',
+                        '-v',
+                        type=str,
+                        default='ux,uy,uz',
+                        help='Variables to accumulate, separated by commas default: ux,uy,uz (optional)')
+
+    parser.add_argument('--stress',
+                        type=str,
+                        default=None,
+                        help="Reynolds stress pairs, e.g. ux:uy,ux:uz default: every pair of --vars, '' for none (optional)")
+
+    parser.add_argument('--moments',
+                        type=int,
+                        choices=[2, 3, 4],
+                        default=2,
+                        help='Highest central moment to keep: 2 (rms), 3 (+skewness), 4 (+flatness) default: 2 (optional)')
+
+    parser.add_argument('--xml',
+                        '-x',
+                        type=str,
+                        default=None,
+                        help='Path to ADIOS2 XML configuration file (optional)')
+
+    parser.add_argument('--output',
+                        '-o',
+                        type=str,
+                        default='stats.bp',
+                        help='Output file name default: stats.bp (optional)')
+
+    parser.add_argument('--checkpoint',
+                        type=str,
+                        default=None,
+                        help='Checkpoint prefix; one .npz per rank is written there (optional)')
+
+    parser.add_argument('--checkpoint_every',
+                        type=int,
+                        default=0,
+                        help='Write a checkpoint every N accumulated steps, 0 only at the end default: 0 (optional)')
+
+    parser.add_argument('--restart',
+                        action='store_true',
+                        help='Resume from the --checkpoint files, skipping steps already accumulated (optional)')
+
+    add_writer_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    install()
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+
+    args = parse_arguments()
+
+    variables = args.vars.split(',')
+    max_steps = args.max_steps
+
+    if max_steps <= 0:
+        if rank == 0:
+            print("Error: max_steps must be a positive integer.")
+        sys.exit(1)
+
+    try:
+        pairs = parse_pairs(args.stress, variables)
+    except ValueError as e:
+        if rank == 0:
+            print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.restart and args.checkpoint is None:
+        if rank == 0:
+            print("Error: --restart needs --checkpoint")
+        sys.exit(1)
+
+    if rank == 0:
+        print(f"Running with {size} MPI processes")
+        print(f"Input file: {args.input_file}")
+        print(f"Variables: {variables}")
+        print(f"Reynolds stress pairs: {pairs}")
+        print(f"Output file: {args.output}")
+
+    if args.restart:
+        stats = RunningStats.load(checkpoint_path(args.checkpoint, rank, size), variables, pairs, args.moments)
+        if rank == 0:
+            print(f"Restarting after step {stats.last_step} with {stats.n} samples")
+    else:
+        stats = RunningStats(variables, pairs, args.moments)
+
+    adios_obj = Adios(args.xml, comm) if args.xml else Adios(comm)
+    Wio = adios_obj.declare_io("WriteIO")
+    configure_writer(Wio, args)
+
+    global_shape = None
+    write_start = None
+    write_count = None
+
+    # z slabs of 3D arrays; steps already in the checkpoint are skipped without being read
+    reader = StepReader(args.input_file, variables, comm, xml=args.xml, io_name="readerIO", max_steps=max_steps,
+                        steps=range(stats.last_step + 1, max_steps))
+    for step in reader:
+        current_step = step.step
+        missing = [var for var in variables if var not in step]
+        if missing:
+            if rank == 0:
+                print(f"Error: variables {missing} not found in step {current_step}")
+            sys.exit(1)
+
+        if global_shape is None:
+            slab = step.slabs[variables[0]]
+            global_shape = slab.shape if slab is not None else []
+            if len(global_shape) < 3:
+                if rank == 0:
+                    print(f"Expected 3D variables, got shape {global_shape}")
+                sys.exit(1)
+            write_start = slab.write_start
+            write_count = slab.write_count
+
+        if rank == 0:
+            print(f"Processing step {current_step}")
+
+        stats.update(step.data, current_step)
+
+        if args.checkpoint and args.checkpoint_every > 0 and stats.n % args.checkpoint_every == 0:
+            stats.save(checkpoint_path(args.checkpoint, rank, size))
+            if rank == 0:
+                print(f"Checkpoint written after step {current_step}")
+
+    if args.checkpoint:
+        stats.save(checkpoint_path(args.checkpoint, rank, size))
+
+    if stats.n == 0:
+        if rank == 0:
+            print("No steps accumulated, nothing to write")
+        return
+
+    with Stream(Wio, args.output, "w", comm) as w:
+        w.begin_step()
+        for name, field in stats.fields().items():
+            w.write(name, np.ascontiguousarray(field), global_shape, write_start, write_count)
+        if rank == 0:
+            w.write("samples", stats.n)
+        w.end_step()
+
+    if rank == 0:
+        print(f"Statistics over {stats.n} steps written to {args.output}")
+
+
+if __name__ == "__main__":
+    install()
+    main()
@@ -0,0 +1,438 @@
+import itertools
+import numpy as np
+from slabs import slab_bounds
+
+
+def seed_grid(*counts):
+    """Seeds at the cell centres of a uniform grid over the unit square or cube, x fastest.
+
+    counts is (nx, ny) or (nx, ny, nz); returns (nx * ny[* nz], 2 or 3) points.
+    """
+    axes = [(np.arange(n) + 0.5) / n for n in counts]
+    grids = np.meshgrid(*axes[::-1], indexing='ij')
+    return np.column_stack([g.ravel() for g in grids[::-1]])
+
+
+def grid_sampler(components, bounds=None):
+    """Multilinear velocity lookup on a uniform grid.
+
+    components are the velocity arrays (vx, vy) or (vx, vy, vz), indexed
+    [y, x] or [z, y, x] as in streamlines.py; bounds gives (min, max) per
+    coordinate x, y(, z), default (0, 1). Returns sample(points (n, dim)) ->
+    velocities (n, dim). Points outside the grid get the value at the
+    nearest boundary.
+    """
+    dim = len(components)
+    field = np.stack([np.asarray(c, dtype=np.float64) for c in components], axis=-1)
+    if field.ndim != dim + 1:
+        raise ValueError(f"expected {dim}D velocity components, got shape {field.shape[:-1]}")
+    shape = np.array(field.shape[:-1][::-1])
+    if np.any(shape < 2):
+        raise ValueError(f"need at least 2 grid points per axis, got {tuple(shape[::-1])}")
+    if bounds is None:
+        bounds = [(0.0, 1.0)] * dim
+    lower = np.array([b[0] for b in bounds], dtype=np.float64)
+    spacing = (np.array([b[1] for b in bounds], dtype=np.float64) - lower) / (shape - 1)
+    # flat field: point (x, y, z) lives at row x + nx * (y + ny * z)
+    flat = field.reshape(-1, dim)
+    strides = np.cumprod(np.concatenate(([1], shape[:-1])))
+    corners = [(corner, int(np.dot(corner, strides))) for corner in itertools.product((0, 1), repeat=dim)]
+
+    def sample(points):
+        f = (points - lower) / spacing
+        np.clip(f, 0, shape - 1, out=f)
+        i = np.minimum(f.astype(np.intp), shape - 2)
+        t = f - i
+        weights = (1.0 - t, t)
+        base = i @ strides
+        out = np.zeros((len(points), dim))
+        for corner, offset in corners:
+            weight = weights[corner[0]][:, 0].copy()
+            for d in range(1, dim):
+                weight *= weights[corner[d]][:, d]
+            out += weight[:, np.newaxis] * np.take(flat, base + offset, axis=0)
+        return out
+
+    sample.spacing = spacing
+    return sample
+
+
+def unit_direction(sample, points, min_speed=1e-8):
+    """Velocity direction at points (zero where the speed is below min_speed) and the moving mask."""
+    v = sample(points)
+    speed = np.sqrt(np.einsum("ij,ij->i", v, v))
+    moving = speed >= min_speed
+    v *= np.where(moving, 1.0 / np.maximum(speed, min_speed), 0.0)[:, np.newaxis]
+    return v, moving
+
+
+def to_csr(ids, points, n):
+    """(points, offsets) from per-step lists of seed ids and positions, each seed's points kept in order."""
+    ids = np.concatenate(ids)
+    order = np.argsort(ids, kind="stable")
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ids, minlength=n), out=offsets[1:])
+    return np.concatenate(points)[order], offsets
+
+
+def trace_streamlines(seeds, sample, dt=0.002, max_steps=10, max_len=-1, bounds=None, min_speed=1e-8,
+                      region=None, arc=None, taken=None, step=None, state=False):
+    """Fixed step RK4 streamlines of the unit direction field, all seeds advanced together.
+
+    A seed stops when it leaves bounds (the point outside is dropped), when
+    the speed at its position falls below min_speed, or once its arc length
+    reaches max_len (if positive; that point is kept). Returns the streamlines
+    in CSR form: points (total, dim) and offsets (n_seeds + 1), streamline k
+    being points[offsets[k]:offsets[k + 1]] and starting at its seed.
+
+    For tracing in pieces (trace_streamlines_slabs): region, (lo, hi) per
+    coordinate with hi excluded, is the part of bounds this call covers. A
+    seed stepping out of region but not out of bounds stops with its handoff
+    flag set and that point, which is not kept, as its end. arc and taken
+    carry the arc length and step count of earlier pieces; state=True also
+    returns (end, arc, taken, handoff, step) per seed. step is the step
+    length to continue with, always dt here (the step argument is ignored).
+    """
+    seeds = np.atleast_2d(np.asarray(seeds, dtype=np.float64))
+    n, dim = seeds.shape
+    lower, upper, region_lower, region_upper = box(bounds, region, dim)
+    end, arc, taken, handoff = start_state(seeds, arc, taken)
+
+    def direction(p):
+        return unit_direction(sample, p, min_speed)
+
+    def stop(mask, p, a, s):
+        gone = active[mask]
+        end[gone], arc[gone], taken[gone] = p[mask], a[mask], s[mask]
+
+    ids = [np.arange(n)]
+    points = [seeds.copy()]
+    active = np.arange(n)
+    pos, run_arc, run_taken = seeds.copy(), arc.copy(), taken.copy()
+
+    while True:
+        go = run_taken < max_steps
+        if max_len > 0:
+            go &= run_arc < max_len
+        active, pos, run_arc, run_taken = active[go], pos[go], run_arc[go], run_taken[go]
+        if active.size == 0:
+            break
+        k1, moving = direction(pos)
+        if not moving.all():
+            stop(~moving, pos, run_arc, run_taken)
+            active, pos, run_arc, run_taken, k1 = active[moving], pos[moving], run_arc[moving], run_taken[moving], k1[moving]
+        k2 = direction(pos + 0.5 * dt * k1)[0]
+        k3 = direction(pos + 0.5 * dt * k2)[0]
+        k4 = direction(pos + dt * k3)[0]
+        new = pos + dt / 6.0 * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+        new_arc = run_arc + np.linalg.norm(new - pos, axis=1)
+        new_taken = run_taken + 1
+
+        inside = np.all((new >= lower) & (new <= upper), axis=1)
+        stop(~inside, pos, run_arc, run_taken)
+        if region_lower is not None:
+            leaving = inside & ~np.all((new >= region_lower) & (new < region_upper), axis=1)
+            stop(leaving, new, new_arc, new_taken)
+            handoff[active[leaving]] = True
+            inside &= ~leaving
+        active, pos, run_arc, run_taken = active[inside], new[inside], new_arc[inside], new_taken[inside]
+        end[active], arc[active], taken[active] = pos, run_arc, run_taken
+        ids.append(active)
+        points.append(pos)
+
+    points, offsets = to_csr(ids, points, n)
+    if state:
+        return points, offsets, (end, arc, taken, handoff, np.full(n, dt))
+    return points, offsets
+
+
+def box(bounds, region, dim):
+    """Domain bounds and optional region as arrays (lower, upper, region_lower, region_upper)."""
+    if bounds is None:
+        bounds = [(0.0, 1.0)] * dim
+    lower = np.array([b[0] for b in bounds], dtype=np.float64)
+    upper = np.array([b[1] for b in bounds], dtype=np.float64)
+    if region is None:
+        return lower, upper, None, None
+    return (lower, upper, np.array([r[0] for r in region], dtype=np.float64),
+            np.array([r[1] for r in region], dtype=np.float64))
+
+
+def start_state(seeds, arc, taken):
+    """Per seed end point, arc length, step count and handoff flag before tracing."""
+    n = len(seeds)
+    arc = np.zeros(n) if arc is None else np.array(arc, dtype=np.float64)
+    taken = np.zeros(n, dtype=np.int64) if taken is None else np.array(taken, dtype=np.int64)
+    return seeds.copy(), arc, taken, np.zeros(n, dtype=bool)
+
+
+# Dormand-Prince 5(4): stage coefficients (the last row is the 5th order solution, FSAL) and error weights
+DP_A = (
+    (),
+    (1 / 5,),
+    (3 / 40, 9 / 40),
+    (44 / 45, -56 / 15, 32 / 9),
+    (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+    (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+    (35 / 384, 0.0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84),
+)
+DP_E = (71 / 57600, 0.0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40)
+
+
+def trace_streamlines_rk45(seeds, sample, max_steps=1000, max_len=-1, bounds=None, atol=1e-6, rtol=1e-6,
+                           h_max=None, min_speed=1e-8, region=None, arc=None, taken=None, step=None,
+                           state=False):
+    """Adaptive Dormand-Prince 5(4) streamlines, all seeds advanced together.
+
+    Integrates the unit direction field in arc length, so the step h is a
+    length. Each seed keeps its own h, chosen so the embedded error per step
+    stays below atol + rtol * |x|, and never longer than h_max (default: one
+    grid cell, sample.spacing from grid_sampler). max_steps counts accepted
+    steps and the last step is shortened to end exactly at max_len.
+    Termination, region/arc/taken/state and the (points, offsets) result are
+    as in trace_streamlines; step gives each seed's first h (default h_max)
+    and the returned step the h a handed off seed continues with.
+    """
+    seeds = np.atleast_2d(np.asarray(seeds, dtype=np.float64))
+    n, dim = seeds.shape
+    lower, upper, region_lower, region_upper = box(bounds, region, dim)
+    end, arc, taken, handoff = start_state(seeds, arc, taken)
+    if h_max is None:
+        h_max = float(np.min(sample.spacing))
+    h_min = 1e-10 * h_max
+
+    def stop(mask, p, a, s):
+        gone = active[mask]
+        end[gone], arc[gone], taken[gone] = p[mask], a[mask], s[mask]
+
+    ids = [np.arange(n)]
+    points = [seeds.copy()]
+    k1, moving = unit_direction(sample, seeds, min_speed)
+    go = moving & (taken < max_steps)
+    if max_len > 0:
+        go &= arc < max_len
+    active = np.arange(n)[go]
+    pos, k1, run_arc, run_taken = seeds[go], k1[go], arc[go], taken[go]
+    next_step = np.full(n, h_max) if step is None else np.minimum(np.asarray(step, dtype=np.float64), h_max)
+    h = next_step[go]
+
+    while active.size:
+        if max_len > 0:
+            h = np.minimum(h, max_len - run_arc)
+        hh = h[:, np.newaxis]
+        k = [k1]
+        for stage in range(1, 7):
+            y = pos + hh * sum(a * kj for a, kj in zip(DP_A[stage], k) if a != 0.0)
+            k.append(unit_direction(sample, y, min_speed)[0])
+        new = y
+        error = hh * sum(e * kj for e, kj in zip(DP_E, k) if e != 0.0)
+        scale = atol + rtol * np.maximum(np.abs(pos), np.abs(new))
+        err = np.sqrt(np.mean((error / scale) ** 2, axis=1))
+
+        ok = err <= 1.0
+        factor = np.clip(0.9 * np.maximum(err, 1e-10) ** -0.2, 0.2, 5.0)
+        factor[~ok] = np.minimum(factor[~ok], 1.0)
+        h_next = np.minimum(h * factor, h_max)
+
+        inside = np.all((new >= lower) & (new <= upper), axis=1)
+        stop(ok & ~inside, pos, run_arc, run_taken)
+        if region_lower is not None:
+            leaving = ok & inside & ~np.all((new >= region_lower) & (new < region_upper), axis=1)
+            stop(leaving, new, run_arc + h, run_taken + 1)
+            handoff[active[leaving]] = True
+            next_step[active[leaving]] = h_next[leaving]
+            inside &= ~leaving
+        record = ok & inside
+        ids.append(active[record])
+        points.append(new[record])
+
+        # accepted steps move on, their last stage is the next first stage (FSAL)
+        pos = np.where(ok[:, np.newaxis], new, pos)
+        k1 = np.where(ok[:, np.newaxis], k[6], k1)
+        run_arc = run_arc + np.where(ok, h, 0.0)
+        run_taken = run_taken + ok
+
+        keep = np.where(ok, inside, h_next >= h_min)
+        stop(~ok & ~keep, pos, run_arc, run_taken)
+        go = keep & (run_taken < max_steps)
+        if max_len > 0:
+            go &= run_arc < max_len * (1.0 - 1e-12)
+        # a seed that stops moving ends there
+        go &= ~ok | (np.einsum("ij,ij->i", k1, k1) > 0.0)
+        stop(keep & ~go, pos, run_arc, run_taken)
+        active, pos, k1, run_arc, run_taken, h = (active[go], pos[go], k1[go], run_arc[go], run_taken[go],
+                                                  h_next[go])
+
+    points, offsets = to_csr(ids, points, n)
+    if state:
+        return points, offsets, (end, arc, taken, handoff, next_step)
+    return points, offsets
+
+
+def trace_streamlines_slabs(seeds, sample, comm, owned, bounds, axis=0, integrator=trace_streamlines, **kwargs):
+    """Streamlines through a field split between ranks along coordinate `axis`.
+
+    This rank owns coordinates owned = (lo, hi) along axis (hi excluded) and
+    `sample` covers that interval plus a few ghost cells, enough for the
+    integrator's stages. Every rank passes all the seeds; each starts the ones
+    it owns. A streamline that crosses into another rank's interval is sent
+    there with the points traced so far and continues from the crossing point,
+    until every streamline has ended, with the step size it had (for
+    trace_streamlines_rk45). kwargs go to the integrator.
+
+    Returns this rank's block of the streamlines in seed order (the
+    slab_bounds block of the seeds): (seed_start, points, offsets).
+    """
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    seeds = np.atleast_2d(np.asarray(seeds, dtype=np.float64))
+    n, dim = seeds.shape
+    los = np.array(comm.allgather(owned[0]))
+    region = [tuple(b) for b in bounds]
+    region[axis] = owned
+
+    def owner(points):
+        return np.clip(np.searchsorted(los, points[:, axis], side="right") - 1, 0, size - 1)
+
+    mine = np.flatnonzero(owner(seeds) == rank)
+    pos, arc, taken = seeds[mine], np.zeros(len(mine)), np.zeros(len(mine), dtype=np.int64)
+    step = None
+    history = [np.empty((0, dim))] * len(mine)
+    finished = []
+
+    while comm.allreduce(len(mine)) > 0:
+        outgoing = [[] for _ in range(size)]
+        if len(mine):
+            points, offsets, (end, arc, taken, handoff, step) = integrator(
+                pos, sample, bounds=bounds, region=region, arc=arc, taken=taken, step=step, state=True, **kwargs)
+            dest = owner(end)
+            for k, seed in enumerate(mine):
+                path = np.concatenate((history[k], points[offsets[k]:offsets[k + 1]]))
+                if handoff[k]:
+                    outgoing[dest[k]].append((seed, end[k], arc[k], taken[k], step[k], path))
+                else:
+                    finished.append((seed, path))
+        incoming = [item for part in comm.alltoall(outgoing) for item in part]
+        mine = np.array([item[0] for item in incoming], dtype=np.int64)
+        pos = np.array([item[1] for item in incoming]).reshape(-1, dim)
+        arc = np.array([item[2] for item in incoming], dtype=np.float64)
+        taken = np.array([item[3] for item in incoming], dtype=np.int64)
+        step = np.array([item[4] for item in incoming], dtype=np.float64)
+        history = [item[5] for item in incoming]
+
+    # regroup the finished streamlines into contiguous blocks of seeds
+    blocks = [slab_bounds(n, r, size) for r in range(size)]
+    outgoing = [[] for _ in range(size)]
+    for seed, path in finished:
+        r = next(r for r, (start, count) in enumerate(blocks) if start <= seed < start + count)
+        outgoing[r].append((seed, path))
+    received = sorted((item for part in comm.alltoall(outgoing) for item in part), key=lambda item: item[0])
+    paths = [path for _, path in received]
+    offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    np.cumsum([len(path) for path in paths], out=offsets[1:])
+    points = np.concatenate(paths) if paths else np.empty((0, dim))
+    return blocks[rank][0], points, offsets
+
+
+def advect_particles(points, samples, duration, substeps=1, bounds=None):
+    """Move particles with the flow from one stored step to the next (pathlines).
+
+    samples = (sample0, sample1) are the velocity fields at the start and the
+    end of the interval; in between the velocity is interpolated linearly in
+    time. Integrates the true velocity (not its direction) with `substeps`
+    equal RK4 steps over `duration`. Returns (points, inside): the new
+    positions and whether each particle stayed inside bounds. A particle that
+    leaves stops at its last position inside.
+    """
+    points = np.array(np.atleast_2d(points), dtype=np.float64)
+    n, dim = points.shape
+    lower, upper, _, _ = box(bounds, None, dim)
+    sample0, sample1 = samples
+    h = duration / substeps
+
+    def velocity(p, s):
+        return (1.0 - s) * sample0(p) + s * sample1(p)
+
+    active = np.arange(n)
+    for sub in range(substeps):
+        if active.size == 0:
+            break
+        p = points[active]
+        s0, s1 = sub / substeps, (sub + 1) / substeps
+        k1 = velocity(p, s0)
+        k2 = velocity(p + 0.5 * h * k1, 0.5 * (s0 + s1))
+        k3 = velocity(p + 0.5 * h * k2, 0.5 * (s0 + s1))
+        k4 = velocity(p + h * k3, s1)
+        new = p + h / 6.0 * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+        inside = np.all((new >= lower) & (new <= upper), axis=1)
+        points[active[inside]] = new[inside]
+        active = active[inside]
+
+    inside = np.zeros(n, dtype=bool)
+    inside[active] = True
+    return points, inside
+
+
+# segments.bp schema, one output step per input step, in CSR form:
+#   segments  float64 [dim * n_points]  flat points of every streamline, one after the other
+#   offsets   int64   [n_seeds + 1]     streamline k is points offsets[k] to offsets[k + 1]
+#   seeds     float64 [dim * n_seeds]   flat seed points
+#   step      int64   scalar            input step number
+# and the attribute dimension = dim. Every rank writes its block of streamlines.
+def write_streamlines(writer, step, points, offsets, seeds, n_points, n_seeds, point_start, seed_start, last):
+    """Write this rank's streamlines into the global segments/offsets/seeds arrays of one output step.
+
+    point_start and seed_start place the rank's block; offsets are shifted to
+    global point indices and the rank holding the last seed (`last`) also
+    writes the closing offset n_points. Points are 2D or 3D (seeds.shape[1]).
+    """
+    dim = seeds.shape[1]
+    local_offsets = offsets[:-1] if not last else offsets
+    global_offsets = (local_offsets + point_start).astype(np.int64)
+    segments = points.ravel()
+    seeds = seeds.ravel()
+    writer.write('segments', segments, [dim * n_points], [dim * point_start], [segments.size])
+    writer.write('offsets', global_offsets, [n_seeds + 1], [seed_start], [global_offsets.size])
+    writer.write('seeds', seeds, [dim * n_seeds], [dim * seed_start], [seeds.size])
+    if seed_start == 0:
+        writer.write('step', int(step))
+        writer.write_attribute('dimension', dim)
+
+
+def count_streamlines(reader):
+    """Streamlines in the current step of a segments.bp reader (1 for files without offsets)."""
+    if 'offsets' not in reader.available_variables():
+        return 1
+    return int(reader.inquire_variable('offsets').shape()[0]) - 1
+
+
+def streamline_dimension(reader, dim=None):
+    """Coordinates per point: the dimension attribute, else from the seeds, else dim (default 2)."""
+    if 'dimension' in reader.available_attributes():
+        return int(np.ravel(reader.read_attribute('dimension'))[0])
+    available = reader.available_variables()
+    n = count_streamlines(reader)
+    if 'seeds' in available and 'offsets' in available and n > 0:
+        return int(reader.inquire_variable('seeds').shape()[0]) // n
+    return dim or 2
+
+
+def read_streamlines(reader, first=0, count=None, dim=None):
+    """Streamlines first .. first + count - 1 of the current step of a segments.bp reader.
+
+    Only their offsets and points are read. Returns (points (n_points, dim),
+    offsets starting at 0). Older files without offsets hold one streamline.
+    """
+    dim = streamline_dimension(reader, dim)
+    n = count_streamlines(reader)
+    count = n - first if count is None else min(count, n - first)
+    if count <= 0:
+        return np.empty((0, dim)), np.zeros(1, dtype=np.int64)
+    if 'offsets' not in reader.available_variables():
+        points = np.asarray(reader.read('segments'), dtype=np.float64).reshape(-1, dim)
+        return points, np.array([0, len(points)], dtype=np.int64)
+    offsets = np.asarray(reader.read('offsets', [first], [count + 1]), dtype=np.int64)
+    if offsets[-1] == offsets[0]:
+        return np.empty((0, dim)), offsets - offsets[0]
+    segments = reader.read('segments', [dim * int(offsets[0])], [dim * int(offsets[-1] - offsets[0])])
+    return np.asarray(segments, dtype=np.float64).reshape(-1, dim), offsets - offsets[0]
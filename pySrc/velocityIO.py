@@ -0,0 +1,103 @@
+import numpy as np
+from adios2 import Adios, Stream
+from rich.traceback import install
+
+
+def magnitude_bounds(ranges):
+    """Smallest possible range of |u| given a (min, max) per component."""
+    low = high = 0.0
+    for mn, mx in ranges:
+        low += 0.0 if mn <= 0.0 <= mx else min(abs(mn), abs(mx)) ** 2
+        high += max(abs(mn), abs(mx)) ** 2
+    return np.sqrt(low), np.sqrt(high)
+
+
+def velocity_range(bp_file, xml_file, max_steps, is_3d=False):
+    """Colour range of the velocity magnitude over the first max_steps steps.
+
+    Uses the per-step min/max ADIOS2 keeps in the metadata, so no field data
+    is read; that range contains the true one (it can be a bit wider). Steps
+    written without statistics are read, one at a time.
+    """
+    install()
+    adios_obj = Adios(xml_file) if xml_file else Adios()
+    io = adios_obj.declare_io("scanIO")
+    global_min = float('inf')
+    global_max = float('-inf')
+
+    print("Scanning the velocity magnitude range...")
+    with Stream(io, bp_file, 'r') as reader:
+        for _ in reader:
+            step = reader.current_step()
+            available = reader.available_variables()
+            names = [n for n in (['ux', 'uy', 'uz'] if is_3d else ['ux', 'uy']) if n in available]
+            if all('Min' in available[n] and 'Max' in available[n] for n in names):
+                current_min, current_max = magnitude_bounds(
+                    [(float(available[n]['Min']), float(available[n]['Max'])) for n in names])
+            else:
+                magnitude = np.sqrt(sum(reader.read(n).astype(np.float64) ** 2 for n in names))
+                current_min, current_max = float(magnitude.min()), float(magnitude.max())
+            global_min = min(global_min, current_min)
+            global_max = max(global_max, current_max)
+            print(f"  Step {step}: min={current_min:.6f}, max={current_max:.6f}")
+            if step >= max_steps - 1:
+                break
+
+    print(f"Global velocity magnitude range: [{global_min:.6f}, {global_max:.6f}]")
+    return global_min, global_max
+
+
+def read_steps(bp_file, xml_file, max_steps, steps, rank=0, size=1, planes=None):
+    """Reader thread: puts (step, ux, uy, uz) on the bounded queue `steps`, then None.
+
+    Only every size-th step starting at rank is read (step parallel mode).
+    planes = (start, stop) reads only those indices of the last array axis
+    (x slab mode). Has its own Adios object so reading never shares state with
+    the writer. An exception is passed on through the queue.
+    """
+    try:
+        adios_obj = Adios(xml_file) if xml_file else Adios()
+        io = adios_obj.declare_io("readerIO")
+        with Stream(io, bp_file, 'r') as reader:
+            for index, _ in enumerate(reader):
+                if index >= max_steps:
+                    break
+                if index % size != rank:
+                    continue
+                step = reader.current_step()
+                print(f"Reading step {step}")
+                names = ['ux', 'uy', 'uz'] if 'uz' in reader.available_variables() else ['ux', 'uy']
+                if planes is None:
+                    ux, uy, uz = [reader.read(n) for n in names] + [None] * (3 - len(names))
+                else:
+                    shape = reader.inquire_variable('ux').shape()
+                    start = [0] * (len(shape) - 1) + [planes[0]]
+                    count = list(shape[:-1]) + [planes[1] - planes[0]]
+                    ux, uy, uz = [reader.read(n, start, count) for n in names] + [None] * (3 - len(names))
+
+                if len(ux.shape) == 4 and ux.shape[0] == 1:
+                    ux = ux[0, :, :, :]
+                    uy = uy[0, :, :, :]
+                    if uz is not None:
+                        uz = uz[0, :, :, :]
+                elif len(ux.shape) == 3 and ux.shape[0] == 1:
+                    ux = ux[0, :, :]
+                    uy = uy[0, :, :]
+                    if uz is not None:
+                        uz = uz[0, :, :]
+
+                print(f"Data shapes: ux={ux.shape}, uy={uy.shape}" + (f", uz={uz.shape}" if uz is not None else ""))
+                steps.put((step, ux, uy, uz))
+    except Exception as e:
+        steps.put(e)
+        return
+    steps.put(None)
+
+
+def slice_2d(ux, uy):
+    """The 2D field streamlines are traced in: the middle slice along axis 2 of 3D data."""
+    if len(ux.shape) == 3:
+        mid_slice = ux.shape[2] // 2
+        print(f"Using middle slice {mid_slice} for 2D visualization")
+        return ux[:, :, mid_slice], uy[:, :, mid_slice]
+    return ux, uy
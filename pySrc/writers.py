@@ -0,0 +1,62 @@
+ASYNC_MODES = {"false": "false", "naive": "Naive", "guided": "Guided"}
+
+
+def add_writer_arguments(parser):
+    """Add the BP5 output options every writing tool shares; configure_writer(io, args) applies them.
+
+    Options left unset keep the ADIOS2 (or XML) defaults.
+    """
+    group = parser.add_argument_group("BP5 output")
+    group.add_argument("--engine", type=str, default=None,
+                       help="Output engine (default: BP5, or whatever the XML sets)")
+    group.add_argument("--aggregators", type=int, default=None,
+                       help="Ranks that write data (NumAggregators); N ranks -> this many subfiles")
+    group.add_argument("--subfiles", type=int, default=None,
+                       help="Data subfiles (NumSubFiles), at most --aggregators")
+    group.add_argument("--aggregation", type=str, default=None,
+                       choices=["EveryoneWrites", "EveryoneWritesSerial", "TwoLevelShm"],
+                       help="BP5 AggregationType")
+    group.add_argument("--async_write", type=str, default=None, choices=sorted(ASYNC_MODES),
+                       help="BP5 AsyncWrite: overlap writing a step with computing the next one")
+    group.add_argument("--buffer_chunk_mb", type=int, default=None,
+                       help="Write buffer in chunks of this many MiB (BufferVType=chunk, BufferChunkSize)")
+    group.add_argument("--max_shm_mb", type=int, default=None,
+                       help="Shared memory per aggregator for TwoLevelShm, MiB (MaxShmSize)")
+    group.add_argument("--stats_level", type=int, default=None, choices=[0, 1],
+                       help="0 skips per-block min/max, shrinking metadata (StatsLevel)")
+    return group
+
+
+def writer_parameters(args):
+    """Engine parameters (strings) for the options that were given."""
+    params = {}
+    if getattr(args, "aggregators", None) is not None:
+        params["NumAggregators"] = str(args.aggregators)
+    if getattr(args, "subfiles", None) is not None:
+        params["NumSubFiles"] = str(args.subfiles)
+    if getattr(args, "aggregation", None) is not None:
+        params["AggregationType"] = args.aggregation
+    if getattr(args, "async_write", None) is not None:
+        params["AsyncWrite"] = ASYNC_MODES[args.async_write]
+    if getattr(args, "buffer_chunk_mb", None) is not None:
+        params["BufferVType"] = "chunk"
+        params["BufferChunkSize"] = str(args.buffer_chunk_mb * 2**20)
+    if getattr(args, "max_shm_mb", None) is not None:
+        params["MaxShmSize"] = str(args.max_shm_mb * 2**20)
+    if getattr(args, "stats_level", None) is not None:
+        params["StatsLevel"] = str(args.stats_level)
+    return params
+
+
+def configure_writer(io, args):
+    """Apply the command line output settings to a write IO, on top of any XML ones."""
+    if args is None:
+        return io
+    if getattr(args, "engine", None) is not None:
+        io.set_engine(args.engine)
+    elif not io.engine_type() or io.engine_type().lower() == "file":
+        io.set_engine("BP5")
+    params = writer_parameters(args)
+    if params:
+        io.set_parameters(params)
+    return io
@@ -0,0 +1,194 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+# Import the mygrad module from the C++ build directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "build"))
+import mygrad
+
+ORDERS = (2, 4, 6)
+LENGTH = 2 * np.pi
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark mygrad against np.gradient")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[257, 513, 1025, 2049, 4097],
+                        help="Points per axis for 1D and 2D grids")
+    parser.add_argument("--sizes_3d", type=int, nargs="+", default=[129, 257],
+                        help="Points per axis for 3D grids (4097^3 does not fit in memory)")
+    parser.add_argument("--dtypes", nargs="+", default=["float64", "float32"], choices=["float64", "float32"])
+    parser.add_argument("--dims", type=int, nargs="+", default=[1, 2, 3], choices=[1, 2, 3])
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case, the fastest is reported")
+    parser.add_argument("--json", default="bench_grad.json", help="Write results as JSON")
+    parser.add_argument("--csv", default=None, help="Also write results as CSV")
+    parser.add_argument("--baseline", default=None, help="Previous JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative throughput loss before a case counts as a regression")
+    return parser.parse_args()
+
+
+def field(n, ndim, dtype):
+    """sin/cos product on [0, 2pi]^ndim and its exact derivative along every axis."""
+    x = np.linspace(0.0, LENGTH, n)
+    h = x[1] - x[0]
+    if ndim == 1:
+        return np.sin(x).astype(dtype), [np.cos(x)], h
+    grids = np.meshgrid(*([x] * ndim), indexing="ij", sparse=True)
+    factors = [np.sin(g + 0.3 * d) for d, g in enumerate(grids)]
+    f = factors[0]
+    for fac in factors[1:]:
+        f = f * fac
+    exact = []
+    for d, g in enumerate(grids):
+        df = np.cos(g + 0.3 * d)
+        for e, fac in enumerate(factors):
+            if e != d:
+                df = df * fac
+        exact.append(df)
+    return f.astype(dtype), exact, h
+
+
+def cases(ndim):
+    """(name, order, callable(f, h) -> list of derivatives, axis order matching field())"""
+    out = []
+    for order in ORDERS:
+        if ndim == 1:
+            kernel = getattr(mygrad, f"gradient_1d_order{order}")
+            out.append((f"gradient_1d_order{order}", order, lambda f, h, k=kernel: [k(f, h)]))
+        elif ndim == 2:
+            kernel = getattr(mygrad, f"gradient_2d_order{order}")
+            # returns (d/d axis1, d/d axis0)
+            out.append((f"gradient_2d_order{order}", order, lambda f, h, k=kernel: k(f, h, h)[::-1]))
+        else:
+            kernel = getattr(mygrad, f"gradient_3d_order{order}")
+            out.append((f"gradient_3d_order{order}", order, lambda f, h, k=kernel: [k(f, h, a) for a in range(3)]))
+    out.append(("compact_derivative", 6,
+                lambda f, h: [mygrad.compact_derivative(f, h, a) for a in range(f.ndim)]))
+    out.append(("np.gradient", 2,
+                lambda f, h: [np.gradient(f, h, edge_order=2)] if f.ndim == 1
+                else list(np.gradient(f, h, edge_order=2))))
+    return out
+
+
+def time_case(func, f, h, repeat):
+    func(f, h)
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(f, h)
+        best = min(best, time.perf_counter() - t0)
+
+    tracemalloc.start()
+    func(f, h)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def max_error(func, n, ndim, dtype):
+    f, exact, h = field(n, ndim, dtype)
+    return max(float(np.max(np.abs(g - e))) for g, e in zip(func(f, h), exact))
+
+
+def convergence_rate(func, ndim, dtype):
+    """Observed order between two refinements of the analytic field (float64 only)."""
+    if dtype != "float64":
+        return None
+    coarse = {1: 65, 2: 65, 3: 33}[ndim]
+    fine = 2 * coarse - 1
+    e_coarse = max_error(func, coarse, ndim, dtype)
+    e_fine = max_error(func, fine, ndim, dtype)
+    if e_fine == 0.0:
+        return None
+    return float(np.log2(e_coarse / e_fine))
+
+
+def run(args):
+    results = []
+    for ndim in args.dims:
+        sizes = args.sizes_3d if ndim == 3 else args.sizes
+        for dtype in args.dtypes:
+            for name, order, func in cases(ndim):
+                rate = convergence_rate(func, ndim, dtype)
+                for n in sizes:
+                    f, exact, h = field(n, ndim, dtype)
+                    seconds, peak = time_case(func, f, h, args.repeat)
+                    error = max(float(np.max(np.abs(g - e))) for g, e in zip(func(f, h), exact))
+                    row = {
+                        "name": name, "ndim": ndim, "n": n, "dtype": dtype, "order": order,
+                        "points": f.size, "seconds": seconds, "points_per_s": f.size / seconds,
+                        "peak_bytes": peak, "peak_over_input": peak / f.nbytes,
+                        "max_error": error, "convergence_rate": rate,
+                    }
+                    results.append(row)
+                    print(f"{name:22s} {ndim}D n={n:5d} {dtype:7s} {row['points_per_s']:10.3e} pts/s "
+                          f"peak {peak / 2**20:9.1f} MiB  err {error:.2e}"
+                          + (f"  rate {rate:.2f}" if rate is not None else ""))
+                    del f, exact
+    return results
+
+
+def key(row):
+    return (row["name"], row["ndim"], row["n"], row["dtype"])
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as fh:
+        baseline = {key(row): row for row in json.load(fh)["results"]}
+
+    regressions = []
+    for row in results:
+        old = baseline.get(key(row))
+        if old is None:
+            continue
+        if row["points_per_s"] < (1.0 - tolerance) * old["points_per_s"]:
+            regressions.append(f"{key(row)}: {row['points_per_s']:.3e} pts/s, baseline {old['points_per_s']:.3e}")
+        if row["convergence_rate"] is not None and old["convergence_rate"] is not None \
+                and row["convergence_rate"] < old["convergence_rate"] - 0.5:
+            regressions.append(f"{key(row)}: convergence rate {row['convergence_rate']:.2f}, "
+                               f"baseline {old['convergence_rate']:.2f}")
+        if row["max_error"] > 10 * old["max_error"] + 1e-14:
+            regressions.append(f"{key(row)}: max error {row['max_error']:.2e}, baseline {old['max_error']:.2e}")
+    return regressions
+
+
+def main():
+    args = parse_arguments()
+    results = run(args)
+
+    info = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "threads": mygrad.num_threads(),
+        "repeat": args.repeat,
+    }
+    with open(args.json, "w") as fh:
+        json.dump({"info": info, "results": results}, fh, indent=2)
+    print(f"Wrote {args.json}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as fh:
+            writer = csv.DictWriter(fh, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"Wrote {args.csv}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) against {args.baseline}:")
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ import mygrad
 
 def test_1d_gradient():
     print("=== 1D Gradient Test ===")
-    f = [0.0, 1.0, 4.0, 9.0, 16.0]  # y = x^2
+    f = np.array([0.0, 1.0, 4.0, 9.0, 16.0])  # y = x^2
     dx = 1.0
 
     # Your gradient (C++ implementation)
@@ -21,109 +21,148 @@ def test_1d_gradient():
     print("MyGrad Gradient:", grad_mygrad)
     print("NumPy Gradient:", grad_numpy)
 
-    grad_mygrad_arr = np.array(grad_mygrad)
-    diff = np.abs(grad_mygrad_arr - grad_numpy)
+    diff = np.abs(grad_mygrad - grad_numpy)
     print("Full Difference:", diff)
     print("Interior Difference (ignores edges):", diff[1:-1])
+    np.testing.assert_allclose(grad_mygrad, 2 * np.arange(5.0), atol=1e-12)
+
+
+def test_1d_gradient_exact_polynomials():
+    print("\n=== 1D Gradient Polynomial Test ===")
+    x = np.linspace(0.0, 1.0, 21)
+    dx = x[1] - x[0]
+    for order, func in [(2, mygrad.gradient_1d_order2),
+                        (4, mygrad.gradient_1d_order4),
+                        (6, mygrad.gradient_1d_order6)]:
+        # every stencil of order p differentiates polynomials of degree p exactly
+        grad = func(x ** order, dx)
+        err = np.max(np.abs(grad - order * x ** (order - 1)))
+        print(f"Order {order}: max error on x^{order} = {err:.3e}")
+        assert err < 1e-8
 
 
 def test_2d_gradient_debug():
     print("\n=== 2D Gradient Debug Test ===")
-    
+
     # Start with smaller array to debug
     print("Testing with 3x3 array first...")
-    try:
-        f_small = [[1.0, 2.0, 3.0],
-                   [4.0, 5.0, 6.0], 
-                   [7.0, 8.0, 9.0]]
-        dx = 1.0
-        dy = 1.0
-        
-        print("Calling gradient_2d_order2 with 3x3...")
-        grad_flat = mygrad.gradient_2d_order2(f_small, dx, dy)
-        print("Success! Got result:", len(grad_flat), "elements")
-        
-        print("Calling gradient_2d_order4 with 3x3...")
-        grad_flat = mygrad.gradient_2d_order4(f_small, dx, dy)
-        print("Success! Got result:", len(grad_flat), "elements")
-        
-        print("Calling gradient_2d_order6 with 3x3...")
-        grad_flat = mygrad.gradient_2d_order6(f_small, dx, dy)
-        print("Success! Got result:", len(grad_flat), "elements")
-        
-    except Exception as e:
-        print("Error with 3x3:", e)
-        import traceback
-        traceback.print_exc()
-        return
-    
-    # Now try 5x5
-    print("\nTesting with 5x5 array...")
-    try:
-        x = np.linspace(-2, 2, 5)
-        y = np.linspace(-2, 2, 5)
+    f_small = np.array([[1.0, 2.0, 3.0],
+                        [4.0, 5.0, 6.0],
+                        [7.0, 8.0, 9.0]])
+    dx = 1.0
+    dy = 1.0
+
+    for func in (mygrad.gradient_2d_order2, mygrad.gradient_2d_order4, mygrad.gradient_2d_order6):
+        print(f"Calling {func.__name__} with 3x3...")
+        grad_x, grad_y = func(f_small, dx, dy)
+        print("Success! Got result shapes:", grad_x.shape, grad_y.shape)
+        np.testing.assert_allclose(grad_x, 1.0)
+        np.testing.assert_allclose(grad_y, 3.0)
+
+    # Now try 5x5 and 7x7
+    for n in (5, 7):
+        print(f"\nTesting with {n}x{n} array...")
+        x = np.linspace(-(n // 2), n // 2, n)
+        y = np.linspace(-(n // 2), n // 2, n)
         X, Y = np.meshgrid(x, y, indexing='ij')
         f2d = X**2 + Y**2
-        
+
         print("f2d shape:", f2d.shape)
-        print("f2d content:")
-        print(f2d)
-        
-        dx = 1.0
-        dy = 1.0
-        
-        print("Calling gradient_2d_order2 with 5x5...")
-        grad_flat = mygrad.gradient_2d_order2(f2d.tolist(), dx, dy)
-        print("Success! Order 2 result:", len(grad_flat), "elements")
-        
-        print("Calling gradient_2d_order4 with 5x5...")
-        grad_flat = mygrad.gradient_2d_order4(f2d.tolist(), dx, dy)
-        print("Success! Order 4 result:", len(grad_flat), "elements")
-        
-        print("Calling gradient_2d_order6 with 5x5...")
-        grad_flat = mygrad.gradient_2d_order6(f2d.tolist(), dx, dy)
-        print("Success! Order 6 result:", len(grad_flat), "elements")
-        
-    except Exception as e:
-        print("Error with 5x5:", e)
-        import traceback
-        traceback.print_exc()
-        return
-    
-    # Now try 7x7
-    print("\nTesting with 7x7 array...")
+        for func in (mygrad.gradient_2d_order2, mygrad.gradient_2d_order4, mygrad.gradient_2d_order6):
+            grad_x, grad_y = func(f2d, dx, dy)
+            print(f"Success! {func.__name__} result shapes:", grad_x.shape, grad_y.shape)
+
+            # f is indexed [j][i]: axis 1 is x, axis 0 is y
+            np.testing.assert_allclose(grad_x, 2 * Y, atol=1e-10)
+            np.testing.assert_allclose(grad_y, 2 * X, atol=1e-10)
+
+
+def test_buffer_api():
+    print("\n=== Buffer API Test ===")
+    f = np.random.default_rng(0).random((33, 17))
+
+    for dtype in (np.float64, np.float32):
+        data = f.astype(dtype)
+        grad_x, grad_y = mygrad.gradient_2d_order4(data, 0.1, 0.2)
+        print(dtype.__name__, "->", grad_x.dtype, grad_x.shape, grad_y.shape)
+        assert grad_x.dtype == dtype and grad_y.dtype == dtype
+        assert grad_x.shape == f.shape and grad_y.shape == f.shape
+        assert not np.shares_memory(grad_x, grad_y)
+
+        grad_1d = mygrad.gradient_1d_order2(data[0], 0.1)
+        assert grad_1d.dtype == dtype
+        np.testing.assert_allclose(grad_1d, np.gradient(data[0], 0.1, edge_order=2),
+                                   rtol=1e-5 if dtype == np.float32 else 1e-12)
+
+    # lists and non-contiguous views are still accepted (converted to float64)
+    grad_list = mygrad.gradient_1d_order2([0.0, 1.0, 4.0, 9.0], 1.0)
+    assert grad_list.dtype == np.float64
+    grad_x, grad_y = mygrad.gradient_2d_order2(f[:, ::2], 1.0, 1.0)
+    assert grad_x.shape == f[:, ::2].shape
+
     try:
-        x = np.linspace(-3, 3, 7)
-        y = np.linspace(-3, 3, 7)
-        X, Y = np.meshgrid(x, y, indexing='ij')
-        f2d = X**2 + Y**2
-        
-        print("f2d shape:", f2d.shape)
-        dx = 1.0
-        dy = 1.0
-        
-        print("Calling gradient_2d_order6 with 7x7...")
-        grad_flat = mygrad.gradient_2d_order6(f2d.tolist(), dx, dy)
-        print("Success! Order 6 result:", len(grad_flat), "elements")
-        
-        # If we get here, let's actually parse the results
-        ny, nx = f2d.shape
-        grad_x = np.array(grad_flat[:nx*ny]).reshape(ny, nx)
-        grad_y = np.array(grad_flat[nx*ny:]).reshape(ny, nx)
-        
-        print("grad_x shape:", grad_x.shape)
-        print("grad_y shape:", grad_y.shape)
-        print("grad_x:")
-        print(grad_x)
-        print("grad_y:")
-        print(grad_y)
-        
-    except Exception as e:
-        print("Error with 7x7:", e)
-        import traceback
-        traceback.print_exc()
+        mygrad.gradient_2d_order2(f[0], 1.0, 1.0)
+    except ValueError as e:
+        print("Rejected 1D input:", e)
+    else:
+        raise AssertionError("2D gradient accepted a 1D array")
+
+
+def test_3d_gradient():
+    print("\n=== 3D Gradient Test ===")
+    print("Threads:", mygrad.num_threads())
+    rng = np.random.default_rng(1)
+    # axis 2 has 1500 points so the blocked (non-contiguous) passes cover several blocks
+    f = rng.random((9, 6, 1500))
+
+    for order, func3d, func1d in [(2, mygrad.gradient_3d_order2, mygrad.gradient_1d_order2),
+                                  (4, mygrad.gradient_3d_order4, mygrad.gradient_1d_order4),
+                                  (6, mygrad.gradient_3d_order6, mygrad.gradient_1d_order6)]:
+        for axis in (0, 1, 2, -1):
+            grad = func3d(f, 0.5, axis)
+            expected = np.apply_along_axis(func1d, axis, f, 0.5)
+            err = np.max(np.abs(grad - expected))
+            print(f"Order {order}, axis {axis}: max difference to 1D kernel = {err:.3e}")
+            np.testing.assert_allclose(grad, expected, rtol=1e-12, atol=1e-9)
+
+        grad32 = func3d(f.astype(np.float32), 0.5, 1)
+        assert grad32.dtype == np.float32
+        np.testing.assert_allclose(grad32, func3d(f, 0.5, 1), rtol=1e-3, atol=1e-3)
+
+    # axis 1 has 6 points: order 6 falls back to order 4 like the 1D kernel
+    np.testing.assert_allclose(mygrad.gradient_3d_order6(f, 1.0, 1), mygrad.gradient_3d_order4(f, 1.0, 1))
+
+
+def test_compact_derivative():
+    print("\n=== Compact Scheme Test ===")
+    for periodic in (True, False):
+        for deriv in (1, 2):
+            errors = []
+            for n in (32, 64, 128):
+                x = np.arange(n) * 2 * np.pi / n if periodic else np.linspace(0.0, 2 * np.pi, n)
+                h = x[1] - x[0]
+                f = np.sin(x) + np.cos(2 * x)
+                exact = np.cos(x) - 2 * np.sin(2 * x) if deriv == 1 else -np.sin(x) - 4 * np.cos(2 * x)
+                errors.append(np.max(np.abs(mygrad.compact_derivative(f, h, 0, deriv, periodic) - exact)))
+            rate = np.log2(errors[-2] / errors[-1])
+            print(f"periodic={periodic}, deriv={deriv}: errors {errors}, rate {rate:.2f}")
+            # 6th order interior, 3rd/4th order boundary closures
+            assert rate > (5.5 if periodic else 2.8)
+
+    # batched solves along every axis match line-by-line solves
+    f = np.random.default_rng(2).random((7, 130, 300))
+    for axis in (0, 1, 2):
+        for deriv in (1, 2):
+            grad = mygrad.compact_derivative(f, 0.3, axis, deriv, True)
+            expected = np.apply_along_axis(lambda line: mygrad.compact_derivative(line, 0.3, 0, deriv, True), axis, f)
+            np.testing.assert_allclose(grad, expected, rtol=1e-12, atol=1e-10)
+    assert mygrad.compact_derivative(f.astype(np.float32), 0.3, 1).dtype == np.float32
 
 
 if __name__ == "__main__":
     test_1d_gradient()
-    test_2d_gradient_debug()
\ No newline at end of file
+    test_1d_gradient_exact_polynomials()
+    test_2d_gradient_debug()
+    test_buffer_api()
+    test_3d_gradient()
+    test_compact_derivative()